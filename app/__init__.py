@@ -1,15 +1,26 @@
-from app.handlers import WeatherHandler
-from app.handlers import IIHandler
-from app.handlers import NewsHandler
-from app.handlers.SpaceHandler import SpaceHandler
-from .db import DBsearcher as DB    # <-- ИСПРАВЛЕНО
-from .utils import helpers          # <-- ИСПРАВЛЕНО
-
-__all__=[
-    SpaceHandler,
-    WeatherHandler,
-    IIHandler,
-    NewsHandler,
-    DB,
-    helpers
-]
+# app/__init__.py
+# пакет без побочных эффектов: бот собирается в app.main.main(),
+# обработчики подгружаются при первом обращении (app.SpaceHandler и т.п.)
+import importlib
+
+_LAZY = {
+    "SpaceHandler": ("app.handlers.SpaceHandler", "SpaceHandler"),
+    "WeatherHandler": ("app.handlers.WeatherHandler", None),
+    "IIHandler": ("app.handlers.IIHandler", None),
+    "NewsHandler": ("app.handlers.NewsHandler", None),
+    "DB": ("app.db.DBsearcher", None),
+    "helpers": ("app.utils.helpers", None),
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module 'app' has no attribute {name!r}")
+    module, attr = _LAZY[name]
+    value = importlib.import_module(module)
+    if attr:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
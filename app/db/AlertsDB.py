@@ -0,0 +1,67 @@
+# app/db/AlertsDB.py
+from __future__ import annotations
+
+import time
+from typing import List, NamedTuple
+
+import aiosqlite
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS iss_alerts(
+    chat_id INTEGER PRIMARY KEY,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    lead_minutes INTEGER NOT NULL DEFAULT 10,
+    visible_only INTEGER NOT NULL DEFAULT 1,
+    created REAL NOT NULL
+);
+"""
+
+
+class AlertSub(NamedTuple):
+    chat_id: int
+    lat: float
+    lon: float
+    lead_minutes: int
+    visible_only: bool
+
+
+class AlertsDB:
+    """Подписки на оповещения о пролётах МКС: чат -> координаты и настройки."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._ready = False
+
+    async def _init(self, db: aiosqlite.Connection) -> None:
+        if not self._ready:
+            await db.executescript(_SCHEMA)
+            self._ready = True
+
+    async def subscribe(self, sub: AlertSub) -> None:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute(
+                "INSERT INTO iss_alerts(chat_id, lat, lon, lead_minutes, visible_only, created) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(chat_id) DO UPDATE SET "
+                "lat = excluded.lat, lon = excluded.lon, lead_minutes = excluded.lead_minutes, "
+                "visible_only = excluded.visible_only",
+                (sub.chat_id, sub.lat, sub.lon, sub.lead_minutes, int(sub.visible_only), time.time()),
+            )
+            await db.commit()
+
+    async def unsubscribe(self, chat_id: int) -> bool:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            cur = await db.execute("DELETE FROM iss_alerts WHERE chat_id = ?", (chat_id,))
+            await db.commit()
+            return (cur.rowcount or 0) > 0
+
+    async def all(self) -> List[AlertSub]:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute(
+                "SELECT chat_id, lat, lon, lead_minutes, visible_only FROM iss_alerts"
+            ) as cur:
+                rows = await cur.fetchall()
+        return [AlertSub(r[0], r[1], r[2], r[3], bool(r[4])) for r in rows]
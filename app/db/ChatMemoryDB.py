@@ -0,0 +1,172 @@
+# app/db/ChatMemoryDB.py
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Tuple
+
+import aiosqlite
+from loguru import logger as _logger
+
+logger = _logger.bind(feature="ii")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_memory(
+    chat_id INTEGER PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    turns TEXT NOT NULL DEFAULT '[]',
+    updated REAL NOT NULL
+);
+"""
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка: ~4 символа на токен."""
+    return len(text or "") // 4 + 1
+
+
+def _gist(text: str, limit: int = 160) -> str:
+    first = _SENTENCE_RE.split((text or "").strip(), 1)[0]
+    return first if len(first) <= limit else first[: limit - 1] + "…"
+
+
+class _Dialog:
+    __slots__ = ("turns", "tokens", "summary", "seen")
+
+    def __init__(self, turns: List[Tuple[str, str]], summary: str, seen: float):
+        self.turns: Deque[Tuple[str, str, int]] = deque()
+        self.tokens = 0
+        self.summary = summary
+        self.seen = seen
+        for q, a in turns:
+            self._push(q, a)
+
+    def _push(self, q: str, a: str) -> None:
+        t = estimate_tokens(q) + estimate_tokens(a)
+        self.turns.append((q, a, t))
+        self.tokens += t
+
+
+class ChatMemory:
+    """
+    Память диалога с ИИ по чатам: кольцевой буфер пар вопрос/ответ с
+    бюджетом в токенах. Вытесненные пары сжимаются в короткое содержание
+    (первая фраза вопроса и ответа), само содержание тоже ограничено.
+    Чаты без активности дольше ttl забываются. Состояние лежит в SQLite,
+    в RAM — не больше max_chats последних чатов.
+    """
+
+    def __init__(self, db_path: str, budget_tokens: int = 1500, ttl_minutes: int = 60, max_chats: int = 2000):
+        self.db_path = db_path
+        self.budget = max(64, int(budget_tokens))
+        self.summary_budget = self.budget // 4
+        self.ttl = int(ttl_minutes) * 60
+        self.max_chats = max(1, int(max_chats))
+        self._chats: "OrderedDict[int, _Dialog]" = OrderedDict()
+        self._ready = False
+
+    async def _init(self, db: aiosqlite.Connection) -> None:
+        if not self._ready:
+            await db.executescript(_SCHEMA)
+            self._ready = True
+
+    async def _load(self, chat_id: int) -> _Dialog:
+        d = self._chats.get(chat_id)
+        now = time.time()
+        if d is not None and now - d.seen <= self.ttl:
+            self._chats.move_to_end(chat_id)
+            return d
+        summary, turns = "", []
+        if d is None:
+            async with aiosqlite.connect(self.db_path) as db:
+                await self._init(db)
+                async with db.execute(
+                    "SELECT summary, turns, updated FROM chat_memory WHERE chat_id = ?", (chat_id,)
+                ) as cur:
+                    row = await cur.fetchone()
+            if row and now - row[2] <= self.ttl:
+                summary, turns = row[0], [tuple(t) for t in json.loads(row[1])]
+        d = _Dialog(turns, summary, now)
+        self._chats[chat_id] = d
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        return d
+
+    def _trim(self, d: _Dialog) -> None:
+        while d.tokens > self.budget and len(d.turns) > 1:
+            q, a, t = d.turns.popleft()
+            d.tokens -= t
+            d.summary = (d.summary + f"\n— {_gist(q)} → {_gist(a)}").strip()
+        if d.tokens > self.budget and d.turns:
+            # одна пара больше бюджета — оставляем начало вопроса и конец ответа
+            q, a, _ = d.turns.pop()
+            d.tokens = 0
+            chars = (self.budget // 2 - 1) * 4
+            d._push(q[:chars], a[-chars:])
+        limit = self.summary_budget * 4
+        if len(d.summary) > limit:
+            d.summary = "…" + d.summary[-limit:].split("\n", 1)[-1]
+
+    async def messages(self, chat_id: int) -> List[dict]:
+        """История в формате chat.completions (без текущего вопроса)."""
+        d = await self._load(chat_id)
+        out: List[dict] = []
+        if d.summary:
+            out.append({"role": "system", "content": "Кратко о чём говорили раньше:\n" + d.summary})
+        for q, a, _ in d.turns:
+            out.append({"role": "user", "content": q})
+            out.append({"role": "assistant", "content": a})
+        return out
+
+    async def add_turn(self, chat_id: int, question: str, answer: str) -> None:
+        d = await self._load(chat_id)
+        d._push(question, answer)
+        d.seen = time.time()
+        self._trim(d)
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute(
+                "INSERT INTO chat_memory(chat_id, summary, turns, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET summary = excluded.summary, "
+                "turns = excluded.turns, updated = excluded.updated",
+                (chat_id, d.summary, json.dumps([(q, a) for q, a, _ in d.turns], ensure_ascii=False), d.seen),
+            )
+            await db.commit()
+
+    async def clear(self, chat_id: int) -> None:
+        self._chats.pop(chat_id, None)
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute("DELETE FROM chat_memory WHERE chat_id = ?", (chat_id,))
+            await db.commit()
+
+    async def evict_idle(self) -> int:
+        cutoff = time.time() - self.ttl
+        stale = [cid for cid, d in self._chats.items() if d.seen < cutoff]
+        for cid in stale:
+            del self._chats[cid]
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            cur = await db.execute("DELETE FROM chat_memory WHERE updated < ?", (cutoff,))
+            removed = cur.rowcount
+            await db.commit()
+        if stale or removed:
+            logger.debug(f"[memory] evicted ram={len(stale)} db={removed}")
+        return max(len(stale), removed or 0)
+
+    async def run(self, interval: float = 300.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.warning(f"[memory] evict failed: {e!r}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"chats": len(self._chats), "tokens": sum(d.tokens for d in self._chats.values())}
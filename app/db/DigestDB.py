@@ -0,0 +1,143 @@
+# app/db/DigestDB.py
+from __future__ import annotations
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import aiosqlite
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digest_subs(
+    chat_id INTEGER PRIMARY KEY,
+    city TEXT NOT NULL,
+    hour INTEGER NOT NULL DEFAULT 8,
+    tz TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS digest_runs(
+    run_id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS digest_bodies(
+    run_id TEXT NOT NULL,
+    group_key TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY(run_id, group_key)
+);
+CREATE TABLE IF NOT EXISTS digest_outbox(
+    run_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    group_key TEXT NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(run_id, chat_id)
+);
+CREATE INDEX IF NOT EXISTS digest_outbox_pending ON digest_outbox(run_id, status, seq);
+"""
+
+PENDING, SENT, FAILED = 0, 1, 2
+
+
+class DigestSub(NamedTuple):
+    chat_id: int
+    city: str
+    hour: int
+    tz: Optional[str]
+
+
+class DigestDB:
+    """
+    Подписки на утренний дайджест и очередь рассылки. Выпуск (run) создаётся
+    одной транзакцией: тексты по группам + строка на каждого получателя; после
+    отправки строка помечается — перезапуск продолжает с первой неотмеченной.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._ready = False
+
+    async def _init(self, db: aiosqlite.Connection) -> None:
+        if not self._ready:
+            await db.executescript(_SCHEMA)
+            self._ready = True
+
+    async def subscribe(self, sub: DigestSub) -> None:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute(
+                "INSERT INTO digest_subs(chat_id, city, hour, tz, created) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET city = excluded.city, hour = excluded.hour, tz = excluded.tz",
+                (sub.chat_id, sub.city, sub.hour, sub.tz, time.time()),
+            )
+            await db.commit()
+
+    async def unsubscribe(self, chat_id: int) -> bool:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            cur = await db.execute("DELETE FROM digest_subs WHERE chat_id = ?", (chat_id,))
+            await db.commit()
+            return (cur.rowcount or 0) > 0
+
+    async def subs(self) -> List[DigestSub]:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute("SELECT chat_id, city, hour, tz FROM digest_subs") as cur:
+                return [DigestSub(*row) for row in await cur.fetchall()]
+
+    async def run_exists(self, run_id: str) -> bool:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute("SELECT 1 FROM digest_runs WHERE run_id = ?", (run_id,)) as cur:
+                return await cur.fetchone() is not None
+
+    async def create_run(self, run_id: str, bodies: Dict[str, str], recipients: List[Tuple[int, str]]) -> None:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute("INSERT OR IGNORE INTO digest_runs(run_id, started) VALUES (?, ?)", (run_id, time.time()))
+            await db.executemany(
+                "INSERT OR IGNORE INTO digest_bodies(run_id, group_key, body) VALUES (?, ?, ?)",
+                [(run_id, k, b) for k, b in bodies.items()],
+            )
+            await db.executemany(
+                "INSERT OR IGNORE INTO digest_outbox(run_id, seq, chat_id, group_key) VALUES (?, ?, ?, ?)",
+                [(run_id, i, cid, key) for i, (cid, key) in enumerate(recipients)],
+            )
+            await db.commit()
+
+    async def unfinished_runs(self) -> List[str]:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute("SELECT run_id FROM digest_runs WHERE finished IS NULL ORDER BY started") as cur:
+                return [row[0] for row in await cur.fetchall()]
+
+    async def pending(self, run_id: str, limit: int = 200) -> List[Tuple[int, str]]:
+        """Следующие получатели выпуска: (chat_id, текст)."""
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute(
+                "SELECT o.chat_id, b.body FROM digest_outbox o "
+                "JOIN digest_bodies b ON b.run_id = o.run_id AND b.group_key = o.group_key "
+                "WHERE o.run_id = ? AND o.status = ? ORDER BY o.seq LIMIT ?",
+                (run_id, PENDING, limit),
+            ) as cur:
+                return list(await cur.fetchall())
+
+    async def mark(self, run_id: str, chat_id: int, status: int) -> None:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute(
+                "UPDATE digest_outbox SET status = ? WHERE run_id = ? AND chat_id = ?", (status, run_id, chat_id)
+            )
+            await db.commit()
+
+    async def finish_run(self, run_id: str) -> Dict[str, int]:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute("UPDATE digest_runs SET finished = ? WHERE run_id = ?", (time.time(), run_id))
+            await db.commit()
+            async with db.execute(
+                "SELECT status, COUNT(*) FROM digest_outbox WHERE run_id = ? GROUP BY status", (run_id,)
+            ) as cur:
+                counts = dict(await cur.fetchall())
+        return {"sent": counts.get(SENT, 0), "failed": counts.get(FAILED, 0), "pending": counts.get(PENDING, 0)}
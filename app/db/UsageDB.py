@@ -0,0 +1,231 @@
+# app/db/UsageDB.py
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+from loguru import logger as _logger
+
+from app.utils.settings import get_settings
+
+logger = _logger.bind(feature="ii")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_offsets(
+    file TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage_daily(
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(day, model, provider)
+);
+CREATE TABLE IF NOT EXISTS usage_user_daily(
+    day TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(day, user_id)
+);
+CREATE TABLE IF NOT EXISTS usage_budgets(
+    user_id INTEGER PRIMARY KEY,
+    daily_tokens INTEGER NOT NULL
+);
+"""
+
+_UPSERT_DAILY = """
+INSERT INTO usage_daily(day, model, provider, requests, prompt_tokens, completion_tokens, total_tokens)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(day, model, provider) DO UPDATE SET
+    requests = requests + excluded.requests,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    total_tokens = total_tokens + excluded.total_tokens
+"""
+
+_UPSERT_USER = """
+INSERT INTO usage_user_daily(day, user_id, requests, prompt_tokens, completion_tokens, total_tokens)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(day, user_id) DO UPDATE SET
+    requests = requests + excluded.requests,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    total_tokens = total_tokens + excluded.total_tokens
+"""
+
+
+def _today() -> str:
+    return dt.date.today().isoformat()
+
+
+def _read_new_lines(path: Path, offset: int) -> Tuple[List[bytes], int]:
+    """Прочитать только дописанное с offset; хвост без \\n оставляем на следующий раз."""
+    size = path.stat().st_size
+    if size < offset:  # файл пересоздали
+        offset = 0
+    if size == offset:
+        return [], offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    end = data.rfind(b"\n")
+    if end < 0:
+        return [], offset
+    return data[:end].splitlines(), offset + end + 1
+
+
+class UsageDB:
+    """Агрегаты расхода токенов по моделям, провайдерам и пользователям."""
+
+    def __init__(self, db_path: str, default_daily_tokens: int = 0):
+        self.db_path = db_path
+        self.default_daily_tokens = int(default_daily_tokens)
+        self._ready = False
+
+    async def _init(self, db: aiosqlite.Connection) -> None:
+        if not self._ready:
+            await db.executescript(_SCHEMA)
+            self._ready = True
+
+    async def get_offset(self, file: str) -> int:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute("SELECT offset FROM usage_offsets WHERE file = ?", (file,)) as cur:
+                row = await cur.fetchone()
+        return int(row[0]) if row else 0
+
+    async def apply_batch(self, file: str, offset: int, rows: Dict[Tuple[str, str, str], List[int]],
+                          users: Dict[Tuple[str, int], List[int]]) -> None:
+        """Агрегаты и новый offset пишутся одной транзакцией — строки не задвоятся."""
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.executemany(_UPSERT_DAILY, [(*k, *v) for k, v in rows.items()])
+            await db.executemany(_UPSERT_USER, [(*k, *v) for k, v in users.items()])
+            await db.execute(
+                "INSERT INTO usage_offsets(file, offset) VALUES (?, ?) "
+                "ON CONFLICT(file) DO UPDATE SET offset = excluded.offset",
+                (file, offset),
+            )
+            await db.commit()
+
+    async def add_user_usage(self, user_id: int, prompt_tokens: int, completion_tokens: int) -> None:
+        total = int(prompt_tokens) + int(completion_tokens)
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            await db.execute(_UPSERT_USER, (_today(), int(user_id), 1, int(prompt_tokens), int(completion_tokens), total))
+            await db.commit()
+
+    async def set_budget(self, user_id: int, daily_tokens: Optional[int]) -> None:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            if daily_tokens is None:
+                await db.execute("DELETE FROM usage_budgets WHERE user_id = ?", (int(user_id),))
+            else:
+                await db.execute(
+                    "INSERT INTO usage_budgets(user_id, daily_tokens) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET daily_tokens = excluded.daily_tokens",
+                    (int(user_id), int(daily_tokens)),
+                )
+            await db.commit()
+
+    async def remaining_today(self, user_id: int) -> Optional[int]:
+        """Сколько токенов пользователь ещё может потратить сегодня; None — без лимита."""
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute(
+                "SELECT COALESCE((SELECT daily_tokens FROM usage_budgets WHERE user_id = ?), ?), "
+                "COALESCE((SELECT total_tokens FROM usage_user_daily WHERE day = ? AND user_id = ?), 0)",
+                (int(user_id), self.default_daily_tokens, _today(), int(user_id)),
+            ) as cur:
+                budget, used = await cur.fetchone()
+        if not budget or budget <= 0:
+            return None
+        return max(0, int(budget) - int(used))
+
+    async def summary(self, day: Optional[str] = None) -> List[tuple]:
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._init(db)
+            async with db.execute(
+                "SELECT model, provider, requests, total_tokens FROM usage_daily WHERE day = ? "
+                "ORDER BY total_tokens DESC",
+                (day or _today(),),
+            ) as cur:
+                return list(await cur.fetchall())
+
+
+class UsageTailer:
+    """
+    Дочитывает логи g4f (har_and_cookies/.usage/YYYY-MM-DD.jsonl) с сохранённого
+    offset и сливает агрегаты в UsageDB. Файлы целиком не перечитываются.
+    """
+
+    def __init__(self, usage_dir: Path, db: UsageDB, interval: float = 30.0):
+        self.usage_dir = Path(usage_dir)
+        self.db = db
+        self.interval = float(interval)
+        self._offsets: Dict[str, int] = {}
+
+    async def poll_once(self) -> int:
+        if not self.usage_dir.is_dir():
+            return 0
+        added = 0
+        for path in sorted(self.usage_dir.glob("*.jsonl")):
+            name = path.name
+            if name not in self._offsets:
+                self._offsets[name] = await self.db.get_offset(name)
+            lines, offset = await asyncio.to_thread(_read_new_lines, path, self._offsets[name])
+            if offset == self._offsets[name]:
+                continue
+
+            day = path.stem
+            rows: Dict[Tuple[str, str, str], List[int]] = {}
+            users: Dict[Tuple[str, int], List[int]] = {}
+            for raw in lines:
+                try:
+                    it = json.loads(raw)
+                except ValueError:
+                    continue
+                if not isinstance(it, dict):
+                    continue
+                try:
+                    p = int(it.get("prompt_tokens") or 0)
+                    c = int(it.get("completion_tokens") or 0)
+                    t = int(it.get("total_tokens") or p + c)
+                except (TypeError, ValueError):
+                    continue
+                agg = rows.setdefault((day, str(it.get("model") or "?"), str(it.get("provider") or "?")), [0, 0, 0, 0])
+                agg[0] += 1; agg[1] += p; agg[2] += c; agg[3] += t
+                uid = it.get("user")
+                if isinstance(uid, int) or (isinstance(uid, str) and uid.isdigit()):
+                    u = users.setdefault((day, int(uid)), [0, 0, 0, 0])
+                    u[0] += 1; u[1] += p; u[2] += c; u[3] += t
+
+            await self.db.apply_batch(name, offset, rows, users)
+            self._offsets[name] = offset
+            added += len(lines)
+        if added:
+            logger.debug(f"[usage] +{added} lines")
+        return added
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.warning(f"[usage] poll failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+
+def default_usage_dir(base: Path) -> Path:
+    return Path(get_settings().g4f_usage_dir or base / "har_and_cookies" / ".usage")
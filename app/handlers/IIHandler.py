@@ -1,16 +1,19 @@
 # app/handlers/IIHandler.py
 from __future__ import annotations
+import asyncio
 import re
-import html
+import time
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from datetime import datetime, timedelta
-from typing import Any, List, Tuple
+from typing import Any, List, Optional, Tuple
 
-from g4f.client import Client
-from g4f import models as g4f_models
 from loguru import logger as _logger
 
+from app.db.ChatMemoryDB import estimate_tokens
+from app.utils.metrics import II_MODEL
+from app.utils.settings import get_settings
+from app.utils.workers import PoolBusy, ProcessWorkerPool, TaskTimeout
+
 logger = _logger.bind(feature="ii")
 
 _IS_NAME = lambda s: isinstance(s, str) and bool(re.fullmatch(r"[A-Za-z0-9._\-:]+", s))
@@ -24,10 +27,9 @@ _PRIORITY: Tuple[str, ...] = (
     "gpt-4o-mini", "gpt-4o", "gpt-4.1-mini", "gpt-3.5-turbo", "claude-3-haiku", "gemini-pro"
 )
 
-_BLOCK_RE = re.compile(r"```([a-zA-Z0-9_+\-]*)\s*\n(.*?)```", re.DOTALL)
-_INLINE_RE = re.compile(r"`([^`\n]+)`")
+def _collect_model_ids() -> Tuple[str, ...]:
+    from g4f import models as g4f_models
 
-async def _collect_model_ids() -> Tuple[str, ...]:
     out: List[str] = []
     for name in dir(g4f_models):
         if name.startswith("_"):
@@ -48,106 +50,158 @@ async def _collect_model_ids() -> Tuple[str, ...]:
             result.append(mid); seen.add(mid)
     return tuple(result)
 
-async def _format_for_html(text: str) -> str:
-    placeholders: List[str] = []
-
-    async def _put(fragment: str) -> str:
-        idx = len(placeholders)
-        placeholders.append(fragment)
-        return f"@@BLOCK{idx}@@"
-
-    async def repl_block(m: re.Match) -> str:
-        code = m.group(2) or ""
-        return _put(f"<pre><code>{html.escape(code)}</code></pre>")
-
-    async def repl_inline(m: re.Match) -> str:
-        code = m.group(1) or ""
-        return _put(f"<code>{html.escape(code)}</code>")
+_client: Any = None
+_client_key: Tuple[Optional[str], Optional[str]] = (None, None)
+_POOL: ProcessWorkerPool | None = None
+_MODEL_IDS: Tuple[str, ...] | None = None
+
+
+def model_ids() -> Tuple[str, ...]:
+    """Список моделей g4f; первый вызов импортирует g4f (~0.6 с), дальше — из памяти."""
+    global _MODEL_IDS
+    if _MODEL_IDS is None:
+        _MODEL_IDS = _collect_model_ids() or _PRIORITY
+    return _MODEL_IDS
+
+
+def _complete(model: str, messages: List[dict], base_url: Optional[str] = None,
+              api_key: Optional[str] = None) -> Tuple[str, int, int]:
+    """Выполняется в процессе-воркере: один запрос к g4f, наружу — текст и токены.
+
+    base_url/api_key приходят из настроек главного процесса при каждом вызове:
+    воркер .env не читает, а смена ключа на лету пересоздаёт клиента.
+    """
+    global _client, _client_key
+    if _client is None or _client_key != (base_url, api_key):
+        from g4f.client import Client
+
+        # II_BASE_URL — OpenAI-совместимый сервер вместо провайдеров g4f (свой шлюз, стенд нагрузки)
+        _client = Client(base_url=base_url, api_key=api_key or "-") if base_url else Client()
+        _client_key = (base_url, api_key)
+    try:
+        resp = _client.chat.completions.create(model=model, messages=messages, temperature=0.6, web_search=False)
+    except TypeError:
+        resp = _client.chat.completions.create(model=model, messages=messages, temperature=0.6)
+    content = _EXTRACT(getattr(resp.choices[0].message, "content", None))
+    usage = getattr(resp, "usage", None)
+    prompt = int(getattr(usage, "prompt_tokens", 0) or 0) or sum(estimate_tokens(m["content"]) for m in messages)
+    completion = int(getattr(usage, "completion_tokens", 0) or 0) or estimate_tokens(content)
+    return content, prompt, completion
+
+
+def get_pool() -> ProcessWorkerPool:
+    """Общий на весь бот пул воркеров g4f."""
+    global _POOL
+    if _POOL is None:
+        s = get_settings()
+        _POOL = ProcessWorkerPool(
+            size=s.ii_workers,
+            max_tasks=s.ii_worker_max_tasks,
+            max_rss_mb=s.ii_worker_max_rss_mb,
+            queue_size=s.ii_queue_size,
+            name="ii",
+        )
+    return _POOL
+
+
+def _preload() -> bool:
+    """Выполняется в воркере: импорт g4f заранее, чтобы первый вопрос за него не платил."""
+    import g4f.client  # noqa: F401
+    return True
+
+
+async def warm_up(workers: int = 1) -> None:
+    """Фоновый прогрев после старта: список моделей в главном процессе и workers воркеров пула."""
+    await asyncio.to_thread(model_ids)
+    pool = get_pool()
+    n = max(0, min(workers, pool.size))
+    results = await asyncio.gather(*(pool.submit(_preload, timeout=120) for _ in range(n)), return_exceptions=True)
+    logger.info(f"[II] warm: models={len(model_ids())} workers={sum(r is True for r in results)}/{n}")
+
+
+async def shutdown_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        await _POOL.close()
+        _POOL = None
 
-    s = _BLOCK_RE.sub(repl_block, text)
-    s = _INLINE_RE.sub(repl_inline, s)
-    s = html.escape(s)
-    for i, frag in enumerate(placeholders):
-        s = s.replace(f"@@BLOCK{i}@@", frag)
-    return s
 
 class IIHandler:
-    async def __init__(self, limit_per_run: int = 15, blacklist_minutes: int = 10, timeout_seconds: int = 20):
-        self.client = Client()
-        self._models: Tuple[str, ...] = await _collect_model_ids() or _PRIORITY
+    BUSY = "ИИ сейчас перегружен, попробуйте через минуту."
+
+    def __init__(self, limit_per_run: int = 15, blacklist_minutes: int = 10, timeout_seconds: int = 20):
+        self._models: Tuple[str, ...] = model_ids()
         self._last_ok: str | None = None
         self._blacklist: dict[str, datetime] = {}
+        self.last_usage: Tuple[int, int] | None = None
         self.limit_per_run = int(limit_per_run)
         self.blacklist_minutes = int(blacklist_minutes)
         self.timeout_seconds = int(timeout_seconds)
-        self._executor = ThreadPoolExecutor(max_workers=2)
         logger.info(f"[II] models={self._models}")
 
-    async def _is_blacklisted(self, model: str) -> bool:
-        until = await self._blacklist.get(model)
+    def _is_blacklisted(self, model: str) -> bool:
+        until = self._blacklist.get(model)
         if not until:
             return False
         if datetime.utcnow() >= until:
-            await self._blacklist.pop(model, None)
+            self._blacklist.pop(model, None)
             return False
         return True
 
-    async def _blacklist_model(self, model: str) -> None:
+    def _blacklist_model(self, model: str) -> None:
         self._blacklist[model] = datetime.utcnow() + timedelta(minutes=self.blacklist_minutes)
 
-    async def _request(self, model: str, text: str):
-        try:
-            return self.client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": text}],
-                temperature=0.6,
-                web_search=False,
-            )
-        except TypeError:
-            return self.client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": text}],
-                temperature=0.6,
-            )
-
-    async def _try_model_once(self, model: str, text: str) -> str | None:
+    async def _try_model_once(self, model: str, messages: List[dict]) -> str | None:
+        started = time.monotonic()
+        status = "error"
         try:
-            fut = await self._executor.submit(self._request, model, text)
-            resp = await fut.result(timeout=self.timeout_seconds)
-            msg = resp.choices[0].message
-            content = await _EXTRACT(getattr(msg, "content", None))
+            s = get_settings()
+            content, prompt, completion = await get_pool().submit(
+                _complete, model, messages, s.ii_base_url, s.ii_api_key, timeout=self.timeout_seconds)
             if not content:
                 raise ValueError("empty")
+            status = "ok"
             self._last_ok = model
+            self.last_usage = (prompt, completion)
             logger.info(f"[II] ok={model}")
-            return await _format_for_html(content)
-        except TimeoutError:
+            return content
+        except PoolBusy:
+            raise
+        except TaskTimeout:
+            status = "timeout"
             logger.warning(f"[II] timeout={model}")
-            await self._blacklist_model(model)
+            self._blacklist_model(model)
             return None
         except Exception as e:
             logger.warning(f"[II] fail={model} err={e}")
-            await self._blacklist_model(model)
+            self._blacklist_model(model)
             return None
+        finally:
+            II_MODEL.labels(model, status).observe(time.monotonic() - started)
 
-    async def answerII(self, text: str, cycles: int = 2) -> str:
+    async def answerII(self, text: str, cycles: int = 2, history: Optional[List[dict]] = None) -> str:
+        messages = [*(history or ()), {"role": "user", "content": text}]
         order = deque()
-        if self._last_ok and self._last_ok in self._models and not await self._is_blacklisted(self._last_ok):
-            await order.append(self._last_ok)
+        if self._last_ok and self._last_ok in self._models and not self._is_blacklisted(self._last_ok):
+            order.append(self._last_ok)
         for m in self._models:
             if m != self._last_ok:
-                await order.append(m)
+                order.append(m)
         allowed = [m for m in order if not self._is_blacklisted(m)]
         if not allowed:
             return "Все модели не ответили."
         allowed = allowed[: self.limit_per_run]
-        for c in range(1, cycles + 1):
-            logger.info(f"[II] cycle {c}/{cycles}")
-            for m in allowed:
-                ans = await self._try_model_once(m, text)
-                if ans:
-                    return ans
+        try:
+            for c in range(1, cycles + 1):
+                logger.info(f"[II] cycle {c}/{cycles}")
+                for m in allowed:
+                    ans = await self._try_model_once(m, messages)
+                    if ans:
+                        return ans
+        except PoolBusy as e:
+            logger.warning(f"[II] busy: {e}")
+            return self.BUSY
         return "Все модели не ответили."
 
-    async def get_answer(self, text: str) -> str:
-        return await self.answerII(text)
\ No newline at end of file
+    async def get_answer(self, text: str, history: Optional[List[dict]] = None) -> str:
+        return await self.answerII(text, history=history)
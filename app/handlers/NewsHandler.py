@@ -1,40 +1,58 @@
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
-import os
+from typing import Optional
+
 import requests
 from loguru import logger
 from urllib.parse import urljoin, urlparse, parse_qs
 
-class NewsHandler:
-    def __init__(self):
-        load_dotenv(dotenv_path="/home/gleb/TGbot_projects/.env", override=True)
+from app.utils.breaker import CircuitOpen, LastGood, breaker, http_failure
+from app.utils.settings import Settings, get_settings
 
-        self.base_url = os.getenv('base_url')
-        self.half_url = os.getenv('half_url')
+LAST_GOOD = LastGood(max_items=64)
+
+class NewsHandler:
+    def __init__(self, settings: Optional[Settings] = None):
+        s = settings or get_settings()
+        self.base_url = s.news_base_url
+        self.half_url = s.news_half_url
 
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
                           "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
+        # время получения отданной устаревшей страницы (сайт недоступен), иначе None
+        self.stale_since = None
+
+    def _get(self, url):
+        return breaker(url).call(
+            requests.get, url, headers=self.headers, timeout=30, verify=False, failure=http_failure
+        )
+
+    def _stale(self, url):
+        hit = LAST_GOOD.get(url)
+        if hit:
+            self.stale_since = hit[1]
+            logger.warning(f"Сайт новостей недоступен, отдаём страницу из кэша: {url}")
+            return hit[0]
+        return None
 
     def fetch_page(self):
         try:
-            response = requests.get(
-                self.base_url,
-                headers=self.headers,
-                timeout=30,
-                verify=False
-            )
+            response = self._get(self.base_url)
             if response.status_code == 200:
                 logger.success("Страница успешно получена")
+                LAST_GOOD.put(self.base_url, response.text)
                 return response.text
             else:
                 logger.error(f"Ошибка загрузки страницы. Код ответа: {response.status_code}")
+        except CircuitOpen as e:
+            logger.warning(str(e))
         except requests.exceptions.RequestException as e:
             logger.exception(f"Ошибка {e}")
-        return None
+        return self._stale(self.base_url)
 
     def parse_news(self, html):
+        from bs4 import BeautifulSoup
+
         news_data = []
         try:
             soup = BeautifulSoup(html, 'html.parser')
@@ -54,7 +72,7 @@ class NewsHandler:
                                 if title and url:
                                     news_data.append({'title': title, 'link': url, 'photo_link': image_link})
         except Exception as e:
-            print(f"Ошибка парсинга новостей- {e}")
+            logger.warning(f"Ошибка парсинга новостей: {e}")
         return news_data
 
     def get_news(self):
@@ -63,75 +81,80 @@ class NewsHandler:
             return self.parse_news(html)
         return []
     
+    def fetch_article(self, url):
+        """HTML статьи или None; разбор отдельно — parse_article (в боте — в пуле CPU)."""
+        try:
+            response = self._get(url)
+            if response.status_code == 200:
+                return response.text
+            logger.error(f"Ошибка загрузки статьи. Код ответа: {response.status_code}")
+        except (CircuitOpen, requests.exceptions.RequestException) as e:
+            logger.warning(f"Ошибка запроса статьи: {e}")
+        return None
+
     def parse_deep_news(self, url):
+        html = self.fetch_article(url)
+        return self.parse_article(html) if html else None
+
+    def parse_article(self, html):
+        from bs4 import BeautifulSoup
+
         cleaned = []
         images = []
         media = []
+        deep_news = None
+
+        soup=BeautifulSoup(html, features='html.parser')
+        if soup:
+            content_div=soup.find('div', class_='l-main')
+            if content_div:
+                content=content_div.find('article', class_='article')
+                if content:
+                    try:
+                        for p in content.find_all('p'):
+                            cleaned.append(self.clean_html_tags(p))
+                    except:
+                        logger.debug('Не найдены параграфы')
+
+                    try:
+                        main_photo_tag=content.find('figure', class_='article__left article__photo')
+                        main_photo_url_tag=main_photo_tag.find('img', src=True)
+                        main_image_url = main_photo_url_tag['src']
+                        images.append(main_image_url)
+                    except:
+                        logger.debug('Не найдено главное фото')
+
+                    try:
+                        for figure in content.find_all('figure'):
+                            photo_div = figure.find('div', class_='article__video-container')
+                            if photo_div:
+                                image_tag = photo_div.find('img', src=True)
+                                if image_tag:
+                                    image_url = image_tag['src']
+                                    images.append(image_url)
+                    except:
+                        logger.debug('Не найдены доп. фото')
+
+                    try:
+                        mediaextractor=ArticleVideoExtractor(html, base_url=self.half_url)
+                        media=mediaextractor.extract_videos()
+                    except:
+                        logger.debug('Не найдено медиа')
+
+                    deep_news = {
+                            'title': cleaned,
+                            'images': images,
+                            'media': media
+                            }
 
-        try:
-            response = requests.get(
-                url,
-                headers=self.headers,
-                timeout=30,
-                verify=False
-            )
-            if response.status_code == 200:
-                soup=BeautifulSoup(response.text, features='html.parser')
-                if soup:
-                    content_div=soup.find('div', class_='l-main')
-                    if content_div:
-                        content=content_div.find('article', class_='article')
-                        if content:
-                            try:
-                                for p in content.find_all('p'):
-                                    cleaned.append(self.clean_html_tags(p))
-                            except:
-                                print('Не найдены параграфы')
-
-                            try:
-                                main_photo_tag=content.find('figure', class_='article__left article__photo')
-                                main_photo_url_tag=main_photo_tag.find('img', src=True)
-                                main_image_url = main_photo_url_tag['src']
-                                images.append(main_image_url)
-                            except:
-                                print('не найдено главное фото')
-
-                            try:
-                                for figure in content.find_all('figure'):
-                                    photo_div = figure.find('div', class_='article__video-container')
-                                    if photo_div:
-                                        image_tag = photo_div.find('img', src=True)
-                                        if image_tag:
-                                            image_url = image_tag['src']
-                                            images.append(image_url)
-                            except:
-                                print('не найдены доп фото')
-
-                            try:
-                                mediaextractor=ArticleVideoExtractor(response.text)
-                                media=mediaextractor.extract_videos()
-                            except:
-                                print('не найдено медиа')
-                                
-                            deep_news = {
-                                    'title': cleaned,
-                                    'images': images,
-                                    'media': media
-                                    }
-
-                        else:
-                            print('не найден article')
-                    else:
-                        print('Не найден div с контентом')
                 else:
-                    print('Не удалось сформировать суп')
+                    logger.warning('Не найден article')
             else:
-                print(f"Ошибка - Код ответа: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"Ошибка - запроса: {e}")
-        print(media)
+                logger.warning('Не найден div с контентом')
+        else:
+            logger.warning('Не удалось сформировать суп')
         return deep_news
-    
+
     def clean_html_tags(self, tag):
         allowed_tags = {'b', 'strong', 'i', 'em', 'u', 's', 'strike', 'del', 'code', 'pre'}
         allowed_attrs = {'href'}
@@ -152,8 +175,11 @@ class NewsHandler:
             return {'title':'Не удалось найти статью'}
         
 class ArticleVideoExtractor:
-    def __init__(self, html):
+    def __init__(self, html, base_url: Optional[str] = None):
+        from bs4 import BeautifulSoup
+
         self.soup = BeautifulSoup(html, 'html.parser')
+        self.base_url = base_url if base_url is not None else get_settings().news_half_url
 
     def _extract_youtube_id(self, url):
         parsed_url = urlparse(url)
@@ -180,7 +206,7 @@ class ArticleVideoExtractor:
 
     def extract_videos(self):
         videos = []
-        base_url = os.getenv('half_url')
+        base_url = self.base_url
         main_content_scope = self.soup.find('div', class_='main-wrap') or self.soup.find('article')
         search_scope = main_content_scope if main_content_scope else self.soup
 
@@ -2,7 +2,9 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Optional, Tuple, List, Dict
+import threading
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, Tuple, List, Dict
 from zoneinfo import ZoneInfo
 
 import requests
@@ -11,6 +13,15 @@ from urllib3.util.retry import Retry
 from loguru import logger
 import asyncio
 
+from app.db.AlertsDB import AlertSub
+from app.utils.breaker import breaker, http_failure
+from app.utils.metrics import cache_hit
+from app.utils.geo import Gazetteer, gazetteer_ready, get_gazetteer
+from app.utils.iss_map import Image, IssMap
+from app.utils.iss_feed import ISSFeed, ISSState, state_from_engine
+from app.utils.orbit import Pass, TLECache
+from app.utils.settings import Settings, get_settings
+
 UA = (
     "InfoBot/1.0 "
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
@@ -18,13 +29,14 @@ UA = (
 )
 
 
-async def _make_session() -> requests.Session:
+def _make_session() -> requests.Session:
     """HTTP-сессия с ретраями и нормальным пулом соединений."""
     s = requests.Session()
     s.headers.update({"User-Agent": UA, "Accept": "application/json"})
+    # один быстрый повтор на случайный сбой; затяжные отказы отсекает предохранитель (_get)
     retry = Retry(
-        total=3,
-        backoff_factor=0.5,
+        total=1,
+        backoff_factor=0.2,
         status_forcelist=(429, 500, 502, 503, 504),
         allowed_methods=frozenset(["GET"]),
     )
@@ -33,7 +45,93 @@ async def _make_session() -> requests.Session:
     s.mount("https://", adapter)
     return s
 
-HTTP = asyncio.run(_make_session())
+_HTTP: Optional[requests.Session] = None
+_HTTP_LOCK = threading.Lock()
+
+
+def _session() -> requests.Session:
+    """Сессия создаётся при первом запросе, а не при импорте модуля."""
+    global _HTTP
+    if _HTTP is None:
+        with _HTTP_LOCK:
+            if _HTTP is None:
+                _HTTP = _make_session()
+    return _HTTP
+
+_REVERSE_CACHE: Dict[Tuple[float, float], Optional[dict]] = {}
+
+
+def _get(url: str, **kwargs) -> requests.Response:
+    """GET под предохранителем хоста: пока сервис лежит, отказ мгновенный."""
+    return breaker(url).call(_session().get, url, failure=http_failure, **kwargs)
+
+
+def _fetch_text(url: str) -> str:
+    r = _get(url, timeout=15)
+    r.raise_for_status()
+    return r.text
+
+
+class _ReportInputs:
+    """
+    Входные данные одного отчёта: каждый ключ запрашивается один раз,
+    все запросы идут параллельно и ограничены общим дедлайном. Что не
+    успело — отменяется, отчёт рендерится без него.
+    """
+
+    def __init__(self, deadline: float):
+        self._loop = asyncio.get_running_loop()
+        self.deadline = self._loop.time() + deadline
+        self._tasks: Dict[tuple, asyncio.Future] = {}
+        self.missed: List[str] = []
+
+    def left(self) -> float:
+        return max(0.0, self.deadline - self._loop.time())
+
+    def once(self, key: tuple, factory: Callable[[], Awaitable]) -> asyncio.Future:
+        t = self._tasks.get(key)
+        if t is None:
+            t = self._tasks[key] = asyncio.ensure_future(factory())
+        return t
+
+    async def get(self, key: tuple, factory: Callable[[], Awaitable]):
+        # shield: отмена зависимого запроса не должна отменять общий
+        return await asyncio.shield(self.once(key, factory))
+
+    async def wait(self, key: tuple, factory: Callable[[], Awaitable]):
+        return await asyncio.wait_for(self.get(key, factory), timeout=self.left())
+
+    async def settle(self) -> None:
+        pending = [t for t in self._tasks.values() if not t.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=self.left())
+        for key, t in self._tasks.items():
+            if not t.done():
+                self.missed.append(key[0])
+        self.cancel()
+
+    def cancel(self) -> None:
+        for t in self._tasks.values():
+            if not t.done():
+                t.cancel()
+
+    def finished(self, key: tuple) -> bool:
+        t = self._tasks.get(key)
+        return t is not None and t.done() and not t.cancelled()
+
+    def result(self, key: tuple):
+        if not self.finished(key):
+            return None
+        t = self._tasks[key]
+        if t.exception() is not None:
+            logger.bind(feature="space").warning(f"space report {key[0]} failed: {t.exception()!r}")
+            return None
+        return t.result()
+
+
+def _compass(azimuth: float) -> str:
+    directions = ["С", "СВ", "В", "ЮВ", "Ю", "ЮЗ", "З", "СЗ"]
+    return directions[int((azimuth + 22.5) / 45) % 8]
 
 
 class SpaceHandler:
@@ -41,17 +139,28 @@ class SpaceHandler:
     REV = "https://geocoding-api.open-meteo.com/v1/reverse"
 
     ISS_NOW = "http://api.open-notify.org/iss-now.json"
-    ISS_PASS = "http://api.open-notify.org/iss-pass.json"
     ISS_NOW_HTTPS = "https://api.open-notify.org/iss-now.json"
-    ISS_PASS_HTTPS = "https://api.open-notify.org/iss-pass.json"
 
     WHERETHEISS = "https://api.wheretheiss.at/v1/satellites/25544"
 
-    _cache_now: Dict[str, tuple[dt.datetime, tuple[float, float, dt.datetime]]] = {}
-    _cache_pass: Dict[str, tuple[dt.datetime, List[Tuple[dt.datetime, int]]]] = {}
-    _TTL_NOW = dt.timedelta(seconds=5)
+    _cache_pass: Dict[str, tuple[dt.datetime, List[Pass]]] = {}
     _TTL_PASS = dt.timedelta(minutes=10)
 
+    TLE = TLECache(
+        Path(__file__).resolve().parents[2] / "cache" / "iss.tle",
+        fetch=_fetch_text,
+    )
+    FEED: ISSFeed
+    MAP: Optional[IssMap] = None
+
+    @staticmethod
+    def configure(s: Settings) -> None:
+        """Пути и интервалы из настроек — при запуске бота, до первого запроса."""
+        if s.tle_cache:
+            SpaceHandler.TLE.path = Path(s.tle_cache)
+        SpaceHandler.TLE.max_age = s.tle_max_age_hours * 3600
+        SpaceHandler.FEED.interval = s.iss_poll_seconds
+
     @staticmethod
     async def get_iss_orbital_info() -> str:
         return (
@@ -65,14 +174,51 @@ class SpaceHandler:
             "• Размер: 73×109×20 м\n"
         )
 
+    @staticmethod
+    async def _gazetteer() -> Optional[Gazetteer]:
+        """Офлайн-справочник; первый вызов грузит дамп в потоке, дальше — без потоков."""
+        if gazetteer_ready():
+            return get_gazetteer()
+        return await asyncio.to_thread(get_gazetteer)
+
+    @staticmethod
+    async def _reverse(lat: float, lon: float) -> Optional[dict]:
+        """Reverse-геокодинг по HTTP (только если нет справочника); один запрос на точку."""
+        key = (round(lat, 2), round(lon, 2))
+        cache_hit("reverse_geocode", key in _REVERSE_CACHE)
+        if key in _REVERSE_CACHE:
+            return _REVERSE_CACHE[key]
+        try:
+            r = await asyncio.to_thread(
+                _get, SpaceHandler.REV, params={"latitude": lat, "longitude": lon, "language": "ru"}, timeout=6
+            )
+            r.raise_for_status()
+            res = (r.json().get("results") or [])
+            it = res[0] if res else None
+        except Exception:
+            return None
+        if len(_REVERSE_CACHE) >= 1024:
+            _REVERSE_CACHE.pop(next(iter(_REVERSE_CACHE)))
+        _REVERSE_CACHE[key] = it
+        return it
+
     @staticmethod
     async def geocode_city(city: str) -> Optional[Tuple[float, float, str, Optional[str]]]:
         """
         Возвращает (lat, lon, метка, timezone_name|None)
         """
+        logger.bind(feature="space").debug(f"Geocoding city: {city!r}")
+        gaz = await SpaceHandler._gazetteer()
+        hit = gaz.find(city) if gaz else None
+        if hit:
+            c, name = hit
+            label = f"{name}, {gaz.country_name(c.country)}"
+            logger.bind(feature="space").info(f"Geocoded offline '{city}' -> {c.lat},{c.lon} | {label} | tz={c.timezone}")
+            return c.lat, c.lon, label, c.timezone or None
         try:
-            logger.bind(feature="space").debug(f"Geocoding city: {city!r}")
-            r = await HTTP.get(SpaceHandler.GEO, params={"name": city, "count": 1, "language": "ru"}, timeout=12)
+            r = await asyncio.to_thread(
+                _get, SpaceHandler.GEO, params={"name": city, "count": 1, "language": "ru"}, timeout=12
+            )
             r.raise_for_status()
             j = r.json()
             res = j.get("results") or []
@@ -98,133 +244,152 @@ class SpaceHandler:
 
     @staticmethod
     async def _reverse_timezone(lat: float, lon: float) -> Optional[str]:
-        """Определяем таймзону по координатам (reverse)."""
-        try:
-            r = await HTTP.get(SpaceHandler.REV, params={"latitude": lat, "longitude": lon, "language": "ru"}, timeout=12)
-            r.raise_for_status()
-            res = (r.json().get("results") or [])
-            return (res[0].get("timezone") if res else None)
-        except Exception:
-            return None
+        """Определяем таймзону по координатам: часовой пояс ближайшего города."""
+        gaz = await SpaceHandler._gazetteer()
+        if gaz:
+            return gaz.timezone_at(lat, lon)
+        it = await SpaceHandler._reverse(lat, lon)
+        return it.get("timezone") if it else None
 
     @staticmethod
     async def iss_now() -> Optional[Tuple[float, float, dt.datetime]]:
-        key = "iss_now"
-        now = dt.datetime.now(dt.timezone.utc)
-        cached = await SpaceHandler._cache_now.get(key)
-        if cached and (now - cached[0]) < SpaceHandler._TTL_NOW:
-            return cached[1]
-
-        sources = await [
-            (SpaceHandler.ISS_NOW, SpaceHandler._parse_open_notify_position),
-            (SpaceHandler.ISS_NOW_HTTPS, SpaceHandler._parse_open_notify_position),
-            (SpaceHandler.WHERETHEISS, SpaceHandler._parse_wheretheiss_position),
-        ]
-        for url, parser in sources:
-            try:
-                r = await HTTP.get(url, timeout=10)
-                r.raise_for_status()
-                data = r.json()
-                value = parser(data)
-                if value:
-                    SpaceHandler._cache_now[key] = (now, value)
-                    return value
-            except Exception as e:
-                logger.bind(feature="space").warning(f"iss_now fail {url}: {e}")
-                continue
-        return None
+        st = await SpaceHandler.FEED.get()
+        return (st.latitude, st.longitude, st.timestamp) if st else None
 
     @staticmethod
-    async def _parse_open_notify_position(data: dict) -> Optional[Tuple[float, float, dt.datetime]]:
+    def _parse_open_notify_position(data: dict) -> Optional[ISSState]:
         pos = data.get("iss_position") or {}
         if "latitude" not in pos or "longitude" not in pos:
             return None
         lat = float(pos["latitude"])
         lon = float(pos["longitude"])
         ts = dt.datetime.fromtimestamp(int(data.get("timestamp", 0)), tz=dt.timezone.utc)
-        return lat, lon, ts
+        return ISSState(lat, lon, 408.0, 27600.0, "unknown", ts, "open-notify")
 
     @staticmethod
-    async def _parse_wheretheiss_position(data: dict) -> Optional[Tuple[float, float, dt.datetime]]:
+    def _parse_wheretheiss_position(data: dict) -> Optional[ISSState]:
         if "latitude" not in data or "longitude" not in data:
             return None
-        lat = float(data["latitude"])
-        lon = float(data["longitude"])
-        ts = dt.datetime.fromtimestamp(int(data.get("timestamp", 0)), tz=dt.timezone.utc)
-        return lat, lon, ts
+        return ISSState(
+            float(data["latitude"]),
+            float(data["longitude"]),
+            float(data.get("altitude", 408.0)),
+            float(data.get("velocity", 27600.0)),
+            data.get("visibility", "unknown"),
+            dt.datetime.fromtimestamp(int(data.get("timestamp", 0)), tz=dt.timezone.utc),
+            "wheretheiss",
+        )
+
+    @staticmethod
+    def _http_source(url: str, parser):
+        async def fetch() -> Optional[ISSState]:
+            r = await asyncio.to_thread(_get, url, timeout=10)
+            r.raise_for_status()
+            return parser(r.json())
+        return fetch
+
+    @staticmethod
+    async def _tle_source() -> Optional[ISSState]:
+        engine = await SpaceHandler.TLE.engine()
+        return state_from_engine(engine) if engine else None
 
     @staticmethod
     async def get_iss_detailed_info() -> Optional[dict]:
-        """Детальная информация из WhereTheISS (высота, скорость, освещённость)."""
+        """Высота, скорость и освещённость из общего ISSFeed."""
+        st = await SpaceHandler.FEED.get()
+        if not st:
+            return None
+        return {
+            "latitude": st.latitude,
+            "longitude": st.longitude,
+            "altitude": st.altitude,
+            "velocity": st.velocity,
+            "visibility": st.visibility,
+            "timestamp": int(st.timestamp.timestamp()),
+        }
+
+    @staticmethod
+    def render_live(st: ISSState, user_coords: Optional[Tuple[float, float]] = None) -> str:
+        lines = [
+            "🛰️ <b>МКС в реальном времени</b>",
+            f"📍 Координаты: {st.latitude:.2f}°, {st.longitude:.2f}°",
+            f"🔭 Высота: {st.altitude:.1f} км",
+            f"💫 Скорость: {st.velocity:.0f} км/ч",
+        ]
+        if st.visibility == "daylight":
+            lines.append("☀️ Освещение: на солнце")
+        elif st.visibility == "eclipsed":
+            lines.append("🌙 Освещение: в тени Земли")
+        if user_coords:
+            dist = SpaceHandler.calculate_distance_to_iss(*user_coords, st.latitude, st.longitude, st.altitude)
+            lines.append(f"📏 Расстояние: {dist['direct_distance']} км, {dist['direction']} ({dist['bearing']}°)")
+        lines.append(f"🕐 {st.timestamp.strftime('%H:%M:%S')} UTC")
+        return "\n".join(lines)
+
+    @staticmethod
+    async def render_map(user_coords: Optional[Tuple[float, float]] = None) -> Optional[bytes]:
+        """Карта трассы МКС (JPEG) или None, если нет Pillow/TLE/положения."""
+        if SpaceHandler.MAP is None:
+            if IssMap is None or Image is None:
+                return None
+            base = get_settings().iss_basemap or Path(__file__).resolve().parents[1] / "static" / "images" / "world.png"
+            SpaceHandler.MAP = IssMap(basemap=Path(base))
+        engine = await SpaceHandler.TLE.engine()
+        st = await SpaceHandler.FEED.get()
+        if engine is None or st is None:
+            return None
         try:
-            r = await HTTP.get(SpaceHandler.WHERETHEISS, timeout=10)
-            r.raise_for_status()
-            d = r.json()
-            return {
-                "latitude": float(d.get("latitude", 0.0)),
-                "longitude": float(d.get("longitude", 0.0)),
-                "altitude": float(d.get("altitude", 408.0)),
-                "velocity": float(d.get("velocity", 27600.0)),
-                "visibility": d.get("visibility", "unknown"),
-                "timestamp": int(d.get("timestamp", 0)),
-            }
-        except Exception:
+            return await asyncio.to_thread(SpaceHandler.MAP.render, engine, (st.latitude, st.longitude), user_coords)
+        except ValueError as e:
+            logger.bind(feature="space").warning(f"iss map: {e}")
             return None
 
     @staticmethod
-    async def iss_passes(lat: float, lon: float, n: int = 3) -> Optional[List[Tuple[dt.datetime, int]]]:
+    def render_alert(sub: AlertSub, p: Pass) -> str:
+        """Текст оповещения о пролёте; время — в поясе ближайшего к подписчику города."""
+        gaz = get_gazetteer() if gazetteer_ready() else None
+        tz = gaz.timezone_at(sub.lat, sub.lon) if gaz else None
+        when = p.rise.astimezone(ZoneInfo(tz)) if tz else p.rise
+        minutes = max(0, round((p.rise - dt.datetime.now(dt.timezone.utc)).total_seconds() / 60))
+        lines = [
+            f"🛰️ <b>МКС пролетит над вами через {minutes} мин</b>",
+            f"🕐 Восход в {when.strftime('%H:%M:%S')}{'' if tz else ' UTC'}, {_compass(p.rise_azimuth)} → {_compass(p.set_azimuth)}",
+            f"📐 Макс. высота: {p.max_elevation:.0f}°, длительность {p.duration // 60} мин",
+        ]
+        if p.visible:
+            lines.append("👀 Будет видна невооружённым глазом")
+        return "\n".join(lines)
+
+    @staticmethod
+    async def iss_passes(lat: float, lon: float, n: int = 3) -> Optional[List[Pass]]:
+        """Пролёты считаются локально по TLE (SGP4), сеть нужна только для обновления TLE."""
         if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
             logger.bind(feature="space").error(f"Invalid coords: {lat},{lon}")
             return None
 
         key = f"{round(lat,3)}|{round(lon,3)}|{int(n)}"
         now = dt.datetime.now(dt.timezone.utc)
-        cached = await SpaceHandler._cache_pass.get(key)
-        if cached and (now - cached[0]) < SpaceHandler._TTL_PASS:
+        cached = SpaceHandler._cache_pass.get(key)
+        fresh = bool(cached and (now - cached[0]) < SpaceHandler._TTL_PASS and cached[1][0].set > now)
+        cache_hit("iss_passes", fresh)
+        if fresh:
             return cached[1]
 
-        urls = await [SpaceHandler.ISS_PASS, SpaceHandler.ISS_PASS_HTTPS]
-        for url in urls:
-            try:
-                r = await HTTP.get(url, params={"lat": lat, "lon": lon, "n": int(n)}, timeout=15)
-                r.raise_for_status()
-                j = r.json()
-                resp = j.get("response")
-                if not isinstance(resp, list):
-                    continue
-                out: List[Tuple[dt.datetime, int]] = []
-                for it in resp:
-                    try:
-                        rise = dt.datetime.fromtimestamp(int(it["risetime"]), tz=dt.timezone.utc)
-                        dur = int(it["duration"])
-                        if dur > 0:
-                            out.append((rise, dur))
-                    except Exception:
-                        continue
-                if out:
-                    SpaceHandler._cache_pass[key] = await (now, out)
-                    return out
-            except Exception as e:
-                logger.bind(feature="space").warning(f"passes fail {url}: {e}")
-                continue
-
-        return await SpaceHandler._generate_fallback_passes(lat, lon, n=int(n))
-
-    @staticmethod
-    async def _generate_fallback_passes(lat: float, lon: float, n: int = 3) -> List[Tuple[dt.datetime, int]]:
-        """Примерные пролёты, если API недоступны (чтобы бот не молчал)."""
-        now = dt.datetime.now(dt.timezone.utc)
-        passes: List[Tuple[dt.datetime, int]] = []
-        # шаг ~90 минут, сдвиг чуть варьируем по широте
-        base_shift = 2.0 + abs(lat) / 30.0
-        for i in range(max(1, n)):
-            t = now + dt.timedelta(minutes=int(90 * (i + 1) + base_shift * 10))
-            dur = 300 + int(abs(lat) * 2)  # 5–8 минут
-            passes.append((t, dur))
-        return passes
+        engine = await SpaceHandler.TLE.engine()
+        if engine is None:
+            logger.bind(feature="space").warning("passes: no TLE available")
+            return None
+        try:
+            out = await asyncio.to_thread(engine.passes, lat, lon, now, n=int(n))
+        except Exception as e:
+            logger.bind(feature="space").warning(f"passes fail: {e}")
+            return None
+        if out:
+            SpaceHandler._cache_pass[key] = (now, out)
+        return out
 
     @staticmethod
-    async def calculate_distance_to_iss(
+    def calculate_distance_to_iss(
         user_lat: float, user_lon: float, iss_lat: float, iss_lon: float, iss_altitude: float = 408.0
     ) -> dict:
         import math
@@ -271,32 +436,39 @@ class SpaceHandler:
 
     @staticmethod
     async def _get_country_by_coords(lat: float, lon: float) -> Optional[str]:
-        try:
-            r = await HTTP.get(SpaceHandler.REV, params={"latitude": lat, "longitude": lon, "language": "ru"}, timeout=6)
-            if r.status_code == 200:
-                res = (r.json().get("results") or [])
-                if res:
-                    return res[0].get("country") or None
-        except Exception:
-            pass
-        return None
+        gaz = await SpaceHandler._gazetteer()
+        if gaz:
+            # далеко от любого города — океан, в сеть идти незачем
+            return gaz.country_at(lat, lon)
+        it = await SpaceHandler._reverse(lat, lon)
+        return (it.get("country") or None) if it else None
 
     @staticmethod
     async def format_passes(
         label: str,
-        passes: List[Tuple[dt.datetime, int]],
+        passes: List[Pass],
         now_iss: Optional[Tuple[float, float, dt.datetime]],
         tz_name: Optional[str],
         user_coords: Optional[Tuple[float, float]] = None,
+        *,
+        state: Optional[ISSState] = None,
+        country: Optional[str] = None,
     ) -> str:
+        """
+        Если state передан — отчёт собран заранее (_ReportInputs) и сеть здесь
+        не трогается; passes=None значит «не успели посчитать».
+        """
         lines: List[str] = []
         lines.append(await SpaceHandler.get_iss_orbital_info())
         lines += [f"📍 <b>Локация: {label}</b>", "🕐 <b>Ближайшие пролёты:</b>"]
 
-        if not passes:
-            lines.append("— нет данных —")
+        if passes is None:
+            lines.append("⏳ Пролёты не успели посчитаться — попробуйте ещё раз чуть позже.")
+        elif not passes:
+            lines.append("— в ближайшие двое суток МКС не поднимется над горизонтом выше 10° —")
         else:
-            for i, (rise_utc, dur) in enumerate(passes, 1):
+            for i, p in enumerate(passes, 1):
+                rise_utc = p.rise
                 hour = rise_utc.hour
                 if 6 <= hour < 12:
                     time_emoji = "🌅"
@@ -308,7 +480,12 @@ class SpaceHandler:
                     time_emoji = "🌙"
                 loc = await SpaceHandler._fmt_local(rise_utc, tz_name)
                 lines.append(f"{time_emoji} {i}. {rise_utc.strftime('%Y-%m-%d %H:%M:%S')} UTC{loc}")
-                lines.append(f"   ⏱️ Длительность: {await SpaceHandler._fmt_dur(dur)}")
+                lines.append(f"   ⏱️ Длительность: {await SpaceHandler._fmt_dur(p.duration)}")
+                lines.append(f"   📐 Макс. высота над горизонтом: {p.max_elevation:.0f}° "
+                             f"(в {p.culmination.strftime('%H:%M:%S')} UTC)")
+                lines.append(f"   🧭 Восход {_compass(p.rise_azimuth)} → заход {_compass(p.set_azimuth)}")
+                if p.visible:
+                    lines.append("   👀 Видна невооружённым глазом")
 
         if now_iss:
             lat, lon, ts = now_iss
@@ -322,7 +499,7 @@ class SpaceHandler:
 
             if user_coords:
                 user_lat, user_lon = user_coords
-                det = await SpaceHandler.get_iss_detailed_info()
+                det = state._asdict() if state else await SpaceHandler.get_iss_detailed_info()
                 altitude = float(det.get("altitude", 408.0)) if det else 408.0
                 if det:
                     velocity = float(det.get("velocity", 27600.0))
@@ -334,38 +511,80 @@ class SpaceHandler:
                         vis_text = "на солнце" if vis == "daylight" else ("в тени Земли" if vis == "eclipsed" else "на границе дня/ночи")
                         lines.append(f"{vis_emoji} Освещение: {vis_text}")
 
-                dist = await SpaceHandler.calculate_distance_to_iss(user_lat, user_lon, lat, lon, altitude)
+                dist = SpaceHandler.calculate_distance_to_iss(user_lat, user_lon, lat, lon, altitude)
                 lines.append(f"📏 Расстояние: {dist['direct_distance']} км")
                 lines.append(f"🧭 Направление: {dist['direction']} ({dist['bearing']}°)")
 
-            country = await SpaceHandler._get_country_by_coords(lat, lon)
+            if state is None:
+                country = await SpaceHandler._get_country_by_coords(lat, lon)
             if country:
                 lines.append(f"🌍 Сейчас над: {country}")
 
         return "\n".join(lines)
 
+    async def _collect(self, inputs: "_ReportInputs", label: str, lat: float, lon: float,
+                       tz: Optional[str], unavailable: str) -> str:
+        """Пролёты, положение МКС, страна под ней и таймзона — параллельно, до общего дедлайна."""
+        passes_key = ("passes", round(lat, 4), round(lon, 4))
+        inputs.once(passes_key, lambda: self.iss_passes(lat, lon, n=3))
+        inputs.once(("iss",), SpaceHandler.FEED.get)
+        if tz is None:
+            inputs.once(("tz", round(lat, 4), round(lon, 4)), lambda: self._reverse_timezone(lat, lon))
+
+        async def country() -> Optional[str]:
+            st = await inputs.get(("iss",), SpaceHandler.FEED.get)
+            return await self._get_country_by_coords(st.latitude, st.longitude) if st else None
+
+        inputs.once(("country",), country)
+        await inputs.settle()
+
+        passes = inputs.result(passes_key)
+        # None — расчёт упал; [] — просто нет видимых пролётов, это скажет format_passes
+        if inputs.finished(passes_key) and passes is None:
+            return unavailable
+        st: Optional[ISSState] = inputs.result(("iss",))
+        if tz is None:
+            tz = inputs.result(("tz", round(lat, 4), round(lon, 4)))
+        if inputs.missed:
+            logger.bind(feature="space").warning(f"space report partial, missed: {inputs.missed}")
+        now_iss = (st.latitude, st.longitude, st.timestamp) if st else None
+        return await self.format_passes(label, passes, now_iss, tz, (lat, lon),
+                                        state=st, country=inputs.result(("country",)))
+
     async def get_space_report_by_city(self, city: str) -> str:
-        geo = await self.geocode_city(city)
+        inputs = _ReportInputs(get_settings().space_report_deadline)
+        # МКС начинаем спрашивать сразу, пока геокодим
+        inputs.once(("iss",), SpaceHandler.FEED.get)
+        try:
+            geo = await inputs.wait(("geo", city), lambda: self.geocode_city(city))
+        except asyncio.TimeoutError:
+            inputs.cancel()
+            return "⚠️ Геокодер не ответил вовремя. Попробуйте ещё раз."
         if not geo:
+            inputs.cancel()
             return "Не нашёл такой город. Попробуйте ещё раз (пример: «Минск»)."
 
         lat, lon, label, tz = geo
-        passes = await self.iss_passes(lat, lon, n=3)
-        if not passes:
-            return f"⚠️ Сервис пролетов МКС временно недоступен для города «{label}». Попробуйте позже."
-
-        now_iss = self.iss_now()
-        return await self.format_passes(label, passes, now_iss, tz, (lat, lon))
+        return await self._collect(
+            inputs, label, lat, lon, tz,
+            f"⚠️ Сервис пролетов МКС временно недоступен для города «{label}». Попробуйте позже.",
+        )
 
     async def get_space_report_by_coords(self, lat: float, lon: float) -> str:
         if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
             return "Неверные координаты: широта [-90..90], долгота [-180..180]."
 
-        tz = await self._reverse_timezone(lat, lon)
         label = f"{lat:.4f}, {lon:.4f}"
-        passes = self.iss_passes(lat, lon, n=3)
-        if not passes:
-            return f"⚠️ Сервис пролетов МКС временно недоступен для координат {label}. Попробуйте позже."
+        return await self._collect(
+            _ReportInputs(get_settings().space_report_deadline), label, lat, lon, None,
+            f"⚠️ Сервис пролетов МКС временно недоступен для координат {label}. Попробуйте позже.",
+        )
 
-        now_iss = await self.iss_now()
-        return await self.format_passes(label, passes, now_iss, tz, (lat, lon))
\ No newline at end of file
+SpaceHandler.FEED = ISSFeed(
+    [
+        ("wheretheiss", SpaceHandler._http_source(SpaceHandler.WHERETHEISS, SpaceHandler._parse_wheretheiss_position)),
+        ("open-notify", SpaceHandler._http_source(SpaceHandler.ISS_NOW, SpaceHandler._parse_open_notify_position)),
+        ("open-notify-https", SpaceHandler._http_source(SpaceHandler.ISS_NOW_HTTPS, SpaceHandler._parse_open_notify_position)),
+        ("tle", SpaceHandler._tle_source),
+    ],
+)
@@ -1,9 +1,13 @@
-import os
 import json
+import time
 import requests
-from dotenv import load_dotenv
 from functools import wraps
 
+from app.utils.breaker import CircuitOpen, LastGood, breaker, http_failure
+from app.utils.geo import get_gazetteer
+from app.utils.metrics import cache_hit
+from app.utils.settings import get_settings
+
 SESSION = requests.Session()
 SESSION.headers.update({
     "User-Agent": (
@@ -13,12 +17,14 @@ SESSION.headers.update({
     )
 })
 
+OWM_URL = "https://api.openweathermap.org/data/2.5/weather"
+LAST_GOOD = LastGood()
+
 def require_weather_api(func):
-    """Декоратор: загружает API-ключ погоды и передаёт его в функцию."""
+    """Декоратор: берёт API-ключ погоды из текущих настроек и передаёт его в функцию."""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        load_dotenv(override=True)
-        api_key = os.getenv("weather_API")
+        api_key = get_settings().weather_api_key
         if not api_key:
             return {"temp": "API-ключ погоды не найден", "image": "error.png"}
         return func(*args, api_key=api_key, **kwargs)
@@ -64,18 +70,94 @@ class WeatherHandler:
         if m == "clear": return "☀️"
         return "🌤️"
 
+    @staticmethod
+    def _stale_or(key: str, error: dict) -> dict:
+        """Сервис недоступен: последняя удачная погода с пометкой, иначе ошибка."""
+        hit = LAST_GOOD.get(key)
+        if not hit:
+            return error
+        value, ts = hit
+        note = f"\n\n⚠️ Данные на {time.strftime('%H:%M', time.localtime(ts))} — сервис погоды сейчас недоступен."
+        return {**value, "temp": value["temp"] + note, "stale": True}
+
+    @staticmethod
+    def resolve_city(city: str):
+        """
+        Город из офлайн-справочника (опечатки, транслит, «Питер») -> (ключ кэша, параметры запроса).
+        Без справочника или при промахе — запрос по имени, как раньше.
+        """
+        gaz = get_gazetteer()
+        hit = gaz.resolve(city) if gaz else None
+        if hit:
+            c = hit[0]
+            # id у OpenWeather совпадают с GeoNames для большинства городов; на 404 — по координатам
+            return f"id:{c.id}", [{"id": c.id}, {"lat": c.lat, "lon": c.lon}]
+        return city.strip().lower(), [{"q": city}]
+
+    @staticmethod
+    def _request(variants: list, api_key: str) -> requests.Response:
+        r = None
+        for params in variants:
+            r = breaker(OWM_URL).call(
+                SESSION.get,
+                OWM_URL,
+                params={**params, "appid": api_key, "units": "metric", "lang": "ru"},
+                timeout=12,
+                failure=http_failure,
+            )
+            if r.status_code != 404:
+                break
+        return r
+
+    @staticmethod
+    def format_weather(data: dict, city: str) -> dict:
+        """Ответ OpenWeather -> {temp: текст, image: картинка}."""
+        city_name = data.get("name") or city
+
+        weather0 = (data.get("weather") or [{}])[0]
+        main = weather0.get("main", "")
+        desc = (weather0.get("description") or "").capitalize()
+
+        main_blk = data.get("main") or {}
+        temp = round(float(main_blk.get("temp", 0)))
+        feels = round(float(main_blk.get("feels_like", temp)))
+        humidity = int(main_blk.get("humidity", 0))
+
+        pressure_hpa = float(main_blk.get("pressure", 0))
+        pressure_mmhg = round(pressure_hpa * 0.75006)
+
+        wind = float((data.get("wind") or {}).get("speed", 0.0))
+
+        image = WeatherHandler._choose_image(data, temp)
+        emoji = WeatherHandler._emoji_for(main)
+
+        text = (
+            f"{emoji} Погода в {city_name}:\n"
+            f"• {desc}\n"
+            f"• Температура: {temp}°C (ощущается как {feels}°C)\n"
+            f"• Ветер: {wind:.1f} м/с\n"
+            f"• Влажность: {humidity}%\n"
+            f"• Давление: {pressure_mmhg} мм рт. ст."
+        )
+        return {"temp": text, "image": image}
+
     @staticmethod
     @require_weather_api
     def get_weather(city: str, api_key: str) -> dict:
         """Возвращает словарь: {temp: текст, image: картинка}."""
+        key, variants = WeatherHandler.resolve_city(city)
+        cached = LAST_GOOD.get(key)
+        fresh = bool(cached and time.time() - cached[1] < get_settings().weather_cache_seconds)
+        cache_hit("weather", fresh)
+        if fresh:
+            return cached[0]
         try:
-            r = SESSION.get(
-                "https://api.openweathermap.org/data/2.5/weather",
-                params={"q": city, "appid": api_key, "units": "metric", "lang": "ru"},
-                timeout=12,
-            )
+            r = WeatherHandler._request(variants, api_key)
+        except CircuitOpen:
+            return WeatherHandler._stale_or(key, {"temp": "Сервис погоды временно недоступен. Попробуйте позже.",
+                                                  "image": "error.png"})
         except requests.RequestException as e:
-            return {"temp": f"Ошибка сети: {e}", "image": "error.png"}
+            return WeatherHandler._stale_or(key, {"temp": f"Ошибка сети: {e}", "image": "error.png"})
 
         if r.status_code != 200:
             try:
@@ -83,40 +165,15 @@ class WeatherHandler:
                 msg = err.get("message") or f"Код {r.status_code}"
                 if r.status_code == 404:
                     return {"temp": f"Город «{city}» не найден.", "image": "error.png"}
+                if http_failure(r):
+                    return WeatherHandler._stale_or(key, {"temp": f"Ошибка API: {msg}", "image": "error.png"})
                 return {"temp": f"Ошибка API: {msg}", "image": "error.png"}
             except Exception:
                 return {"temp": f"Ошибка API: код {r.status_code}", "image": "error.png"}
 
         try:
-            data = r.json()
-            city_name = data.get("name") or city
-
-            weather0 = (data.get("weather") or [{}])[0]
-            main = weather0.get("main", "")
-            desc = (weather0.get("description") or "").capitalize()
-
-            main_blk = data.get("main") or {}
-            temp = round(float(main_blk.get("temp", 0)))
-            feels = round(float(main_blk.get("feels_like", temp)))
-            humidity = int(main_blk.get("humidity", 0))
-
-            pressure_hpa = float(main_blk.get("pressure", 0))
-            pressure_mmhg = round(pressure_hpa * 0.75006)
-
-            wind = float((data.get("wind") or {}).get("speed", 0.0))
-
-            image = WeatherHandler._choose_image(data, temp)
-            emoji = WeatherHandler._emoji_for(main)
-
-            text = (
-                f"{emoji} Погода в {city_name}:\n"
-                f"• {desc}\n"
-                f"• Температура: {temp}°C (ощущается как {feels}°C)\n"
-                f"• Ветер: {wind:.1f} м/с\n"
-                f"• Влажность: {humidity}%\n"
-                f"• Давление: {pressure_mmhg} мм рт. ст."
-            )
-            return {"temp": text, "image": image}
-
+            result = WeatherHandler.format_weather(r.json(), city)
+            LAST_GOOD.put(key, result)
+            return result
         except (KeyError, ValueError, json.JSONDecodeError) as e:
-            return {"temp": f"Ошибка обработки данных погоды: {e}", "image": "error.png"}
\ No newline at end of file
+            return {"temp": f"Ошибка обработки данных погоды: {e}", "image": "error.png"}
@@ -1,6 +1 @@
 # handlers/__init__.py
-from .. import main
-
-__all__ = [
-    main
-]
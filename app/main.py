@@ -1,20 +1,24 @@
 # app/main.py
+import importlib
 import os
 import sys
 import time
 from pathlib import Path
-from functools import wraps
-from typing import Any, Callable, Optional
+from typing import Callable, Optional
 
-from dotenv import load_dotenv
 from loguru import logger
 from aiogram.filters.command import Command
 from aiogram.filters import CommandStart
 from aiogram import Bot, Dispatcher, types, F
-from aiogram import fsm
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 import asyncio
 import html as thtml
 
+from app.utils import settings, tracing
+from app.utils.settings import SettingsWatcher, get_settings
+from app.utils.tracing import TracingMiddleware, _short, trace
+
 if getattr(sys, "frozen", False):
     application_path = Path(sys.executable).parent
 else:
@@ -22,88 +26,66 @@ else:
 
 env_path = application_path / ".env"
 
-load_dotenv(dotenv_path=env_path, override=True)
-BOT_TOKEN = os.getenv("BOT_API1")
+LOG_DIR = application_path / "logs"
 
-if not BOT_TOKEN:
-    print("Ошибка: не найден .env или переменная BOT_API1")
-    print(f"Искали .env в: {env_path} (exists={env_path.exists()})")
-    if env_path.exists():
-        for line in (env_path.read_text(encoding="utf-8").splitlines()):
-            if line.strip() and not line.startswith("#") and "=" in line:
-                print(f"  {line.split('=',1)[0]}=***")
-    raise RuntimeError("Переменная BOT_API1 не задана")
 
-LOG_DIR = application_path / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
-
-logger.remove()
-
-logger.add(
-    sys.stdout,
-    level=LOG_LEVEL,
-    enqueue=True,
-    backtrace=True,
-    diagnose=False,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
-           "<level>{level: <7}</level> | "
-           "{extra[feature]: <8} | "
-           "{message}",
-)
-
-if os.getenv("LOG_TO_FILES", "1") == "1":
-    def _by_feature(name: str):
-        return lambda rec: rec["extra"].get("feature") == name
-
-    for feat in ("core", "weather", "space", "news", "ii", "errors", "tg"):
-        feat_dir = LOG_DIR / feat
-        feat_dir.mkdir(parents=True, exist_ok=True)
-        log_path = feat_dir / (f"{feat}" + "_{time}.log")
-        logger.add(
-            log_path,
-            rotation="5 MB",
-            retention="7 days",
-            compression="zip",
-            level="DEBUG",
-            enqueue=True,
-            filter=_by_feature(feat),
-            format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <7} | {message}",
-        )
+def configure_logging() -> None:
+    """Sink'и loguru, уровень спанов и excepthook — при запуске бота, а не при импорте модуля."""
+    s = get_settings()
+    log_level = s.log_level
+    to_files = s.log_to_files
+
+    logger.remove()
+    logger.configure(patcher=tracing.patch_record)
+
+    logger.add(
+        sys.stdout,
+        level=log_level,
+        enqueue=True,
+        backtrace=True,
+        diagnose=False,
+        format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
+               "<level>{level: <7}</level> | "
+               "{extra[feature]: <8} | "
+               "{extra[cid]: <8} | "
+               "{message}",
+    )
+
+    if to_files:
+        def _by_feature(name: str):
+            return lambda rec: rec["extra"].get("feature") == name
+
+        for feat in ("core", "weather", "space", "news", "ii", "errors", "tg"):
+            feat_dir = LOG_DIR / feat
+            feat_dir.mkdir(parents=True, exist_ok=True)
+            log_path = feat_dir / (f"{feat}" + "_{time}.log")
+            logger.add(
+                log_path,
+                rotation="5 MB",
+                retention="7 days",
+                compression="zip",
+                level="DEBUG",
+                enqueue=True,
+                filter=_by_feature(feat),
+                format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <7} | {extra[cid]} | {message}",
+            )
+
+    tracing.configure(
+        level="DEBUG" if to_files else log_level,
+        sample=s.trace_sample,
+    )
+    sys.excepthook = _excepthook
+
 
 def _excepthook(exctype, value, tb):
     logger.bind(feature="errors").opt(exception=(exctype, value, tb)).error("Unhandled exception")
     sys.__excepthook__(exctype, value, tb)
 
-sys.excepthook = _excepthook
-
 def log_action(msg: str, *, feature: str = "core", **extra):
     logger.bind(feature=feature, **extra).info(msg)
 
-def trace(name: Optional[str] = None, *, feature: str = "core"):
-    def deco(fn: Callable):
-        tag = name or fn.__name__
-        @wraps(fn)
-        def wrap(*args, **kwargs):
-            t0 = time.perf_counter()
-            logger.bind(feature=feature).debug(f"{tag}: ENTER args={_short(args)} kwargs={_short(kwargs)}")
-            try:
-                res = fn(*args, **kwargs)
-                dt = (time.perf_counter() - t0) * 1000
-                logger.bind(feature=feature).debug(f"{tag}: OK in {dt:.1f} ms -> {_short(res)}")
-                return res
-            except Exception as e:
-                dt = (time.perf_counter() - t0) * 1000
-                logger.bind(feature="errors").exception(f"{tag}: FAIL in {dt:.1f} ms err={e}")
-                raise
-        return wrap
-    return deco
-
-def _short(x: Any, maxlen: int = 240) -> str:
-    s = repr(x)
-    return s if len(s) <= maxlen else s[:maxlen] + "…"
 
-async def log_msg(prefix: str, m: types.Message, *, feature: str = "tg"):
+def log_msg(prefix: str, m: types.Message, *, feature: str = "tg"):
     fu = getattr(m, "from_user", None)
     ch = getattr(m, "chat", None)
     logger.bind(feature=feature).info(
@@ -112,23 +94,31 @@ async def log_msg(prefix: str, m: types.Message, *, feature: str = "tg"):
         f"type={m.content_type} text={_short((m.text or '').strip())}"
     )
 
-async def send_message_logged(bot: Bot, message: types.Message, text: str, **kw) -> types.Message:
-    logger.bind(feature="tg").debug(f"send_message(chat_id={message}, len={len(text)}, keys={list(kw.keys())})")
-    msg = await message.answer(text, **kw)
-    logger.bind(feature="tg").info(f"sent_message: chat_id={message} mid={msg.message_id}")
+def _chat_id(target) -> int:
+    return target if isinstance(target, int) else target.chat.id
+
+async def send_message_logged(bot: Bot, message: types.Message | int, text: str, **kw) -> types.Message:
+    """message — входящее сообщение или chat_id."""
+    chat_id = _chat_id(message)
+    logger.bind(feature="tg").debug(f"send_message(chat_id={chat_id}, len={len(text)}, keys={list(kw.keys())})")
+    msg = await bot.send_message(chat_id, text, **kw)
+    logger.bind(feature="tg").info(f"sent_message: chat_id={chat_id} mid={msg.message_id}")
     return msg
 
-async def send_photo_logged(bot: Bot, message: types.Message, **kw) -> types.Message:
-    logger.bind(feature="tg").debug(f"send_photo(chat_id={message}, keys={list(kw.keys())})")
-    msg = await message.answer_photo(**kw)
-    logger.bind(feature="tg").info(f"sent_photo: chat_id={message} mid={msg.message_id}")
+async def send_photo_logged(bot: Bot, message: types.Message | int, **kw) -> types.Message:
+    chat_id = _chat_id(message)
+    logger.bind(feature="tg").debug(f"send_photo(chat_id={chat_id}, keys={list(kw.keys())})")
+    msg = await bot.send_photo(chat_id, **kw)
+    logger.bind(feature="tg").info(f"sent_photo: chat_id={chat_id} mid={msg.message_id}")
     return msg
 
+_next_steps: dict[int, Callable] = {}
+
 async def register_next_step_logged(bot: Bot, msg: types.Message, handler: Callable):
     logger.bind(feature="tg").debug(
         f"register_next_step(chat_id={msg.chat.id}, wait_mid={msg.message_id}, handler={handler.__name__})"
     )
-    await fsm(msg, handler)
+    _next_steps[msg.chat.id] = handler
 
 async def _resolve_image_path(image_name: str) -> Optional[Path]:
     candidates = [
@@ -145,19 +135,62 @@ async def _resolve_image_path(image_name: str) -> Optional[Path]:
             continue
     return None
 
-bot = Bot(token=BOT_TOKEN)
+bot: Optional[Bot] = None
 dp=Dispatcher()
 
-sys.path.insert(0, str(application_path))
-sys.path.insert(0, str(application_path / "app"))
-log_action("sys.path updated", feature="core", path_list=sys.path[:4])
+
+def create_bot() -> Bot:
+    global bot
+    s = get_settings()
+    token = s.bot_token
+    if not token:
+        print("Ошибка: не найден .env или переменная BOT_API1")
+        print(f"Искали .env в: {env_path} (exists={env_path.exists()})")
+        if env_path.exists():
+            for line in (env_path.read_text(encoding="utf-8").splitlines()):
+                if line.strip() and not line.startswith("#") and "=" in line:
+                    print(f"  {line.split('=',1)[0]}=***")
+        raise RuntimeError("Переменная BOT_API1 не задана")
+    # свой Bot API сервер (telegram-bot-api или стенд нагрузочного теста)
+    api_url = s.telegram_api_url
+    bot = Bot(token=token, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url))) \
+        if api_url else Bot(token=token)
+    return bot
+
+
+def setup() -> None:
+    """Всё, что раньше происходило при импорте: настройки (.env), логи, Bot."""
+    settings.load(env_path)
+    configure_logging()
+    create_bot()
+
 
 from app.db.DBsearcher import DBsearcher
+from app.db.AlertsDB import AlertsDB, AlertSub
+from app.db.DigestDB import DigestDB, DigestSub
+from app.db.ChatMemoryDB import ChatMemory
+from app.db.UsageDB import UsageDB, UsageTailer, default_usage_dir
 from app.handlers.WeatherHandler import WeatherHandler
 from app.handlers.NewsHandler import NewsHandler
-from app.handlers.IIHandler import IIHandler
+from app.handlers.IIHandler import IIHandler, shutdown_pool
 from app.handlers.SpaceHandler import SpaceHandler
-from app.utils.helpers import Cleaner, Player
+from app.utils.helpers import Player
+from app.utils.fairqueue import FairLimiter, FairQueueMiddleware
+from app.utils.dedup import DedupMiddleware, InFlight
+from app.utils.tghtml import split_html
+from app.utils.iss_feed import LiveTracker
+from app.utils.pass_alerts import PassAlerts
+from app.utils.digest import DigestService
+from app.utils.geo import get_gazetteer
+from app.utils import cpu_pool, metrics
+from app.utils.breaker import breakers_stats
+from app.handlers import IIHandler as ii_module
+from app.handlers import NewsHandler as news_module
+from app.handlers import SpaceHandler as space_module
+from app.handlers import WeatherHandler as weather_module
+from app.utils import geo, helpers, introspect
+from app.utils.introspect import MemorySnapshots
+from app.utils.profiler import StackSampler, default_filename as profile_filename
 
 MENU: tuple[str, ...] = ("Погода", "Космос", "Новости", "ИИ помощник")
 NAV: tuple[str, ...] = ("Далее", "Назад")
@@ -170,13 +203,23 @@ def mk_kb(*rows):
     )
 
 MAIN_KB = mk_kb(MENU[:2], MENU[2:])
-log_action("MAIN_KB built", feature="core", rows=MENU)
+II_KB = mk_kb(("Назад",))
 
 class BotCore:
     @trace("BotCore.__init__", feature="core")
     def __init__(self):
-        db_path = application_path / "botdata.db"
+        s = get_settings()
+        SpaceHandler.configure(s)
+        geo.check_gazetteer()
+        db_path = Path(s.bot_db or application_path / "botdata.db")
         self.db = DBsearcher(str(db_path))
+        self.usage = UsageDB(str(db_path), default_daily_tokens=s.ii_daily_tokens)
+        self.usage_tailer = UsageTailer(default_usage_dir(application_path), self.usage)
+        self.memory = ChatMemory(
+            str(db_path),
+            budget_tokens=s.ii_memory_tokens,
+            ttl_minutes=s.ii_memory_ttl_min,
+        ) if s.ii_memory else None
 
         self.main_kb = MAIN_KB
         self.remove_kb = types.ReplyKeyboardRemove()
@@ -184,10 +227,46 @@ class BotCore:
         self.user_data: dict[int, dict] = {}
 
         self.space = SpaceHandler()
-
-        self.proxy_address = os.getenv("proxy_address")
-        self.proxy_username = os.getenv("proxy_username")
-        self.proxy_password = os.getenv("proxy_password")
+        self.live = LiveTracker(
+            SpaceHandler.FEED,
+            edit=lambda chat_id, message_id, text: bot.edit_message_text(
+                text=text, chat_id=chat_id, message_id=message_id, parse_mode="HTML"),
+            render=SpaceHandler.render_live,
+            every=s.iss_live_seconds,
+        )
+        self.alerts = PassAlerts(
+            AlertsDB(str(db_path)),
+            SpaceHandler.TLE,
+            send=lambda chat_id, text: bot.send_message(chat_id, text, parse_mode="HTML"),
+            render=SpaceHandler.render_alert,
+            refresh_hours=s.tle_max_age_hours,
+        )
+        self.digest = DigestService(
+            DigestDB(str(db_path)),
+            send=lambda chat_id, text: bot.send_message(chat_id, text, parse_mode="HTML"),
+            group_key=lambda city: WeatherHandler.resolve_city(city)[0],
+            weather=lambda city: WeatherHandler.get_weather(city).get("temp", ""),
+            headlines=lambda: [n["title"] for n in NewsHandler().get_news()[:5]],
+            concurrency=s.digest_concurrency,
+            sends_per_second=s.digest_sends_per_second,
+        )
+        self.ii_limiter = FairLimiter(
+            concurrency=s.ii_workers,
+            per_user=s.ii_per_user,
+            max_queue=s.ii_max_queue,
+        )
+        self.snapshots = MemorySnapshots(frames=s.tracemalloc_frames)
+        self.profiler = StackSampler(hz=s.profile_hz)
+        self.in_flight = InFlight(window=s.dedup_window)
+        dp.update.outer_middleware(TracingMiddleware())
+        self._register_metrics()
+        dp.message.middleware(DedupMiddleware(self.in_flight))
+        dp.callback_query.middleware(DedupMiddleware(self.in_flight))
+        dp.message.middleware(FairQueueMiddleware(self.ii_limiter, flag="ii"))
+
+        self.proxy_address = s.proxy_address
+        self.proxy_username = s.proxy_username
+        self.proxy_password = s.proxy_password
         self.proxies = {
             "http": f"http://{self.proxy_username}:{self.proxy_password}@{self.proxy_address}"
             if self.proxy_address and self.proxy_username and self.proxy_password else None,
@@ -206,6 +285,72 @@ class BotCore:
                    env=str(env_path),
                    proxies_enabled=bool(self.proxies["http"] or self.proxies["https"]))
 
+    def _register_metrics(self) -> None:
+        """Хук спанов + снимки stats() компонентов при каждом запросе /metrics."""
+        reg = metrics.REGISTRY
+        metrics.install_tracing_hook()
+        reg.stats_collector("bot_ii_queue", self.ii_limiter.stats)
+        reg.stats_collector("bot_ii_pool", lambda: ii_module._POOL.stats() if ii_module._POOL else None)
+        reg.stats_collector("bot_cpu_pool", lambda: cpu_pool._POOL.stats() if cpu_pool._POOL else None)
+        reg.stats_collector("bot_pass_alerts", self.alerts.stats)
+        reg.stats_collector("bot_dedup", self.in_flight.stats)
+        reg.collector(lambda: [
+            ("bot_send_queue_depth", {"queue": "digest"}, self.digest.queue_depth),
+            ("bot_live_tracked_chats", {}, len(self.live)),
+        ])
+        if self.memory:
+            reg.stats_collector("bot_ii_memory", self.memory.stats)
+
+        def breakers():
+            for host, st in breakers_stats().items():
+                yield "bot_breaker_open", {"host": host}, 1.0 if st["state"] != "closed" else 0.0
+                for key in ("opened", "rejected", "failures", "successes"):
+                    yield f"bot_breaker_{key}", {"host": host}, st[key]
+        reg.collector(breakers)
+
+    def _introspect(self) -> str:
+        """Отчёт /admin: процесс, состояние диалогов, кэши, очереди и пулы — как есть сейчас."""
+        pool_stats = lambda p: p.stats() if p else "not started"
+        breakers = breakers_stats()
+        return introspect.render({
+            "process": introspect.process_stats(),
+            "state": {
+                "user_pages": introspect.sized(self.user_pages),
+                "user_data": introspect.sized(self.user_data),
+                "next_steps": len(_next_steps),
+                "live_tracked": len(self.live),
+            },
+            "caches": {
+                "weather_last_good": len(weather_module.LAST_GOOD),
+                "news_last_good": len(news_module.LAST_GOOD),
+                "reverse_geocode": len(space_module._REVERSE_CACHE),
+                "iss_passes": len(SpaceHandler._cache_pass),
+                "gazetteer": len(geo._GAZ) if geo._GAZ is not None else "not loaded",
+                "bad_words_regex": helpers._bad_words_pattern.cache_info()._asdict(),
+                "ii_models": len(ii_module._MODEL_IDS or ()),
+            },
+            "queues": {
+                "ii": self.ii_limiter.stats(),
+                "dedup": self.in_flight.stats(),
+                "digest": self.digest.queue_depth,
+                "pass_alerts": self.alerts.stats(),
+                **({"ii_memory": self.memory.stats()} if self.memory else {}),
+            },
+            "executors": {
+                "ii_pool": pool_stats(ii_module._POOL),
+                "cpu_pool": pool_stats(cpu_pool._POOL),
+                "breakers_open": [h for h, st in breakers.items() if st["state"] != "closed"] or "none",
+            },
+        })
+
+    async def _send_report(self, message: types.Message, text: str, filename: str, as_file: bool = False) -> None:
+        """Короткий отчёт — <pre> в чат, длинный (или по просьбе) — файлом."""
+        if as_file or len(text) > 3900:
+            await bot.send_document(message.chat.id, types.BufferedInputFile(text.encode("utf-8"), filename),
+                                    caption=text.splitlines()[0][:1000] if text else None)
+        else:
+            await send_message_logged(bot, message, f"<pre>{thtml.escape(text)}</pre>", parse_mode="HTML")
+
     @trace(feature="core")
     async def route_if_menu(self,message: types.Message) -> bool:
         txt =(getattr(message, "text", "") or "").strip()
@@ -215,13 +360,13 @@ class BotCore:
         if txt in (*MENU, *NAV):
             log_action("Route menu", feature="core", txt=txt, uid=message.from_user.id, cid=message.chat.id)
             if txt == "Погода":
-                return self._go_weather(message)
+                return await self._go_weather(message)
             if txt == "Космос":
-                return self._go_space(message)
+                return await self._go_space(message)
             if txt == "Новости":
-                return self._go_news(message)
+                return await self._go_news(message)
             if txt == "ИИ помощник":
-                return self._go_ii(message)
+                return await self._go_ii(message)
             if txt == "Назад":
                 await send_message_logged(bot, message, "Возвращаемся в главное меню:", reply_markup=self.main_kb)
                 return True
@@ -237,9 +382,10 @@ class BotCore:
     @trace(feature="space")
     async def _go_space(self, message: types.Message) -> bool:
         log_msg("go_space", message)
-        kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        kb.add(types.KeyboardButton("Отправить локацию", request_location=True))
-        kb.add(types.KeyboardButton("Назад"))
+        kb = types.ReplyKeyboardMarkup(keyboard=[
+            [types.KeyboardButton(text="Отправить локацию", request_location=True)],
+            [types.KeyboardButton(text="Назад")],
+        ], resize_keyboard=True)
         msg = await send_message_logged(
             bot,
             message,
@@ -254,11 +400,15 @@ class BotCore:
         log_msg("go_news", message)
         user_id = message.from_user.id
         parser = NewsHandler()
-        news = parser.get_news()
-        log_action("news fetched", feature="news", count=len(news) if news else 0)
+        html = await asyncio.to_thread(parser.fetch_page)
+        news = await cpu_pool.headlines(html) if html else []
+        log_action("news fetched", feature="news", count=len(news) if news else 0, stale=bool(parser.stale_since))
         if not news:
-            await send_message_logged(bot, message.chat.id, "Не удалось получить новости.", reply_markup=self.main_kb)
+            await send_message_logged(bot, message, "Не удалось получить новости.", reply_markup=self.main_kb)
             return True
+        if parser.stale_since:
+            await send_message_logged(bot, message, "⚠️ Сайт новостей недоступен, показываю новости на "
+                                      f"{time.strftime('%H:%M', time.localtime(parser.stale_since))}.")
         self.user_pages[user_id] = {"news": news, "page": 0}
         await self.send_news_page(message.chat.id, user_id)
         return True
@@ -266,8 +416,8 @@ class BotCore:
     @trace(feature="ii")
     async def _go_ii(self, message) -> bool:
         log_msg("go_ii", message)
-        ii_kb = mk_kb(("Назад",),)
-        msg = await send_message_logged(bot, message.chat.id, "Начните диалог с ИИ. Память отключена.", reply_markup=ii_kb)
+        memo = "ИИ помнит последние реплики этого чата." if self.memory else "Память отключена."
+        msg = await send_message_logged(bot, message, f"Начните диалог с ИИ. {memo}", reply_markup=II_KB)
         await register_next_step_logged(bot, msg, self.process_II)
         return True
 
@@ -276,6 +426,7 @@ class BotCore:
         @dp.message(CommandStart())
         async def cmd_start(message: types.Message):
             log_msg("/start", message)
+            self._leave_ii(message.chat.id)
             self.db.add_user(message.from_user.id, message.from_user.username)
             log_action("user added", feature="core", uid=message.from_user.id, uname=message.from_user.username)
             await send_message_logged(bot, message.chat.id, "Привет! Выберите действие:", reply_markup=self.main_kb)
@@ -283,21 +434,25 @@ class BotCore:
         @dp.message(F.text == "Погода")
         async def cmd_weather(message: types.Message):
             log_msg("btn:Погода", message)
+            self._leave_ii(message.chat.id)
             await self._go_weather(message)
 
         @dp.message(F.text == "Космос")
         async def cmd_space(message: types.Message):
             log_msg("btn:Космос", message)
+            self._leave_ii(message.chat.id)
             await self._go_space(message)
 
-        @dp.message(F.text == "Новости")
+        @dp.message(F.text == "Новости", flags={"dedup": "news"})
         async def cmd_news(message: types.Message):
             log_msg("btn:Новости", message)
+            self._leave_ii(message.chat.id)
             await self._go_news(message)
 
-        @dp.message(F.text == "Далее" or "Назад")
+        @dp.message(lambda m: m.text == "Далее" or (m.text == "Назад" and m.from_user.id in self.user_pages))
         async def news_navigation(message: types.Message):
             log_msg("news_nav", message)
+            self._leave_ii(message.chat.id)
             user_id = message.from_user.id
             if user_id not in self.user_pages:
                 await send_message_logged(bot, message.chat.id, "Сначала выберите раздел", reply_markup=self.main_kb)
@@ -311,7 +466,7 @@ class BotCore:
                 if cur < total_pages - 1:
                     self.user_pages[user_id]["page"] = cur + 1
                 log_action("News next", feature="news", uid=user_id, page=self.user_pages[user_id]["page"])
-                self.send_news_page(message.chat.id, user_id)
+                await self.send_news_page(message.chat.id, user_id)
             elif message.text == "Назад":
                 log_action("News back", feature="news", uid=user_id)
                 self.user_pages.pop(user_id, None)
@@ -322,12 +477,147 @@ class BotCore:
             log_msg("btn:ИИ", message)
             await self._go_ii(message)
 
-        @dp.message(F.location)
+        @dp.message(Command("track"))
+        async def cmd_track(message: types.Message):
+            log_msg("/track", message)
+            coords = self.user_data.get(message.from_user.id, {}).get("coords")
+            st = await SpaceHandler.FEED.get()
+            if not st:
+                await send_message_logged(bot, message, "Не удалось получить положение МКС.", reply_markup=self.main_kb)
+                return
+            msg = await send_message_logged(bot, message, SpaceHandler.render_live(st, coords), parse_mode="HTML")
+            self.live.track(message.chat.id, msg.message_id, coords)
+            log_action("live_track_start", feature="space", cid=message.chat.id, tracked=len(self.live))
+
+        @dp.message(Command("untrack"))
+        async def cmd_untrack(message: types.Message):
+            log_msg("/untrack", message)
+            stopped = self.live.untrack(message.chat.id)
+            await send_message_logged(bot, message, "Слежение остановлено." if stopped else "Слежение не запущено.",
+                                      reply_markup=self.main_kb)
+
+        @dp.message(Command("issmap"))
+        async def cmd_issmap(message: types.Message):
+            log_msg("/issmap", message)
+            await self._send_iss_map(message, self.user_data.get(message.from_user.id, {}).get("coords"))
+
+        @dp.message(Command("alerts"))
+        async def cmd_alerts(message: types.Message):
+            log_msg("/alerts", message)
+            args = (message.text or "").split()[1:]
+            try:
+                coords = (float(args[0]), float(args[1])) if len(args) >= 2 else \
+                    self.user_data.get(message.from_user.id, {}).get("coords")
+            except ValueError:
+                coords = None
+            if not coords or not (-90 <= coords[0] <= 90) or not (-180 <= coords[1] <= 180):
+                await send_message_logged(bot, message, "Отправьте локацию в разделе «Космос» или укажите "
+                                          "координаты: /alerts 53.9 27.56", reply_markup=self.main_kb)
+                return
+            lead = get_settings().iss_alert_lead_min
+            nxt = await self.alerts.subscribe(AlertSub(message.chat.id, coords[0], coords[1], lead, True))
+            text = f"🔔 Подписка оформлена: напомню за {lead} мин до видимого пролёта МКС."
+            if nxt:
+                text += f"\nБлижайший: {nxt.rise.strftime('%Y-%m-%d %H:%M')} UTC, до {nxt.max_elevation:.0f}°"
+            await send_message_logged(bot, message, text + "\nОтключить: /alerts_off", reply_markup=self.main_kb)
+            log_action("iss_alerts_on", feature="space", cid=message.chat.id, **self.alerts.stats())
+
+        @dp.message(Command("alerts_off"))
+        async def cmd_alerts_off(message: types.Message):
+            log_msg("/alerts_off", message)
+            removed = await self.alerts.unsubscribe(message.chat.id)
+            await send_message_logged(bot, message, "Оповещения отключены." if removed else "Подписки не было.",
+                                      reply_markup=self.main_kb)
+
+        @dp.message(Command("digest"))
+        async def cmd_digest(message: types.Message):
+            log_msg("/digest", message)
+            args = (message.text or "").split()[1:]
+            hour = 8
+            if len(args) > 1 and args[-1].isdigit() and 0 <= int(args[-1]) <= 23:
+                hour = int(args.pop())
+            city = " ".join(args).strip()
+            if not city:
+                await send_message_logged(bot, message, "Укажите город и, по желанию, час: /digest Минск 7",
+                                          reply_markup=self.main_kb)
+                return
+            gaz = await asyncio.to_thread(get_gazetteer)
+            hit = gaz.resolve(city) if gaz else None
+            tz = hit[0].timezone if hit else None
+            await self.digest.db.subscribe(DigestSub(message.chat.id, city, hour, tz))
+            await send_message_logged(
+                bot, message,
+                f"📬 Каждый день в {hour:02d}:00 ({tz or 'UTC'}) пришлю погоду в «{city}» и главные новости.\n"
+                "Отключить: /digest_off",
+                reply_markup=self.main_kb,
+            )
+            log_action("digest_on", feature="core", cid=message.chat.id, city=city, hour=hour, tz=tz)
+
+        @dp.message(Command("digest_off"))
+        async def cmd_digest_off(message: types.Message):
+            log_msg("/digest_off", message)
+            removed = await self.digest.db.unsubscribe(message.chat.id)
+            await send_message_logged(bot, message, "Дайджест отключён." if removed else "Подписки не было.",
+                                      reply_markup=self.main_kb)
+
+        def is_admin(message: types.Message) -> bool:
+            # список из настроек читается на каждый апдейт — ADMIN_IDS меняется без перезапуска
+            return bool(message.from_user) and message.from_user.id in get_settings().admin_ids
+
+        @dp.message(Command("admin"), is_admin)
+        async def cmd_admin(message: types.Message):
+            log_msg("/admin", message, feature="core")
+            args = (message.text or "").split()[1:]
+            await self._send_report(message, self._introspect(), "state.txt", as_file="file" in args)
+
+        @dp.message(Command("mem"), is_admin)
+        async def cmd_mem(message: types.Message):
+            log_msg("/mem", message, feature="core")
+            args = (message.text or "").split()[1:]
+            if args[:1] == ["stop"]:
+                self.snapshots.stop()
+                await send_message_logged(bot, message, "tracemalloc выключен, снимки удалены.")
+                return
+            top = next((int(a) for a in args if a.isdigit()), 15)
+            started = self.snapshots.active
+            report = await asyncio.to_thread(self.snapshots.take, min(top, 500))
+            if not started:
+                report += "\n\ntracemalloc включён: следующий /mem покажет прирост. Выключить: /mem stop"
+            await self._send_report(message, report, "mem-diff.txt", as_file="file" in args)
+            log_action("mem_snapshot", feature="core", top=top, rss_kb=introspect.rss_kb())
+
+        @dp.message(Command("prof"), is_admin)
+        async def cmd_prof(message: types.Message):
+            log_msg("/prof", message, feature="core")
+            args = (message.text or "").split()[1:]
+            seconds = next((float(a) for a in args if a.replace(".", "", 1).isdigit()), 10.0)
+            mode = "thread" if "thread" in args else "auto"
+            if self.profiler.running:
+                await send_message_logged(bot, message, "Профилировщик уже работает, дождитесь результата.")
+                return
+            await send_message_logged(bot, message, f"Снимаю стеки {min(seconds, 120):g} с…")
+            # сам обработчик не блокирует loop: в режиме signal он просто спит, пока тикает таймер
+            try:
+                prof = await self.profiler.profile(seconds, mode)
+            except RuntimeError as e:
+                await send_message_logged(bot, message, f"Профилировщик недоступен: {e}")
+                return
+            summary = prof.summary()
+            await bot.send_document(
+                message.chat.id,
+                types.BufferedInputFile(prof.collapsed().encode("utf-8"), profile_filename()),
+                caption=summary[:1000],
+            )
+            log_action("cpu_profile", feature="core", mode=prof.mode, samples=prof.samples,
+                       seconds=round(prof.elapsed, 1), stacks=len(prof.stacks))
+
+        @dp.message(F.location, flags={"dedup": "space"})
         async def handle_location(message: types.Message):
             log_msg("location", message)
+            self._leave_ii(message.chat.id)
             await self.process_space_location(message)
 
-        @dp.callback_query(F.text)
+        @dp.callback_query(F.data.startswith("n"), flags={"dedup": "article"})
         async def handle_article_callback(call: types.CallbackQuery):
             try:
                 idx = int(call.data[1:]) - 1
@@ -343,23 +633,32 @@ class BotCore:
                 await call.message.answer("Ошибка открытия статьи.")
                 logger.bind(feature="errors").exception(f"Article callback error: {e}")
 
+        @dp.message(lambda m: _next_steps.get(m.chat.id) == self.process_II, flags={"ii": True})
+        async def ii_step(message: types.Message):
+            # шаг не снимаем: чат в режиме ИИ до «Назад», повторы доходят до FairLimiter
+            await self.process_II(message)
+
+        @dp.message(lambda m: m.chat.id in _next_steps)
+        async def next_step(message: types.Message):
+            handler = _next_steps.pop(message.chat.id)
+            await handler(message)
+
     @trace(feature="weather")
     async def process_weather(self, message: types.Message):
         log_msg("process_weather", message)
-        if self.route_if_menu(message):
+        if await self.route_if_menu(message):
             return
         city = (message.text or "").strip()
         if not city:
             await send_message_logged(bot, message.chat.id, "Введите корректное название города.", reply_markup=self.main_kb)
             return
-        weather = WeatherHandler().get_weather(city)
+        weather = await asyncio.to_thread(WeatherHandler.get_weather, city)
         log_action("weather_received", feature="weather", keys=list(weather.keys()))
         image_name = weather.get("image", "error.png")
         image_path = await _resolve_image_path(image_name)
         if image_path:
             try:
-                with open(image_path, "rb") as f:
-                    await send_photo_logged(bot, message.chat.id, photo=f)
+                await send_photo_logged(bot, message, photo=types.FSInputFile(image_path))
             except Exception as e:
                 logger.bind(feature="errors").exception(f"Send weather image error: {e}")
         else:
@@ -376,7 +675,7 @@ class BotCore:
         news_page = news[start:end]
         log_action("news_page", feature="news", uid=user_id, page=page, start=start, end=end, total=len(news))
         if not news_page:
-            await send_message_logged(chat_id=chat_id, bot=bot, text="Новостей больше нет.", reply_markup=self.main_kb)
+            await send_message_logged(bot, chat_id, "Новостей больше нет.", reply_markup=self.main_kb)
             self.user_pages.pop(user_id, None)
             return
         total_news = len(news)
@@ -388,8 +687,8 @@ class BotCore:
                     await send_photo_logged(bot, chat_id, photo=photo)
                 except Exception as e:
                     logger.bind(feature="errors").exception(f"Send news photo error: {e}")
-            markup =types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton("Читать статью", callback_data=f"n{idx}"))
+            markup = types.InlineKeyboardMarkup(inline_keyboard=[
+                [types.InlineKeyboardButton(text="Читать статью", callback_data=f"n{idx}")]])
             await send_message_logged(bot, chat_id, f"{idx}. {title}", reply_markup=markup)
         if end >= total_news:
             await send_message_logged(bot, chat_id, "Новостей на сегодня больше нет.", reply_markup=self.main_kb)
@@ -402,79 +701,124 @@ class BotCore:
     async def send_full_page(self, chat_id, news_url):
         log_action("fetch_full_article", feature="news", url=news_url)
         parser =NewsHandler()
-        article =parser.get_deep_news(news_url)
-        text = "\n\n".join(article.get("title", []))
-        cleaner =Cleaner()
-        text = thtml.unescape(cleaner.clean_words(text))
+        html = await asyncio.to_thread(parser.fetch_article, parser.half_url + news_url)
+        # разбор и чистка — в пуле CPU, сюда приходит готовый текст и ссылки
+        article = await cpu_pool.article(html) if html else cpu_pool.MISSING
+        text = article.text if article.found else "Не удалось найти статью"
         await send_message_logged(bot, chat_id, (text[:4093] + "...") if len(text) > 4096 else text,
                             reply_markup=self.main_kb)
-        for img_url in article.get("images", []):
+        for img_url in article.images:
             try:
                 await send_photo_logged(bot, chat_id, photo=img_url)
             except Exception as e:
                 logger.bind(feature="errors").exception(f"Send article image error: {e}")
-        if "media" in article:
-            player = await Player()
-            for media_url in article["media"]:
+        if article.media:
+            player = Player()
+            for media_url in article.media:
                 video_path = None
                 try:
-                    video_path = await player.download(media_url)
+                    video_path = await asyncio.to_thread(player.download, media_url)
                     size = os.path.getsize(video_path)
-                    with open(video_path, "rb") as vf:
-                        if size <= 50 * 1024 * 1024:
-                            await bot.send_video(chat_id, vf)
-                        else:
-                            await bot.send_document(chat_id, vf)
+                    if size <= 50 * 1024 * 1024:
+                        await bot.send_video(chat_id, types.FSInputFile(video_path))
+                    else:
+                        await bot.send_document(chat_id, types.FSInputFile(video_path))
                     log_action("media_sent", feature="news", path=video_path, size=size)
                 except Exception as e:
                     logger.bind(feature="errors").exception(f"Media send error: {e}")
                 finally:
                     if video_path and os.path.exists(video_path):
-                        await player.delete(video_path)
+                        player.delete(video_path)
 
     @trace(feature="space")
     async def process_space_city(self, message: types.Message):
         log_msg("process_space_city", message)
         if getattr(message, "location", None):
-            return self.process_space_location(message)
-        if self.route_if_menu(message):
+            return await self.process_space_location(message)
+        if await self.route_if_menu(message):
             return
         city =(message.text or "").strip()
         if not city:
-            await send_message_logged(bot, message.chat.id, "Введите город или отправьте локацию.", reply_markup=self.main_kb)
+            await send_message_logged(bot, message, "Введите город или отправьте локацию.", reply_markup=self.main_kb)
             return
-        await send_message_logged(bot, message.chat.id, "Считаю орбиты… 🚀")
-        report =self.space.get_space_report_by_city(city)
+        await send_message_logged(bot, message, "Считаю орбиты… 🚀")
+        report = await self.space.get_space_report_by_city(city)
         log_action("space_report_city_ready", feature="space", city=city, len=len(report))
-        await send_message_logged(bot, message.chat.id, report, reply_markup=self.main_kb)
+        await send_message_logged(bot, message, report, parse_mode="HTML", reply_markup=self.main_kb)
+
+    async def _send_iss_map(self, message: types.Message, coords) -> None:
+        img = await self.space.render_map(coords)
+        if img is None:
+            await send_message_logged(bot, message, "Карта сейчас недоступна.", reply_markup=self.main_kb)
+            return
+        await send_photo_logged(bot, message, photo=types.BufferedInputFile(img, "iss.jpg"),
+                                caption="🛰️ Трасса МКС на виток вперёд")
 
     @trace(feature="space")
     async def process_space_location(self, message):
         log_msg("process_space_location", message)
         loc = getattr(message, "location", None)
         if not loc:
-            await send_message_logged(bot, message.chat.id, "Локация не пришла. Попробуйте ещё раз.", reply_markup=self.main_kb)
+            await send_message_logged(bot, message, "Локация не пришла. Попробуйте ещё раз.", reply_markup=self.main_kb)
             return
-        await send_message_logged(bot, message.chat.id, "Считаю орбиты… 🚀")
+        await send_message_logged(bot, message, "Считаю орбиты… 🚀")
+        self.user_data.setdefault(message.from_user.id, {})["coords"] = (loc.latitude, loc.longitude)
         report = await self.space.get_space_report_by_coords(loc.latitude, loc.longitude)
         log_action("space_report_geo_ready", feature="space",
                    lat=loc.latitude, lon=loc.longitude, len=len(report))
-        await send_message_logged(bot, message.chat.id, report, reply_markup=self.main_kb)
+        await send_message_logged(bot, message, report, parse_mode="HTML", reply_markup=self.main_kb)
+        if get_settings().iss_map:
+            await self._send_iss_map(message, (loc.latitude, loc.longitude))
 
     @trace(feature="ii")
     async def process_II(self, message: types.Message):
         log_msg("process_II", message)
-        if self.route_if_menu(message):
-            return
         text = (message.text or "").strip()
+        if text in (*MENU, *NAV):
+            self._leave_ii(message.chat.id)
+            if await self.route_if_menu(message):
+                return
         if not text:
-            msg = await send_message_logged(bot, message.chat.id, "Введите текст")
-            register_next_step_logged(bot, msg, self.process_II)
+            await send_message_logged(bot, message, "Введите текст")
+            return
+        uid = message.from_user.id
+        if await self.usage.remaining_today(uid) == 0:
+            self._leave_ii(message.chat.id)
+            await send_message_logged(bot, message, "Дневной лимит запросов к ИИ исчерпан, приходите завтра.",
+                                      reply_markup=self.main_kb)
             return
-        answer = IIHandler().get_answer(text)
-        await send_message_logged(bot, message.chat.id, answer, reply_markup=self.main_kb)
-        msg = await send_message_logged(bot, message.chat.id, "Продолжайте ✍️")
-        register_next_step_logged(bot, msg, self.process_II)
+        ii = IIHandler()
+        history = await self.memory.messages(message.chat.id) if self.memory else None
+        answer = await ii.get_answer(text, history)
+        if ii.last_usage:
+            await self.usage.add_user_usage(uid, *ii.last_usage)
+            if self.memory:
+                await self.memory.add_turn(message.chat.id, text, answer)
+        chunks = split_html(answer) or ["Пустой ответ."]
+        # пока чат в режиме ИИ — клавиатура с «Назад», а не главное меню
+        kb = II_KB if _next_steps.get(message.chat.id) == self.process_II else self.main_kb
+        for i, chunk in enumerate(chunks, 1):
+            await send_message_logged(bot, message, chunk, parse_mode="HTML",
+                                      **({"reply_markup": kb} if i == len(chunks) else {}))
+        await send_message_logged(bot, message, "Продолжайте ✍️")
+        log_action("ii_queue", feature="ii", **self.ii_limiter.stats())
+
+    def _leave_ii(self, chat_id: int) -> None:
+        """Выйти из режима ИИ: любая кнопка меню или навигации завершает диалог с моделью."""
+        if _next_steps.get(chat_id) == self.process_II:
+            _next_steps.pop(chat_id, None)
+
+    async def _warm_up(self) -> None:
+        """Уже после старта поллинга: парсер HTML, справочник городов, воркеры CPU, g4f и первый воркер ИИ."""
+        started = time.monotonic()
+        try:
+            await asyncio.to_thread(importlib.import_module, "bs4")
+            await asyncio.to_thread(get_gazetteer)
+            await cpu_pool.warm_up()
+            await ii_module.warm_up(get_settings().ii_warm_workers)
+        except Exception as e:
+            logger.bind(feature="errors").warning(f"warm-up failed: {e!r}")
+        log_action("warm-up done", feature="core", seconds=round(time.monotonic() - started, 2))
 
     @trace(feature="core")
     async def run(self):
@@ -489,17 +833,53 @@ class BotCore:
             except Exception as e2:
                 logger.bind(feature="errors").exception(f"remove_webhook FAIL: {e2}")
         await self.register_handlers()
-        await dp.start_polling(bot)
-
-if __name__ == "__main__":
+        background = [asyncio.create_task(self.usage_tailer.run())]
+        SpaceHandler.FEED.start()
+        background.append(asyncio.create_task(self.alerts.start()))
+        self.digest.start()
+        metrics_runner = None
+        s = get_settings()
+        if s.metrics_port:
+            try:
+                metrics_runner = await metrics.serve(host=s.metrics_host, port=s.metrics_port)
+            except OSError as e:
+                logger.bind(feature="errors").warning(f"metrics endpoint not started: {e}")
+        if self.memory:
+            background.append(asyncio.create_task(self.memory.run()))
+        # .env перечитывается на лету: ключи, списки слов, адреса — без перезапуска
+        background.append(asyncio.create_task(SettingsWatcher(env_path, s.settings_poll_seconds).run()))
+
+        async def on_startup() -> None:
+            background.append(asyncio.create_task(self._warm_up()))
+        dp.startup.register(on_startup)
+        try:
+            await dp.start_polling(bot)
+        finally:
+            for task in background:
+                task.cancel()
+            SpaceHandler.FEED.stop()
+            self.alerts.stop()
+            self.digest.stop()
+            if metrics_runner:
+                await metrics_runner.cleanup()
+            await shutdown_pool()
+            await cpu_pool.shutdown_pool()
+
+
+def main() -> None:
+    setup()
     try:
         log_action("Запуск бота…", feature="core")
         log_action(f"Рабочая директория: {application_path}", feature="core")
         log_action(f"Файл .env: {env_path}", feature="core")
-        log_action(f"База данных: {application_path / 'botdata.db'}", feature="core")
+        log_action(f"База данных: {get_settings().bot_db or application_path / 'botdata.db'}", feature="core")
         bot_core = BotCore()
         log_action("Start polling", feature="tg", timeout=20, long_polling_timeout=20)
         asyncio.run(bot_core.run())
     except Exception as e:
         logger.bind(feature="errors").exception(f"Ошибка запуска бота: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+if __name__ == "__main__":
+    main()
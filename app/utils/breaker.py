@@ -0,0 +1,163 @@
+# app/utils/breaker.py
+"""
+Предохранитель (circuit breaker) на каждый внешний хост.
+
+closed    — запросы идут, по скользящему окну считаются ошибки и медленные ответы;
+open      — запросы сразу отклоняются (CircuitOpen) open_seconds секунд;
+half_open — пропускается одна проба: успех закрывает, ошибка снова открывает.
+
+Вызовы идут из потоков (asyncio.to_thread), поэтому состояние под threading.Lock.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+from urllib.parse import urlparse
+
+from loguru import logger as _logger
+
+from app.utils.tracing import span
+
+logger = _logger.bind(feature="core")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host}: circuit open, retry in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, host: str, *, window: int = 20, min_calls: int = 5, error_rate: float = 0.5,
+                 slow_seconds: float = 8.0, slow_rate: float = 0.5, open_seconds: float = 30.0):
+        self.host = host
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (ошибка, медленно)
+        self._opened_at = 0.0
+        self._probe = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+        self.failures = 0
+        self.successes = 0
+
+    def allow(self) -> None:
+        """Пропустить вызов или бросить CircuitOpen."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            wait = self._opened_at + self.open_seconds - time.monotonic()
+            if self.state == OPEN and wait <= 0:
+                self.state, self._probe = HALF_OPEN, False
+            if self.state == HALF_OPEN and not self._probe:
+                self._probe = True
+                return
+            self.rejected += 1
+            raise CircuitOpen(self.host, max(0.0, wait))
+
+    def record(self, ok: bool, elapsed: float) -> None:
+        with self._lock:
+            if ok:
+                self.successes += 1
+            else:
+                self.failures += 1
+            if self.state == HALF_OPEN:
+                if ok and elapsed < self.slow_seconds:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"breaker {self.host}: closed")
+                else:
+                    self._trip()
+                return
+            self._calls.append((not ok, elapsed >= self.slow_seconds))
+            n = len(self._calls)
+            if n < self.min_calls:
+                return
+            errors = sum(1 for e, _ in self._calls if e)
+            slow = sum(1 for _, s in self._calls if s)
+            if errors / n >= self.error_rate or slow / n >= self.slow_rate:
+                self._trip()
+
+    def _trip(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.opened += 1
+        logger.warning(f"breaker {self.host}: open for {self.open_seconds:.0f}s")
+
+    def call(self, fn: Callable[..., Any], *args,
+             failure: Optional[Callable[[Any], bool]] = None, **kwargs) -> Any:
+        """fn(*args, **kwargs) под предохранителем; failure(result) — считать ли ответ ошибкой."""
+        self.allow()
+        started = time.monotonic()
+        try:
+            with span(f"http {self.host}"):
+                result = fn(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(not (failure and failure(result)), time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"host": self.host, "state": self.state, "opened": self.opened, "rejected": self.rejected,
+                    "failures": self.failures, "successes": self.successes}
+
+
+def http_failure(response) -> bool:
+    """5xx и 429 — проблема сервиса; 4xx вроде 404 — нормальный ответ."""
+    code = getattr(response, "status_code", 0)
+    return code >= 500 or code == 429
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker(url_or_host: str, **kwargs) -> CircuitBreaker:
+    """Предохранитель хоста (создаётся при первом обращении)."""
+    host = urlparse(url_or_host).hostname or url_or_host
+    br = _BREAKERS.get(host)
+    if br is None:
+        with _BREAKERS_LOCK:
+            br = _BREAKERS.setdefault(host, CircuitBreaker(host, **kwargs))
+    return br
+
+
+def breakers_stats() -> Dict[str, Dict[str, Any]]:
+    return {host: br.stats() for host, br in list(_BREAKERS.items())}
+
+
+class LastGood:
+    """Последние удачные значения по ключу — чтобы при отказе отдать устаревшее, но хоть что-то."""
+
+    def __init__(self, max_items: int = 512):
+        self.max_items = max_items
+        self._items: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (value, time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(значение, unix-время получения) или None."""
+        with self._lock:
+            return self._items.get(key)
+
+    def __len__(self) -> int:
+        return len(self._items)
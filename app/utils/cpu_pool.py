@@ -0,0 +1,142 @@
+# app/utils/cpu_pool.py
+"""
+Пул процессов под CPU-работу бота: разбор HTML новостей и чистка текста статьи.
+
+bs4 и проход регулярками по большой статье — десятки миллисекунд чистого CPU;
+в asyncio.to_thread они держат GIL и тормозят все чаты. Здесь та же работа
+уходит в ProcessWorkerPool с прогретыми воркерами (bs4 и парсеры уже
+импортированы), а обратно по pipe едет только результат: готовый текст,
+ссылки на фото и видео, список заголовков — не HTML и не дерево разбора.
+
+Задачи типизированы: async-функции article() и headlines() и их результаты
+(Article, список словарей новостей). CPU_WORKERS=0 — без процессов, та же
+работа в потоке; при переполненной очереди пула задача тоже идёт в поток.
+"""
+from __future__ import annotations
+
+import asyncio
+import html as thtml
+import time
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+from loguru import logger as _logger
+
+from app.utils.metrics import CPU_TASK
+from app.utils.settings import Settings, get_settings
+from app.utils.workers import PoolBusy, ProcessWorkerPool, TaskTimeout, WorkerCrashed
+
+logger = _logger.bind(feature="news")
+
+_POOL: ProcessWorkerPool | None = None
+
+
+class Article(NamedTuple):
+    """Статья, готовая к отправке: текст очищен и раскодирован, found=False — разобрать не удалось."""
+    text: str
+    images: Tuple[str, ...]
+    media: Tuple[str, ...]
+    found: bool = True
+
+
+MISSING = Article("", (), (), False)
+
+
+# ---- выполняется в воркере ----
+
+def _parse_article(html: str, half_url: str, bad_words: Tuple[str, ...]) -> Article:
+    from app.handlers.NewsHandler import NewsHandler
+    from app.utils.helpers import Cleaner
+
+    s = Settings(news_half_url=half_url, bad_words=bad_words)
+    deep = NewsHandler(s).parse_article(html)
+    if not deep:
+        return MISSING
+    text = thtml.unescape(Cleaner(s).clean_words("\n\n".join(deep["title"])))
+    return Article(text, tuple(deep["images"]), tuple(deep["media"]))
+
+
+def _parse_headlines(html: str) -> List[dict]:
+    from app.handlers.NewsHandler import NewsHandler
+
+    return NewsHandler(Settings()).parse_news(html)
+
+
+def _preload() -> bool:
+    """Импорты заранее, чтобы первая статья за них не платила."""
+    import bs4  # noqa: F401
+    import app.handlers.NewsHandler  # noqa: F401
+    import app.utils.helpers  # noqa: F401
+    return True
+
+
+# ---- сторона бота ----
+
+def get_pool() -> Optional[ProcessWorkerPool]:
+    """Общий пул CPU-задач; None, если CPU_WORKERS=0."""
+    global _POOL
+    s = get_settings()
+    if _POOL is None and s.cpu_workers > 0:
+        _POOL = ProcessWorkerPool(
+            size=s.cpu_workers,
+            max_tasks=s.cpu_worker_max_tasks,
+            max_rss_mb=s.cpu_worker_max_rss_mb,
+            queue_size=s.cpu_queue_size,
+            name="cpu",
+        )
+    return _POOL
+
+
+async def _run(task: str, fn: Callable[..., Any], *args: Any) -> Any:
+    started = time.monotonic()
+    pool, where = get_pool(), "process"
+    try:
+        if pool is None:
+            where = "thread"
+            return await asyncio.to_thread(fn, *args)
+        try:
+            return await pool.submit(fn, *args, timeout=get_settings().cpu_task_timeout)
+        except PoolBusy:
+            where = "thread"
+            return await asyncio.to_thread(fn, *args)
+    finally:
+        CPU_TASK.labels(task, where).observe(time.monotonic() - started)
+
+
+async def article(html: str) -> Article:
+    """Разбор статьи + чистка текста; ошибка воркера — MISSING, а не исключение в обработчик."""
+    s = get_settings()
+    try:
+        return await _run("article", _parse_article, html, s.news_half_url, s.bad_words)
+    except (TaskTimeout, WorkerCrashed) as e:
+        logger.warning(f"[cpu] article failed: {e!r}")
+    except Exception as e:
+        logger.bind(feature="errors").exception(f"[cpu] article failed: {e}")
+    return MISSING
+
+
+async def headlines(html: str) -> List[dict]:
+    """Лента новостей: [{'title', 'link', 'photo_link'}, ...]."""
+    try:
+        return await _run("headlines", _parse_headlines, html)
+    except (TaskTimeout, WorkerCrashed) as e:
+        logger.warning(f"[cpu] headlines failed: {e!r}")
+    except Exception as e:
+        logger.bind(feature="errors").exception(f"[cpu] headlines failed: {e}")
+    return []
+
+
+async def warm_up(workers: Optional[int] = None) -> None:
+    """Поднять воркеры и импортировать в них парсеры — фоном после старта поллинга."""
+    pool = get_pool()
+    if pool is None:
+        return
+    n = pool.size if workers is None else max(0, min(workers, pool.size))
+    results = await asyncio.gather(*(pool.submit(_preload, timeout=60) for _ in range(n)), return_exceptions=True)
+    logger.info(f"[cpu] warm: workers={sum(r is True for r in results)}/{n}")
+
+
+async def shutdown_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        await _POOL.close()
+        _POOL = None
@@ -0,0 +1,138 @@
+# app/utils/dedup.py
+"""
+Подавление повторных нажатий: одно и то же действие пользователя (та же
+функция, те же аргументы) выполняется один раз.
+
+Пока первое нажатие «Новости», «Читать статью» или отправка локации ещё в
+работе, повторы к нему присоединяются: ждут его завершения и ничего не
+отправляют сами — ответ придёт от первого. Если первое уже закончилось, повтор
+отбрасывается только в пределах window секунд от начала первого (двойной тап,
+второй пришёл, когда быстрый ответ уже ушёл) — с коротким ответом, а не молча.
+Осознанный повтор позже этого окна выполняется как обычно. Ключ — (user_id,
+действие, аргументы), где аргументы — текст сообщения, данные кнопки или
+округлённые координаты.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, TelegramObject
+from loguru import logger as _logger
+
+from app.utils.metrics import DEDUP
+
+logger = _logger.bind(feature="core")
+
+Key = Tuple[int, str, Hashable]
+
+
+def event_args(event: TelegramObject) -> Hashable:
+    """Аргументы действия: данные кнопки, координаты (~100 м) или текст."""
+    if isinstance(event, CallbackQuery):
+        return event.data or ""
+    loc = getattr(event, "location", None)
+    if loc is not None:
+        return round(loc.latitude, 3), round(loc.longitude, 3)
+    return (getattr(event, "text", None) or "").strip()
+
+
+class InFlight:
+    """Реестр действий в работе и недавно завершённых."""
+
+    def __init__(self, window: float = 2.0):
+        self.window = max(0.0, float(window))
+        self._running: Dict[Key, asyncio.Future] = {}
+        # ключ -> время начала завершённого действия; порядок вставки = порядок завершения
+        self._recent: "OrderedDict[Key, float]" = OrderedDict()
+
+    def _prune(self, now: float) -> None:
+        while self._recent:
+            key, started = next(iter(self._recent.items()))
+            if now - started < self.window:
+                return
+            self._recent.popitem(last=False)
+
+    def check(self, key: Key) -> Tuple[str, Optional[asyncio.Future]]:
+        """
+        ('attach', future) — такое же действие в работе; ('drop', None) — оно
+        завершилось, а повтор пришёл в пределах window от его начала; иначе ('run', None).
+        """
+        fut = self._running.get(key)
+        if fut is not None:
+            return "attach", fut
+        now = time.monotonic()
+        self._prune(now)
+        started = self._recent.get(key)
+        if started is not None and now - started < self.window:
+            return "drop", None
+        return "run", None
+
+    async def run(self, key: Key, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить call как ведущее действие по ключу key."""
+        fut = asyncio.get_running_loop().create_future()
+        self._running[key] = fut
+        started = time.monotonic()
+        try:
+            result = await call()
+        except BaseException:
+            fut.set_result(None)
+            raise
+        else:
+            fut.set_result(result)
+            # в окно попадают только удачные действия: повтор после ошибки — это повторная попытка
+            if self.window and time.monotonic() - started < self.window:
+                self._recent.pop(key, None)
+                self._recent[key] = started
+            return result
+        finally:
+            del self._running[key]
+
+    def stats(self) -> dict:
+        self._prune(time.monotonic())
+        return {"running": len(self._running), "recent": len(self._recent)}
+
+
+class DedupMiddleware(BaseMiddleware):
+    """Дедупликация хендлеров с флагом flag; значение флага — имя действия (например "news")."""
+
+    def __init__(self, registry: InFlight, *, flag: str = "dedup", attach_text: str = "Уже открываю…",
+                 drop_text: str = "Только что выполнено — ответ выше."):
+        self.registry = registry
+        self.flag = flag
+        self.attach_text = attach_text
+        self.drop_text = drop_text
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        feature = get_flag(data, self.flag)
+        user = getattr(event, "from_user", None)
+        if not feature or user is None:
+            return await handler(event, data)
+        key = (user.id, feature, event_args(event))
+        verdict, fut = self.registry.check(key)
+        if verdict == "run":
+            DEDUP.labels(feature, "run").inc()
+            return await self.registry.run(key, lambda: handler(event, data))
+
+        DEDUP.labels(feature, verdict).inc()
+        logger.debug(f"[dedup] {verdict} uid={user.id} feature={feature} args={key[2]!r}")
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(self.attach_text if fut is not None else self.drop_text)
+            elif fut is None:
+                # к ответу первого нажатия присоединиться уже нельзя — хотя бы не молчим
+                await event.answer(self.drop_text)
+        except Exception as e:
+            logger.debug(f"[dedup] reply failed: {e!r}")
+        if fut is None:
+            return None
+        return await asyncio.shield(fut)
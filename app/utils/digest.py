@@ -0,0 +1,166 @@
+# app/utils/digest.py
+"""
+Утренний дайджест: погода + заголовки.
+
+Раз в час (таймер до границы часа) выбираются подписчики, у которых сейчас
+их местный час рассылки. Они группируются по городу (ключ из офлайн-резолвера),
+погода запрашивается один раз на город с ограниченным параллелизмом, текст
+рендерится один раз на группу. Дальше — очередь в SQLite (DigestDB) и
+отправка с ограничением скорости; после падения рассылка продолжается с
+первого неотмеченного получателя (повториться может только сообщение,
+которое было в полёте в момент падения).
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import html
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from loguru import logger as _logger
+
+from app.db.DigestDB import FAILED, SENT, DigestDB, DigestSub
+
+logger = _logger.bind(feature="core")
+
+
+def local_hour(sub: DigestSub, now: dt.datetime) -> int:
+    try:
+        return now.astimezone(ZoneInfo(sub.tz)).hour if sub.tz else now.hour
+    except Exception:
+        return now.hour
+
+
+class DigestService:
+    def __init__(self, db: DigestDB, send: Callable[[int, str], Awaitable[None]], *,
+                 group_key: Callable[[str], str],
+                 weather: Callable[[str], str],
+                 headlines: Callable[[], List[str]],
+                 concurrency: int = 4, sends_per_second: float = 25.0, max_retries: int = 3):
+        self.db = db
+        self.send = send
+        self.group_key = group_key
+        self.weather = weather
+        self.headlines = headlines
+        self.concurrency = max(1, concurrency)
+        self.send_gap = 1.0 / max(1.0, sends_per_second)
+        self.max_retries = max_retries
+        self._task: Optional[asyncio.Task] = None
+        self.queue_depth = 0
+
+    @staticmethod
+    def render(weather: str, headlines: List[str]) -> str:
+        lines = ["☀️ <b>Доброе утро!</b>", "", html.escape(weather)]
+        if headlines:
+            lines += ["", "📰 <b>Главное:</b>"] + [f"• {html.escape(h)}" for h in headlines]
+        return "\n".join(lines)
+
+    async def _build(self, run_id: str, due: List[DigestSub]) -> None:
+        cities = {s.city for s in due}
+        keys = await asyncio.to_thread(lambda: {c: self.group_key(c) for c in cities})
+        groups: Dict[str, List[DigestSub]] = {}
+        for s in due:
+            groups.setdefault(keys[s.city], []).append(s)
+
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(key: str) -> Tuple[str, str]:
+            async with sem:
+                try:
+                    return key, await asyncio.to_thread(self.weather, groups[key][0].city)
+                except Exception as e:
+                    logger.warning(f"digest {run_id}: weather for {key} failed: {e!r}")
+                    return key, "Погода временно недоступна."
+
+        news_task = asyncio.ensure_future(asyncio.to_thread(self.headlines))
+        weather = dict(await asyncio.gather(*(fetch(k) for k in groups)))
+        try:
+            headlines = await news_task
+        except Exception as e:
+            logger.warning(f"digest {run_id}: headlines failed: {e!r}")
+            headlines = []
+        bodies = {k: self.render(weather[k], headlines) for k in groups}
+        recipients = [(s.chat_id, k) for k, subs in groups.items() for s in subs]
+        await self.db.create_run(run_id, bodies, recipients)
+        logger.info(f"digest {run_id}: {len(recipients)} recipients in {len(groups)} city groups")
+
+    async def _send(self, chat_id: int, text: str) -> int:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.send(chat_id, text)
+                return SENT
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None or attempt == self.max_retries:
+                    logger.warning(f"digest send fail chat={chat_id}: {e!r}")
+                    return FAILED
+                await asyncio.sleep(float(retry_after))
+        return FAILED
+
+    async def deliver(self, run_id: str) -> Dict[str, int]:
+        while True:
+            batch = await self.db.pending(run_id)
+            if not batch:
+                break
+            self.queue_depth = len(batch)
+            for chat_id, text in batch:
+                started = time.monotonic()
+                await self.db.mark(run_id, chat_id, await self._send(chat_id, text))
+                self.queue_depth -= 1
+                await asyncio.sleep(max(0.0, self.send_gap - (time.monotonic() - started)))
+        result = await self.db.finish_run(run_id)
+        logger.info(f"digest {run_id} delivered: {result}")
+        return result
+
+    async def tick(self, now: Optional[dt.datetime] = None) -> None:
+        now = now or dt.datetime.now(dt.timezone.utc)
+        run_id = now.strftime("%Y-%m-%dT%H")
+        if await self.db.run_exists(run_id):
+            return
+        due = [s for s in await self.db.subs() if local_hour(s, now) == s.hour]
+        if not due:
+            return
+        await self._build(run_id, due)
+        await self.deliver(run_id)
+
+    async def resume(self) -> None:
+        """Дослать незавершённые рассылки; ошибка одной не мешает остальным."""
+        try:
+            runs = await self.db.unfinished_runs()
+        except Exception as e:
+            logger.error(f"digest resume failed: {e!r}")
+            return
+        for run_id in runs:
+            logger.info(f"digest {run_id}: resuming")
+            try:
+                await self.deliver(run_id)
+            except Exception as e:
+                logger.error(f"digest {run_id} resume failed: {e!r}")
+
+    async def run(self) -> None:
+        while True:
+            # недосланное (перезапуск или ошибка прошлого часа) — перед новой рассылкой
+            await self.resume()
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"digest tick failed: {e!r}")
+            now = time.time()
+            await asyncio.sleep(3600 - now % 3600 + 5)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+            self._task.add_done_callback(self._on_done)
+
+    @staticmethod
+    def _on_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error("digest loop died")
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
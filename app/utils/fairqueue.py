@@ -0,0 +1,154 @@
+# app/utils/fairqueue.py
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, TelegramObject
+from loguru import logger as _logger
+
+logger = _logger.bind(feature="core")
+
+
+class QueueBusy(RuntimeError):
+    """Очередь переполнена — запрос отклонён сразу."""
+
+
+class FairLimiter:
+    """
+    Справедливая очередь: не больше per_user задач на пользователя в работе,
+    не больше concurrency задач всего. Свободный слот достаётся пользователям
+    по кругу, так что один спамер не отодвигает остальных. Если ждущих больше
+    max_queue — QueueBusy без ожидания.
+    """
+
+    def __init__(self, concurrency: int = 2, per_user: int = 1, max_queue: int = 50, per_user_queue: int = 2):
+        self.concurrency = max(1, int(concurrency))
+        self.per_user = max(1, int(per_user))
+        self.max_queue = max(0, int(max_queue))
+        self.per_user_queue = max(0, int(per_user_queue))
+        self._running = 0
+        self._in_flight: Dict[int, int] = {}
+        # uid -> очередь ожидающих; порядок ключей и есть круг round-robin
+        self._waiting: "OrderedDict[int, Deque[tuple[asyncio.Future, float]]]" = OrderedDict()
+        self._queued = 0
+        self._counters = {"granted": 0, "shed": 0, "wait_ms_total": 0, "wait_ms_max": 0}
+
+    def _can_run(self, uid: int) -> bool:
+        return self._running < self.concurrency and self._in_flight.get(uid, 0) < self.per_user
+
+    def _grant(self, uid: int, enqueued: Optional[float] = None) -> None:
+        self._running += 1
+        self._in_flight[uid] = self._in_flight.get(uid, 0) + 1
+        self._counters["granted"] += 1
+        if enqueued is not None:
+            waited = int((time.monotonic() - enqueued) * 1000)
+            self._counters["wait_ms_total"] += waited
+            self._counters["wait_ms_max"] = max(self._counters["wait_ms_max"], waited)
+
+    async def acquire(self, uid: int) -> None:
+        if not self._waiting.get(uid) and self._can_run(uid):
+            self._grant(uid)
+            return
+        user_q = self._waiting.get(uid)
+        if self._queued >= self.max_queue or (user_q and len(user_q) >= self.per_user_queue):
+            self._counters["shed"] += 1
+            raise QueueBusy(f"queued={self._queued} uid={uid}")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(uid, deque()).append((fut, time.monotonic()))
+        self._queued += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # слот уже выдан, но ждавший ушёл — вернуть
+                self.release(uid)
+            else:
+                self._drop(uid, fut)
+            raise
+
+    def _drop(self, uid: int, fut: asyncio.Future) -> None:
+        q = self._waiting.get(uid)
+        if not q:
+            return
+        for item in q:
+            if item[0] is fut:
+                q.remove(item)
+                self._queued -= 1
+                break
+        if not q:
+            self._waiting.pop(uid, None)
+
+    def release(self, uid: int) -> None:
+        self._running -= 1
+        left = self._in_flight.get(uid, 1) - 1
+        if left > 0:
+            self._in_flight[uid] = left
+        else:
+            self._in_flight.pop(uid, None)
+        self._wake()
+
+    def _wake(self) -> None:
+        """Обойти круг пользователей и раздать свободные слоты."""
+        for _ in range(len(self._waiting)):
+            if self._running >= self.concurrency or not self._waiting:
+                return
+            uid, q = next(iter(self._waiting.items()))
+            self._waiting.move_to_end(uid)
+            if self._in_flight.get(uid, 0) >= self.per_user:
+                continue
+            fut, enqueued = q.popleft()
+            self._queued -= 1
+            if not q:
+                self._waiting.pop(uid, None)
+            self._grant(uid, enqueued)
+            fut.set_result(None)
+
+    def stats(self) -> dict:
+        granted = self._counters["granted"] or 1
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "users_waiting": len(self._waiting),
+            "users_running": len(self._in_flight),
+            "granted": self._counters["granted"],
+            "shed": self._counters["shed"],
+            "wait_ms_avg": round(self._counters["wait_ms_total"] / granted, 1),
+            "wait_ms_max": self._counters["wait_ms_max"],
+        }
+
+
+class FairQueueMiddleware(BaseMiddleware):
+    """Пропускает через FairLimiter хендлеры, помеченные флагом (по умолчанию "ii")."""
+
+    def __init__(self, limiter: FairLimiter, *, flag: str = "ii",
+                 busy_text: str = "Сейчас много запросов к ИИ, попробуйте чуть позже."):
+        self.limiter = limiter
+        self.flag = flag
+        self.busy_text = busy_text
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        if not get_flag(data, self.flag) or user is None:
+            return await handler(event, data)
+        try:
+            await self.limiter.acquire(user.id)
+        except QueueBusy as e:
+            logger.warning(f"[fair] shed {e} stats={self.limiter.stats()}")
+            if isinstance(event, Message):
+                await event.answer(self.busy_text)
+            return None
+        try:
+            return await handler(event, data)
+        finally:
+            self.limiter.release(user.id)
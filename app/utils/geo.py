@@ -0,0 +1,393 @@
+# app/utils/geo.py
+"""
+Офлайн-справочник городов по дампу GeoNames (cities15000.txt / cities5000.txt,
+https://download.geonames.org/export/dump/). Рядом можно положить countryInfo.txt
+для названий стран, иначе страна отдаётся кодом.
+
+Дамп в репозитории не хранится (~7 МБ, обновляется GeoNames). Скачать его и
+countryInfo.txt в data/ (или в другой каталог, указав GEONAMES_CITIES и
+GEONAMES_COUNTRIES):
+
+    python -m app.utils.geo [--dest data] [--dataset cities15000]
+
+Без дампа погода и космос ищут города через HTTP-геокодеры, о чём бот
+предупреждает при запуске.
+
+Прямой поиск — по нормализованному имени и префиксу, обратный — k-d дерево
+по точкам на единичной сфере; таймзона берётся у ближайшего города.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import difflib
+import io
+import math
+import os
+import re
+import sys
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger as _logger
+
+from app.utils.settings import get_settings
+
+logger = _logger.bind(feature="space")
+
+EARTH_R = 6371.0
+
+_CYR_RE = re.compile(r"[а-яё]", re.IGNORECASE)
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_name(name: str) -> str:
+    """Регистр, ё/е, дефисы и лишние пробелы не важны: «Санкт-Петербург» == «санкт петербург»."""
+    s = (name or "").lower().replace("ё", "е")
+    return _NON_WORD_RE.sub(" ", s).strip()
+
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s",
+    "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "і": "i", "ї": "yi", "є": "ye", "ў": "u",
+})
+
+
+def skeleton(name: str) -> str:
+    """Нормализованное имя латиницей: «Москва», «Moskva» и «MOSKVA» дают одно и то же."""
+    return normalize_name(name).translate(_TRANSLIT).replace("j", "y").replace("x", "ks")
+
+
+def _trigrams(s: str) -> set:
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class City(NamedTuple):
+    id: int
+    name: str
+    lat: float
+    lon: float
+    country: str
+    population: int
+    timezone: str
+
+
+def _unit(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lon)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+
+class KDTree:
+    """k-d дерево по 3D-точкам, хранится плоскими списками."""
+
+    def __init__(self, points: List[Tuple[float, float, float]]):
+        self.points = points
+        n = len(points)
+        self.idx: List[int] = list(range(n))
+        self.left: List[int] = [-1] * n
+        self.right: List[int] = [-1] * n
+        self.axis: List[int] = [0] * n
+        self.root = self._build(0, n, 0) if n else -1
+
+    def _build(self, lo: int, hi: int, depth: int) -> int:
+        # явный стек вместо рекурсии: глубина дерева ~log2(n), но так проще контролировать
+        stack = [(lo, hi, depth, -1, False)]
+        root = -1
+        while stack:
+            lo, hi, depth, parent, is_right = stack.pop()
+            if lo >= hi:
+                continue
+            axis = depth % 3
+            part = self.idx[lo:hi]
+            part.sort(key=lambda i: self.points[i][axis])
+            self.idx[lo:hi] = part
+            mid = (lo + hi) // 2
+            node = self.idx[mid]
+            self.axis[node] = axis
+            if parent < 0:
+                root = node
+            elif is_right:
+                self.right[parent] = node
+            else:
+                self.left[parent] = node
+            stack.append((lo, mid, depth + 1, node, False))
+            stack.append((mid + 1, hi, depth + 1, node, True))
+        return root
+
+    def nearest(self, q: Tuple[float, float, float]) -> Tuple[int, float]:
+        """Индекс ближайшей точки и квадрат хордового расстояния."""
+        best, best_d = -1, float("inf")
+        stack = [self.root]
+        pts, left, right, axes = self.points, self.left, self.right, self.axis
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            p = pts[node]
+            d = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+            if d < best_d:
+                best, best_d = node, d
+            diff = q[axes[node]] - p[axes[node]]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            if diff * diff < best_d:
+                stack.append(far)
+            stack.append(near)
+        return best, best_d
+
+
+class Gazetteer:
+    """
+    Справочник: find(name) -> City, nearest(lat, lon) -> (City, км),
+    timezone_at/country_at. Индексируются name, asciiname и кириллические
+    альтернативные имена — полный список alternatenames занял бы сотни МБ.
+    """
+
+    def __init__(self, cities: List[City], names: Dict[str, List[int]], countries: Dict[str, str],
+                 labels: Optional[Dict[str, str]] = None):
+        self.cities = cities
+        self.names = names
+        self.labels = labels or {}
+        self.keys = sorted(names)
+        self.countries = countries
+        self.tree = KDTree([_unit(c.lat, c.lon) for c in cities])
+        self._skeletons: Optional[Dict[str, List[int]]] = None
+        self._grams: Optional[Dict[str, List[str]]] = None
+        self._fuzzy_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    @classmethod
+    def load(cls, path: Path, countries_path: Optional[Path] = None) -> "Gazetteer":
+        cities: List[City] = []
+        names: Dict[str, List[int]] = {}
+        labels: Dict[str, str] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                row = line.rstrip("\n").split("\t")
+                if len(row) < 18:
+                    continue
+                i = len(cities)
+                cities.append(City(
+                    id=int(row[0]), name=row[1], lat=float(row[4]), lon=float(row[5]),
+                    country=row[8], population=int(row[14] or 0), timezone=row[17],
+                ))
+                aliases = {row[1], row[2]}
+                aliases.update(a for a in row[3].split(",") if a and _CYR_RE.search(a))
+                for alias in aliases:
+                    key = normalize_name(alias)
+                    if key:
+                        names.setdefault(key, []).append(i)
+                        labels.setdefault(key, alias)
+        for ids in names.values():
+            ids.sort(key=lambda i: -cities[i].population)
+
+        countries: Dict[str, str] = {}
+        if countries_path and countries_path.exists():
+            with open(countries_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("#"):
+                        continue
+                    row = line.rstrip("\n").split("\t")
+                    if len(row) > 4:
+                        countries[row[0]] = row[4]
+        return cls(cities, names, countries, labels)
+
+    def country_name(self, code: str) -> str:
+        return self.countries.get(code, code)
+
+    def find(self, query: str) -> Optional[Tuple[City, str]]:
+        """Город и имя, под которым его нашли: сначала точное совпадение, потом по префиксу."""
+        key = normalize_name(query)
+        if not key:
+            return None
+        ids = self.names.get(key)
+        if ids:
+            return self.cities[ids[0]], self.labels.get(key, query.strip())
+        pos = bisect.bisect_left(self.keys, key)
+        best: Optional[Tuple[int, str]] = None
+        while pos < len(self.keys) and self.keys[pos].startswith(key):
+            k = self.keys[pos]
+            i = self.names[k][0]
+            if best is None or self.cities[i].population > self.cities[best[0]].population:
+                best = (i, k)
+            pos += 1
+        if best is None:
+            return None
+        return self.cities[best[0]], self.labels.get(best[1], self.cities[best[0]].name)
+
+    def _fuzzy_index(self) -> Tuple[Dict[str, List[int]], Dict[str, List[str]]]:
+        """Латинские «скелеты» имён и триграммный индекс по ним; строится при первом нечётком поиске."""
+        with self._fuzzy_lock:
+            if self._skeletons is None:
+                skeletons: Dict[str, List[int]] = {}
+                for key, ids in self.names.items():
+                    skeletons.setdefault(skeleton(key), []).extend(ids)
+                grams: Dict[str, List[str]] = {}
+                for sk, ids in skeletons.items():
+                    ids.sort(key=lambda i: -self.cities[i].population)
+                    for g in _trigrams(sk):
+                        grams.setdefault(g, []).append(sk)
+                self._skeletons, self._grams = skeletons, grams
+            return self._skeletons, self._grams
+
+    def resolve(self, query: str, min_score: float = 0.75, max_postings: int = 5000) -> Optional[Tuple[City, str, float]]:
+        """
+        find() с запасом на опечатки и транслит: точное имя/префикс, затем
+        совпадение «скелета» латиницей, затем триграммы + похожесть строк.
+        Возвращает (город, имя, оценка 0..1).
+        """
+        hit = self.find(query)
+        if hit:
+            return hit[0], hit[1], 1.0
+        skeletons, grams = self._fuzzy_index()
+        sk = skeleton(query)
+        if not sk:
+            return None
+        ids = skeletons.get(sk)
+        if ids:
+            return self.cities[ids[0]], self.cities[ids[0]].name, 1.0
+        q_grams = _trigrams(sk)
+        counts: Dict[str, int] = {}
+        for g in q_grams:
+            posting = grams.get(g)
+            if posting and len(posting) <= max_postings:  # слишком частые триграммы ничего не различают
+                for cand in posting:
+                    counts[cand] = counts.get(cand, 0) + 1
+        best: Optional[Tuple[float, int, str]] = None
+        for cand, shared in sorted(counts.items(), key=lambda kv: -kv[1])[:50]:
+            if shared / len(q_grams) < min_score / 2:
+                break
+            score = difflib.SequenceMatcher(None, sk, cand).ratio()
+            i = skeletons[cand][0]
+            rank = (score, self.cities[i].population)
+            if score >= min_score and (best is None or rank > (best[0], self.cities[best[1]].population)):
+                best = (score, i, cand)
+        if best is None:
+            return None
+        return self.cities[best[1]], self.cities[best[1]].name, round(best[0], 3)
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[City, float]]:
+        if not self.cities:
+            return None
+        i, chord2 = self.tree.nearest(_unit(lat, lon))
+        km = 2 * EARTH_R * math.asin(min(1.0, math.sqrt(chord2) / 2))
+        return self.cities[i], km
+
+    def timezone_at(self, lat: float, lon: float) -> Optional[str]:
+        hit = self.nearest(lat, lon)
+        return hit[0].timezone if hit else None
+
+    def country_at(self, lat: float, lon: float, max_km: float = 400.0) -> Optional[str]:
+        """Страна ближайшего города; дальше max_km от городов (океан) — None."""
+        hit = self.nearest(lat, lon)
+        if not hit or hit[1] > max_km:
+            return None
+        return self.country_name(hit[0].country)
+
+
+_GAZ: Optional[Gazetteer] = None
+_GAZ_LOCK = threading.Lock()
+_GAZ_TRIED = False  # ставится только после окончания загрузки, удачной или нет
+
+
+def gazetteer_ready() -> bool:
+    """Загрузка закончена (удачно или нет) — get_gazetteer() не блокирует. Во время загрузки — False."""
+    return _GAZ_TRIED
+
+
+GEONAMES_URL = "https://download.geonames.org/export/dump/"
+_DATA = Path(__file__).resolve().parents[2] / "data"
+
+
+def gazetteer_paths() -> Tuple[Path, Path]:
+    """Где искать дамп городов и countryInfo.txt (настройки или data/ по умолчанию)."""
+    s = get_settings()
+    cities = Path(s.geonames_cities or _DATA / "cities15000.txt")
+    return cities, Path(s.geonames_countries or cities.parent / "countryInfo.txt")
+
+
+def check_gazetteer() -> bool:
+    """При запуске: предупредить, если дампа нет и поиск городов уйдёт в HTTP."""
+    cities, countries = gazetteer_paths()
+    if not cities.exists():
+        logger.warning(f"gazetteer: {cities} not found — city lookups for weather and space go to HTTP "
+                       f"geocoders; fetch it with `python -m app.utils.geo --dest {cities.parent}`")
+        return False
+    if not countries.exists():
+        logger.warning(f"gazetteer: {countries} not found — countries will be shown as ISO codes")
+    return True
+
+
+def fetch_geonames(dest: Path = _DATA, dataset: str = "cities15000", timeout: float = 120.0) -> Tuple[Path, Path]:
+    """Скачать {dataset}.txt и countryInfo.txt из дампа GeoNames в dest; файлы подменяются атомарно."""
+    import requests
+
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+
+    def save(name: str, data: bytes) -> Path:
+        path = dest / name
+        tmp = path.with_suffix(path.suffix + ".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return path
+
+    r = requests.get(f"{GEONAMES_URL}{dataset}.zip", timeout=timeout)
+    r.raise_for_status()
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        cities = save(f"{dataset}.txt", zf.read(f"{dataset}.txt"))
+    r = requests.get(f"{GEONAMES_URL}countryInfo.txt", timeout=timeout)
+    r.raise_for_status()
+    countries = save("countryInfo.txt", r.content)
+    return cities, countries
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """
+    Справочник из GEONAMES_CITIES (по умолчанию data/cities15000.txt), грузится один раз.
+    Пока идёт загрузка, остальные вызовы ждут её на блокировке, а не получают None.
+    """
+    global _GAZ, _GAZ_TRIED
+    if _GAZ_TRIED:
+        return _GAZ
+    with _GAZ_LOCK:
+        if _GAZ_TRIED:
+            return _GAZ
+        try:
+            path, countries = gazetteer_paths()
+            if not path.exists():
+                logger.info(f"gazetteer: {path} not found, using HTTP geocoding")
+                return None
+            try:
+                _GAZ = Gazetteer.load(path, countries)
+                logger.info(f"gazetteer: {len(_GAZ)} cities, {len(_GAZ.keys)} names from {path}")
+            except Exception as e:
+                logger.error(f"gazetteer load failed: {e!r}")
+        finally:
+            _GAZ_TRIED = True
+        return _GAZ
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Скачать дамп городов GeoNames для офлайн-поиска")
+    ap.add_argument("--dest", type=Path, default=_DATA, help="каталог (по умолчанию data/ в корне проекта)")
+    ap.add_argument("--dataset", default="cities15000", choices=("cities500", "cities1000", "cities5000", "cities15000"),
+                    help="чем меньше порог населения, тем больше городов и памяти")
+    args = ap.parse_args(argv)
+    cities, countries = fetch_geonames(args.dest, args.dataset)
+    gaz = Gazetteer.load(cities, countries)
+    print(f"{cities}: {len(gaz)} cities, {len(gaz.keys)} names; {countries}")
+    if args.dataset != "cities15000" or args.dest.resolve() != _DATA.resolve():
+        print(f"set GEONAMES_CITIES={cities} and GEONAMES_COUNTRIES={countries} in .env")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
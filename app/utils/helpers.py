@@ -1,7 +1,9 @@
-import re
-from dotenv import load_dotenv
-import yt_dlp
 import os
+import re
+from functools import lru_cache
+from typing import Optional, Pattern, Tuple
+
+from app.utils.settings import Settings, get_settings
 
 class Player:
     def __init__(self, downloads='downloads'):
@@ -9,6 +11,8 @@ class Player:
         os.makedirs(self.downloads, exist_ok=True)
 
     def download(self, url):
+        import yt_dlp  # тяжёлый импорт — только когда действительно качаем
+
         ydl_opts = {
             'outtmpl': os.path.join(self.downloads, '%(title).50s.%(ext)s'),
             'format': 'mp4',
@@ -27,15 +31,23 @@ class Player:
         except FileNotFoundError:
             pass
 
-class Cleaner:
-    def clean_words(self, page):
-        load_dotenv(dotenv_path="/home/gleb/TGbot_projects/.env", override=True)
+@lru_cache(maxsize=4)
+def _bad_words_pattern(words: Tuple[str, ...]) -> Optional[Pattern[str]]:
+    """Одна регулярка на весь список; пересобирается, только когда список в настройках меняется."""
+    if not words:
+        return None
+    alts = "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+    return re.compile(r'\b(?:' + alts + r')\b', flags=re.IGNORECASE)
+
 
-        bad_words = os.getenv('bad_words').split(',')
+class Cleaner:
+    def __init__(self, settings: Optional[Settings] = None):
+        self._settings = settings
 
-        for word in bad_words:
-            word_pattern = r'\b' + re.escape(word) + r'\b'
-            page = re.sub(word_pattern, '', page, flags=re.IGNORECASE)
+    def clean_words(self, page):
+        bad = _bad_words_pattern((self._settings or get_settings()).bad_words)
+        if bad is not None:
+            page = bad.sub('', page)
         url_patterns = [
             r'в переводе [^ ]*\.org[^ ]*',
             r'В переводе [^ ]*\.org[^ ]*',
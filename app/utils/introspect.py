@@ -0,0 +1,165 @@
+# app/utils/introspect.py
+"""
+Интроспекция живого процесса для админ-команд: размеры состояния бота и
+снимки tracemalloc с разницей «что выросло с прошлого снимка».
+
+tracemalloc включается первой командой /mem и выключается /mem stop: пока он
+включён, каждое выделение памяти дороже, держать его постоянно незачем.
+Снимок и сравнение на большой куче — сотни миллисекунд CPU, поэтому
+take()/diff вызываются из потока.
+"""
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_PROJECT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_ROOTS = sorted({os.path.join(p, "") for p in (_PROJECT, *sys.path) if p}, key=len, reverse=True)
+
+
+def rss_kb() -> int:
+    """Текущий RSS (Linux /proc), иначе пиковый из getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE // 1024
+    except (OSError, ValueError, IndexError):
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) if resource else 0
+
+
+# в модули, классы и функции не спускаемся: иначе «размер» чата — весь интерпретатор
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+
+def deep_size(obj: Any, limit: int = 200_000) -> Tuple[int, bool]:
+    """Примерный размер obj со всем содержимым, байт; второй элемент — упёрлись ли в limit объектов."""
+    seen, stack, total = set(), [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        if len(seen) >= limit:
+            return total, True
+        seen.add(id(o))
+        total += sys.getsizeof(o, 0)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__") and not isinstance(o, _OPAQUE):
+            stack.append(vars(o))
+    return total, False
+
+
+def sized(obj: Any) -> str:
+    """«N шт., ~X KB» для контейнера бота."""
+    size, capped = deep_size(obj)
+    return f"{len(obj)} шт., {'≥' if capped else '~'}{size / 1024:,.0f} KB"
+
+
+def process_stats() -> Dict[str, Any]:
+    import asyncio
+
+    try:
+        tasks = len(asyncio.all_tasks())
+    except RuntimeError:
+        tasks = None
+    return {
+        "rss_mb": round(rss_kb() / 1024, 1),
+        "threads": threading.active_count(),
+        "asyncio_tasks": tasks,
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+        "tracemalloc": "on" if tracemalloc.is_tracing() else "off",
+    }
+
+
+def render(sections: Dict[str, Dict[str, Any]]) -> str:
+    """Разделы key: value в компактный текст (для <pre> или файла)."""
+    lines: List[str] = []
+    for title, rows in sections.items():
+        lines.append(f"[{title}]")
+        if not rows:
+            lines.append("  —")
+        for k, v in rows.items():
+            if isinstance(v, dict):
+                v = " ".join(f"{kk}={vv}" for kk, vv in v.items())
+            lines.append(f"  {k}: {v}")
+    return "\n".join(lines)
+
+
+class MemorySnapshots:
+    """Снимки tracemalloc: первый — база, каждый следующий сравнивается с предыдущим."""
+
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self._last: Optional[tracemalloc.Snapshot] = None
+        self._last_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def take(self, top: int = 15, key: str = "lineno") -> str:
+        """Снять снимок; отчёт — топ мест выделения по приросту с прошлого снимка (или по объёму для первого)."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._last, self._last_at = None, 0.0
+            snap = tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+            now = time.monotonic()
+            current, peak = tracemalloc.get_traced_memory()
+            head = [f"traced {current / 1024 ** 2:,.1f} MB (peak {peak / 1024 ** 2:,.1f} MB), "
+                    f"rss {rss_kb() / 1024:,.1f} MB, overhead {tracemalloc.get_tracemalloc_memory() / 1024 ** 2:,.1f} MB"]
+            if self._last is None:
+                head.append(f"baseline taken; top {top} by size:")
+                body = [f"{s.size / 1024:>9,.1f} KB {s.count:>8} obj  {self._where(s.traceback)}"
+                        for s in snap.statistics(key)[:top]]
+            else:
+                stats = snap.compare_to(self._last, key)
+                grown = sum(s.size_diff for s in stats)
+                head.append(f"since last snapshot ({now - self._last_at:,.0f}s ago): {grown / 1024:+,.1f} KB; "
+                            f"top {top} by growth:")
+                body = [f"{s.size_diff / 1024:>+9,.1f} KB {s.count_diff:>+8} obj  "
+                        f"= {s.size / 1024:,.1f} KB  {self._where(s.traceback)}"
+                        for s in stats[:top]]
+            self._last, self._last_at = snap, now
+            return "\n".join(head + (body or ["(пусто)"]))
+
+    @staticmethod
+    def _where(tb: Iterable[tracemalloc.Frame]) -> str:
+        return " <- ".join(f"{short_path(f.filename)}:{f.lineno}" for f in tb)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._last = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+def short_path(path: str) -> str:
+    """Путь относительно корня проекта или sys.path — в отчёте важен модуль, а не /usr/lib/..."""
+    for root in _ROOTS:
+        if path.startswith(root):
+            return path[len(root):]
+    return path
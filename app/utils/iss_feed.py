@@ -0,0 +1,206 @@
+# app/utils/iss_feed.py
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger as _logger
+
+from app.utils.metrics import cache_hit
+from app.utils.orbit import OrbitEngine, is_sunlit, sun_eci
+
+logger = _logger.bind(feature="space")
+
+
+class ISSState(NamedTuple):
+    latitude: float
+    longitude: float
+    altitude: float
+    velocity: float
+    visibility: str
+    timestamp: dt.datetime
+    source: str
+
+
+Source = Callable[[], Awaitable[Optional[ISSState]]]
+
+
+def state_from_engine(engine: OrbitEngine, t: Optional[dt.datetime] = None) -> ISSState:
+    """Положение по TLE — когда все HTTP-источники лежат."""
+    t = t or dt.datetime.now(dt.timezone.utc)
+    lat, lon, alt = engine.subpoint(t)
+    r, jd, fr = engine.teme(t)
+    _, v = engine.sat.sgp4(jd, fr)[1:]
+    speed = (v[0] ** 2 + v[1] ** 2 + v[2] ** 2) ** 0.5 * 3600
+    vis = "daylight" if is_sunlit(r, sun_eci(jd, fr)) else "eclipsed"
+    return ISSState(lat, lon, alt, speed, vis, t.replace(microsecond=0), "tle")
+
+
+class ISSFeed:
+    """
+    Один поллер на весь бот: опрашивает источники по очереди раз в interval
+    и раздаёт последнее состояние всем читателям. Параллельные get()
+    ждут один и тот же запрос, а не идут в сеть каждый сам.
+    """
+
+    def __init__(self, sources: List[Tuple[str, Source]], interval: float = 5.0, idle_interval: float = 60.0):
+        self.sources = sources
+        self.interval = float(interval)
+        self.idle_interval = float(idle_interval)
+        self._state: Optional[ISSState] = None
+        self._updated = 0.0
+        self._last_read = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._subscribers: List[asyncio.Queue] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def state(self) -> Optional[ISSState]:
+        return self._state
+
+    async def _fetch(self) -> Optional[ISSState]:
+        for name, source in self.sources:
+            try:
+                st = await source()
+                if st:
+                    return st
+            except Exception as e:
+                logger.warning(f"iss feed {name} fail: {e!r}")
+        return None
+
+    async def refresh(self) -> Optional[ISSState]:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+        st = await asyncio.shield(self._inflight)
+        if st:
+            self._state, self._updated = st, time.monotonic()
+            for q in self._subscribers:
+                if q.full():
+                    q.get_nowait()
+                q.put_nowait(st)
+        return self._state
+
+    async def get(self, max_age: Optional[float] = None) -> Optional[ISSState]:
+        """Последнее состояние; если старше max_age — дождаться общего обновления."""
+        self._last_read = time.monotonic()
+        max_age = self.interval if max_age is None else max_age
+        fresh = self._state is not None and time.monotonic() - self._updated <= max_age
+        cache_hit("iss_feed", fresh)
+        if fresh:
+            return self._state
+        return await self.refresh()
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        if q in self._subscribers:
+            self._subscribers.remove(q)
+
+    async def run(self) -> None:
+        while True:
+            busy = self._subscribers or time.monotonic() - self._last_read < self.idle_interval
+            if busy and time.monotonic() - self._updated >= self.interval:
+                await self.refresh()
+            await asyncio.sleep(self.interval if busy else 1.0)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+# ошибки правки, после которых сообщение не обновить уже никогда
+_PERMANENT = ("message to edit not found", "message can't be edited", "chat not found",
+              "bot was blocked", "bot was kicked", "user is deactivated", "forbidden")
+
+
+def _permanent(e: Exception) -> bool:
+    if type(e).__name__ in ("TelegramForbiddenError", "TelegramNotFound"):
+        return True
+    text = str(e).lower()
+    return any(s in text for s in _PERMANENT)
+
+
+def _not_modified(e: Exception) -> bool:
+    return "message is not modified" in str(e).lower()
+
+
+class LiveTracker:
+    """
+    «Живое» слежение: одно сообщение на чат, которое раз в every секунд
+    редактируется по общему ISSFeed. Все чаты обновляются одним циклом.
+    """
+
+    def __init__(self, feed: ISSFeed, edit: Callable[[int, int, str], Awaitable[None]],
+                 render: Callable[[ISSState, Optional[Tuple[float, float]]], str],
+                 every: float = 10.0, duration_minutes: float = 15.0, edits_per_second: float = 20.0):
+        self.feed = feed
+        self.edit = edit
+        self.render = render
+        self.every = float(every)
+        self.duration = duration_minutes * 60
+        self.edit_gap = 1.0 / max(1.0, edits_per_second)
+        # chat_id -> [message_id, coords, until, last_text]
+        self._chats: Dict[int, list] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def track(self, chat_id: int, message_id: int, coords: Optional[Tuple[float, float]] = None) -> None:
+        self._chats[chat_id] = [message_id, coords, time.monotonic() + self.duration, ""]
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    def untrack(self, chat_id: int) -> bool:
+        return self._chats.pop(chat_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    async def _loop(self) -> None:
+        q = self.feed.subscribe()
+        try:
+            while self._chats:
+                try:
+                    st = await asyncio.wait_for(q.get(), timeout=self.every * 2)
+                except asyncio.TimeoutError:
+                    st = await self.feed.get()
+                if st is None:
+                    continue
+                started = time.monotonic()
+                for chat_id, item in list(self._chats.items()):
+                    message_id, coords, until, last = item
+                    if time.monotonic() > until:
+                        self._chats.pop(chat_id, None)
+                        continue
+                    text = self.render(st, coords)
+                    if text == last:
+                        continue
+                    try:
+                        await self.edit(chat_id, message_id, text)
+                        item[3] = text
+                    except Exception as e:
+                        retry_after = getattr(e, "retry_after", None)
+                        if retry_after is not None:
+                            # флуд-лимит общий на бота — ждём и продолжаем со следующего чата
+                            logger.warning(f"live track: retry after {retry_after}s")
+                            await asyncio.sleep(float(retry_after))
+                        elif _not_modified(e):
+                            item[3] = text
+                        elif _permanent(e):
+                            logger.info(f"live track stop chat={chat_id}: {e!r}")
+                            self._chats.pop(chat_id, None)
+                        else:
+                            # сеть/5xx — попробуем на следующем тике, пока не истёк срок
+                            logger.warning(f"live track edit fail chat={chat_id}: {e!r}")
+                    await asyncio.sleep(self.edit_gap)
+                await asyncio.sleep(max(0.0, self.every - (time.monotonic() - started)))
+        finally:
+            self.feed.unsubscribe(q)
@@ -0,0 +1,144 @@
+# app/utils/iss_map.py
+"""
+Карта трассы МКС (Pillow, равнопромежуточная проекция).
+
+Подложка грузится один раз. Раз в минуту рисуется общий кадр: подложка,
+ночная сторона, трасса на виток вперёд и текущая точка МКС. Для
+пользователя к копии кадра добавляется только его маркер.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import io
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from loguru import logger as _logger
+
+from app.utils.orbit import OrbitEngine, _jd
+from app.utils.orbit_batch import BatchPropagator, _gmst, _sun_eci
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:  # карта — необязательная функция
+    Image = ImageDraw = None
+
+logger = _logger.bind(feature="space")
+
+ORBIT_MINUTES = 93
+
+OCEAN = (18, 44, 74)
+GRID = (40, 70, 104)
+TRACK = (255, 200, 40)
+ISS = (255, 60, 60)
+USER = (80, 220, 120)
+
+
+def track_points(engine: OrbitEngine, start: dt.datetime, minutes: float = ORBIT_MINUTES,
+                 step: float = 30.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Подспутниковые широты/долготы (градусы) на виток вперёд — одним вызовом sgp4_array."""
+    secs = np.arange(0.0, minutes * 60 + step, step)
+    ecef, _, _ = BatchPropagator(engine, start).ecef(secs)
+    lat = np.degrees(np.arctan2(ecef[:, 2], np.hypot(ecef[:, 0], ecef[:, 1])))
+    lon = np.degrees(np.arctan2(ecef[:, 1], ecef[:, 0]))
+    return lat, lon
+
+
+def _segments(x: np.ndarray, y: np.ndarray, width: int) -> List[List[Tuple[float, float]]]:
+    """Разрезать ломаную там, где она перескакивает через линию перемены дат."""
+    cuts = np.nonzero(np.abs(np.diff(x)) > width / 2)[0] + 1
+    return [list(zip(xs.tolist(), ys.tolist())) for xs, ys in zip(np.split(x, cuts), np.split(y, cuts)) if len(xs) > 1]
+
+
+class IssMap:
+    def __init__(self, width: int = 1024, basemap: Optional[Path] = None):
+        if Image is None:
+            raise RuntimeError("Pillow is not installed")
+        self.width = width
+        self.height = width // 2
+        self._base = self._load_base(basemap)
+        self._lock = threading.Lock()
+        self._frame: Optional["Image.Image"] = None
+        self._frame_jpeg: Optional[bytes] = None
+        self._frame_minute = -1
+        lon = (np.arange(self.width) + 0.5) / self.width * 360 - 180
+        lat = 90 - (np.arange(self.height) + 0.5) / self.height * 180
+        lo, la = np.radians(np.meshgrid(lon, lat))
+        self._grid_xyz = np.stack([np.cos(la) * np.cos(lo), np.cos(la) * np.sin(lo), np.sin(la)], axis=-1)
+
+    def _load_base(self, path: Optional[Path]) -> "Image.Image":
+        if path and path.exists():
+            return Image.open(path).convert("RGB").resize((self.width, self.height))
+        img = Image.new("RGB", (self.width, self.height), OCEAN)
+        d = ImageDraw.Draw(img)
+        for lon in range(-180, 181, 30):
+            x = self.x(lon)
+            d.line([(x, 0), (x, self.height)], fill=GRID)
+        for lat in range(-60, 61, 30):
+            y = self.y(lat)
+            d.line([(0, y), (self.width, y)], fill=GRID)
+        return img
+
+    def x(self, lon):
+        return (np.asarray(lon) + 180.0) / 360.0 * self.width
+
+    def y(self, lat):
+        return (90.0 - np.asarray(lat)) / 180.0 * self.height
+
+    def _night(self, t: dt.datetime) -> np.ndarray:
+        """Маска ночи (0..1) по положению Солнца на момент t."""
+        jd, fr = _jd(t)
+        jd, fr = np.array([jd]), np.array([fr])
+        sun = _sun_eci(jd, fr)[0]
+        th = _gmst(jd, fr)[0]
+        s = np.array([np.cos(th) * sun[0] + np.sin(th) * sun[1], -np.sin(th) * sun[0] + np.cos(th) * sun[1], sun[2]])
+        cos_z = self._grid_xyz @ (s / np.linalg.norm(s))
+        return np.clip(-cos_z * 8 + 0.5, 0.0, 1.0)
+
+    def frame(self, engine: OrbitEngine, iss: Tuple[float, float], t: Optional[dt.datetime] = None) -> "Image.Image":
+        """Общий кадр на текущую минуту; перерисовывается не чаще раза в минуту."""
+        minute = int(time.time() // 60)
+        with self._lock:
+            if self._frame is not None and self._frame_minute == minute:
+                return self._frame
+            t = t or dt.datetime.now(dt.timezone.utc)
+            started = time.perf_counter()
+            arr = np.asarray(self._base, dtype=np.float32)
+            arr *= (1.0 - 0.55 * self._night(t))[..., None]
+            img = Image.fromarray(arr.astype(np.uint8))
+            d = ImageDraw.Draw(img)
+            lat, lon = track_points(engine, t)
+            for seg in _segments(self.x(lon), self.y(lat), self.width):
+                d.line(seg, fill=TRACK, width=2)
+            cx, cy = float(self.x(iss[1])), float(self.y(iss[0]))
+            d.ellipse([cx - 7, cy - 7, cx + 7, cy + 7], fill=ISS, outline=(255, 255, 255), width=2)
+            self._frame, self._frame_minute, self._frame_jpeg = img, minute, None
+            logger.debug(f"iss map frame rendered in {(time.perf_counter() - started) * 1000:.1f} ms")
+            return img
+
+    def render(self, engine: OrbitEngine, iss: Tuple[float, float],
+               user: Optional[Tuple[float, float]] = None) -> bytes:
+        """JPEG для отправки; без маркера пользователя байты тоже общие на минуту."""
+        frame = self.frame(engine, iss)
+        if user is None:
+            with self._lock:
+                # минута могла смениться между frame() и этой блокировкой — кэш только для текущего кадра
+                if frame is self._frame:
+                    if self._frame_jpeg is None:
+                        self._frame_jpeg = self._encode(frame)
+                    return self._frame_jpeg
+            return self._encode(frame)
+        img = frame.copy()
+        d = ImageDraw.Draw(img)
+        ux, uy = float(self.x(user[1])), float(self.y(user[0]))
+        d.ellipse([ux - 6, uy - 6, ux + 6, uy + 6], fill=USER, outline=(0, 0, 0), width=2)
+        return self._encode(img)
+
+    @staticmethod
+    def _encode(img: "Image.Image") -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        return buf.getvalue()
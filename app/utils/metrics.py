@@ -0,0 +1,248 @@
+# app/utils/metrics.py
+"""
+Метрики в памяти процесса и /metrics в текстовом формате Prometheus.
+
+Запись — это сложение атрибута (счётчик) или bisect по границам (гистограмма),
+без блокировок: десятки-сотни наносекунд. Редкая потеря инкремента при гонке
+потоков считается допустимой. Всё, что уже есть в stats() компонентов
+(очереди, пулы, предохранители), снимается только в момент запроса /metrics.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger as _logger
+
+logger = _logger.bind(feature="core")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        self.value += n
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+    def dec(self, n: float = 1.0) -> None:
+        self.value -= n
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.label_names:
+            self._children[()] = self._new()
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Дочерняя серия; сохраните её в переменную на горячем пути — тогда это один lookup."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new())
+        return child
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new(self):
+        return _CounterChild()
+
+    def inc(self, n: float = 1.0) -> None:
+        self._children[()].inc(n)
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for values, child in list(self._children.items()):
+            out.append(f"{self.name}{_labels(self.label_names, values)} {_num(child.value)}")
+        return out
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def _new(self):
+        return _GaugeChild()
+
+    def set(self, v: float) -> None:
+        self._children[()].set(v)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, v: float) -> None:
+        self._children[()].observe(v)
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for values, h in list(self._children.items()):
+            acc = 0
+            for bound, c in zip(self.bounds + (math.inf,), list(h.counts)):
+                acc += c
+                le = 'le="' + _num(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, values)} {_num(h.sum)}")
+            out.append(f"{self.name}_count{_labels(self.label_names, values)} {h.count}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _add(self, metric: _Metric) -> Any:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[Sample]]) -> None:
+        """fn() -> [(имя, метки, значение)], вызывается только при запросе /metrics."""
+        self._collectors.append(fn)
+
+    def stats_collector(self, prefix: str, fn: Callable[[], Optional[Dict[str, Any]]], **labels: str) -> None:
+        """Числовые поля из stats() компонента -> gauge {prefix}_{поле}."""
+        def collect() -> Iterable[Sample]:
+            for key, value in (fn() or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield f"{prefix}_{key}", labels, float(value)
+        self.collector(collect)
+
+    def render(self) -> str:
+        out: List[str] = []
+        for m in list(self._metrics.values()):
+            out += m.render()
+        # строки одной метрики в формате Prometheus должны идти подряд — группируем по имени
+        grouped: Dict[str, List[str]] = {}
+        for fn in self._collectors:
+            try:
+                samples = list(fn())
+            except Exception as e:
+                logger.warning(f"metrics collector failed: {e!r}")
+                continue
+            for name, labels, value in samples:
+                names = tuple(labels)
+                grouped.setdefault(name, []).append(f"{name}{_labels(names, [labels[n] for n in names])} {_num(value)}")
+        for name, lines in grouped.items():
+            out.append(f"# TYPE {name} gauge")
+            out += lines
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+SPANS = REGISTRY.histogram("bot_span_seconds", "Duration of traced handlers and calls", ("span", "status"))
+UPSTREAM = REGISTRY.histogram("bot_upstream_seconds", "Upstream HTTP call latency", ("host", "status"))
+CACHE = REGISTRY.counter("bot_cache_requests_total", "Cache lookups", ("cache", "result"))
+II_MODEL = REGISTRY.histogram("bot_ii_model_seconds", "AI model answer latency", ("model", "status"))
+CPU_TASK = REGISTRY.histogram("bot_cpu_task_seconds", "CPU-bound parsing task latency", ("task", "where"))
+DEDUP = REGISTRY.counter("bot_dedup_total", "Repeated user actions: run, attach or drop", ("feature", "result"))
+
+
+def cache_hit(cache: str, hit: bool) -> None:
+    CACHE.labels(cache, "hit" if hit else "miss").inc()
+
+
+def _on_span(sp, ms: float, error: Optional[BaseException]) -> None:
+    status = "ok" if error is None else "error"
+    if sp.name.startswith("http "):
+        UPSTREAM.labels(sp.name[5:], status).observe(ms / 1000)
+    else:
+        SPANS.labels(sp.name, status).observe(ms / 1000)
+
+
+def install_tracing_hook() -> None:
+    """Длительности спанов (handlers, upstream) -> гистограммы."""
+    from app.utils import tracing
+    if _on_span not in tracing.listeners:
+        tracing.listeners.append(_on_span)
+
+
+async def serve(registry: Registry = REGISTRY, host: str = "127.0.0.1", port: int = 9108):
+    """Локальный HTTP /metrics; возвращает aiohttp AppRunner (runner.cleanup() при остановке)."""
+    from aiohttp import web
+
+    async def handle(_request):
+        return web.Response(body=registry.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"metrics on http://{host}:{port}/metrics")
+    return runner
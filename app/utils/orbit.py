@@ -0,0 +1,307 @@
+# app/utils/orbit.py
+"""
+Локальный расчёт пролётов МКС по TLE (SGP4), без обращений к сети на запрос.
+
+Координаты: SGP4 отдаёт TEME, в земную систему переводим поворотом на GMST
+(полярным движением пренебрегаем — для пролётов это доли угловой минуты).
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import math
+import os
+import time
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from loguru import logger as _logger
+
+try:
+    from sgp4.api import Satrec, jday
+except ImportError:  # pragma: no cover - sgp4 не установлен
+    Satrec = None
+    jday = None
+
+logger = _logger.bind(feature="space")
+
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+EARTH_R = 6371.0
+AU_KM = 149597870.7
+
+CELESTRAK_ISS = "https://celestrak.org/NORAD/elements/gp.php?CATNR=25544&FORMAT=TLE"
+
+
+class Pass(NamedTuple):
+    rise: dt.datetime
+    culmination: dt.datetime
+    set: dt.datetime
+    max_elevation: float
+    rise_azimuth: float
+    set_azimuth: float
+    visible: bool
+
+    @property
+    def duration(self) -> int:
+        return int((self.set - self.rise).total_seconds())
+
+
+def _jd(t: dt.datetime) -> Tuple[float, float]:
+    t = t.astimezone(dt.timezone.utc)
+    return jday(t.year, t.month, t.day, t.hour, t.minute, t.second + t.microsecond / 1e6)
+
+
+def gmst(jd: float, fr: float = 0.0) -> float:
+    """Звёздное время Гринвича (IAU-82), радианы."""
+    tut1 = (jd - 2451545.0 + fr) / 36525.0
+    sec = (67310.54841 + (876600.0 * 3600 + 8640184.812866) * tut1
+           + 0.093104 * tut1 ** 2 - 6.2e-6 * tut1 ** 3)
+    return math.radians((sec % 86400.0) / 240.0)
+
+
+def sun_eci(jd: float, fr: float = 0.0) -> Tuple[float, float, float]:
+    """Положение Солнца (км), формула Astronomical Almanac низкой точности."""
+    n = jd - 2451545.0 + fr
+    L = math.radians((280.460 + 0.9856474 * n) % 360)
+    g = math.radians((357.528 + 0.9856003 * n) % 360)
+    lam = L + math.radians(1.915) * math.sin(g) + math.radians(0.020) * math.sin(2 * g)
+    eps = math.radians(23.439 - 0.0000004 * n)
+    r = (1.00014 - 0.01671 * math.cos(g) - 0.00014 * math.cos(2 * g)) * AU_KM
+    return (r * math.cos(lam), r * math.cos(eps) * math.sin(lam), r * math.sin(eps) * math.sin(lam))
+
+
+def is_sunlit(r: Tuple[float, float, float], sun: Tuple[float, float, float]) -> bool:
+    """Цилиндрическая тень Земли."""
+    sn = math.sqrt(sun[0] ** 2 + sun[1] ** 2 + sun[2] ** 2)
+    proj = (r[0] * sun[0] + r[1] * sun[1] + r[2] * sun[2]) / sn
+    if proj > 0:
+        return True
+    perp2 = (r[0] ** 2 + r[1] ** 2 + r[2] ** 2) - proj ** 2
+    return perp2 > EARTH_R ** 2
+
+
+def observer_ecef(lat: float, lon: float, h_km: float = 0.0) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lon)
+    n = WGS84_A / math.sqrt(1 - WGS84_E2 * math.sin(phi) ** 2)
+    return ((n + h_km) * math.cos(phi) * math.cos(lam),
+            (n + h_km) * math.cos(phi) * math.sin(lam),
+            (n * (1 - WGS84_E2) + h_km) * math.sin(phi))
+
+
+def look_angles(r_teme: Tuple[float, float, float], theta: float, lat: float, lon: float,
+                obs: Tuple[float, float, float]) -> Tuple[float, float]:
+    """(азимут, угол места) в градусах для точки r_teme при GMST=theta."""
+    c, s = math.cos(theta), math.sin(theta)
+    x = c * r_teme[0] + s * r_teme[1] - obs[0]
+    y = -s * r_teme[0] + c * r_teme[1] - obs[1]
+    z = r_teme[2] - obs[2]
+    phi, lam = math.radians(lat), math.radians(lon)
+    sp, cp, sl, cl = math.sin(phi), math.cos(phi), math.sin(lam), math.cos(lam)
+    south = sp * cl * x + sp * sl * y - cp * z
+    east = -sl * x + cl * y
+    zen = cp * cl * x + cp * sl * y + sp * z
+    rng = math.sqrt(x * x + y * y + z * z)
+    el = math.degrees(math.asin(zen / rng))
+    az = (math.degrees(math.atan2(east, -south)) + 360.0) % 360.0
+    return az, el
+
+
+class OrbitEngine:
+    """SGP4 по одному TLE."""
+
+    def __init__(self, line1: str, line2: str, name: str = "ISS"):
+        if Satrec is None:
+            raise RuntimeError("sgp4 is not installed")
+        self.name = name
+        self.line1, self.line2 = line1, line2
+        self.sat = Satrec.twoline2rv(line1, line2)
+
+    @property
+    def epoch(self) -> dt.datetime:
+        jd = self.sat.jdsatepoch + self.sat.jdsatepochF
+        return dt.datetime(2000, 1, 1, 12, tzinfo=dt.timezone.utc) + dt.timedelta(days=jd - 2451545.0)
+
+    def teme(self, t: dt.datetime) -> Tuple[Tuple[float, float, float], float, float]:
+        jd, fr = _jd(t)
+        err, r, _ = self.sat.sgp4(jd, fr)
+        if err:
+            raise ValueError(f"sgp4 error {err}")
+        return r, jd, fr
+
+    def look(self, t: dt.datetime, lat: float, lon: float, obs) -> Tuple[float, float]:
+        r, jd, fr = self.teme(t)
+        return look_angles(r, gmst(jd, fr), lat, lon, obs)
+
+    def subpoint(self, t: dt.datetime) -> Tuple[float, float, float]:
+        """(широта, долгота, высота км) под спутником."""
+        r, jd, fr = self.teme(t)
+        theta = gmst(jd, fr)
+        c, s = math.cos(theta), math.sin(theta)
+        x, y, z = c * r[0] + s * r[1], -s * r[0] + c * r[1], r[2]
+        lon = math.degrees(math.atan2(y, x))
+        p = math.hypot(x, y)
+        lat = math.atan2(z, p * (1 - WGS84_E2))
+        for _ in range(3):
+            n = WGS84_A / math.sqrt(1 - WGS84_E2 * math.sin(lat) ** 2)
+            lat = math.atan2(z + WGS84_E2 * n * math.sin(lat), p)
+        n = WGS84_A / math.sqrt(1 - WGS84_E2 * math.sin(lat) ** 2)
+        h = p / math.cos(lat) - n
+        return math.degrees(lat), lon, h
+
+    def _is_visible(self, t: dt.datetime, lat: float, lon: float, obs) -> bool:
+        """МКС на солнце, а у наблюдателя сумерки (Солнце ниже -6°)."""
+        r, jd, fr = self.teme(t)
+        sun = sun_eci(jd, fr)
+        if not is_sunlit(r, sun):
+            return False
+        _, sun_el = look_angles(sun, gmst(jd, fr), lat, lon, obs)
+        return sun_el < -6.0
+
+    def passes(
+        self,
+        lat: float,
+        lon: float,
+        start: Optional[dt.datetime] = None,
+        *,
+        n: int = 3,
+        hours: float = 48.0,
+        min_elevation: float = 10.0,
+        step: float = 30.0,
+    ) -> List[Pass]:
+        start = start or dt.datetime.now(dt.timezone.utc)
+        obs = observer_ecef(lat, lon)
+        el = lambda t: self.look(t, lat, lon, obs)[1]
+
+        out: List[Pass] = []
+        t = start - dt.timedelta(minutes=15)  # чтобы поймать уже начавшийся пролёт
+        end = start + dt.timedelta(hours=hours)
+        delta = dt.timedelta(seconds=step)
+        prev_t, prev_el = t, el(t)
+        rise: Optional[dt.datetime] = None
+        while t < end and len(out) < n:
+            t = t + delta
+            cur = el(t)
+            if prev_el <= 0 < cur:
+                rise = _bisect(el, prev_t, t)
+            elif prev_el > 0 >= cur and rise is not None:
+                set_ = _bisect(el, prev_t, t)
+                culm = _golden_max(el, rise, set_)
+                max_el = el(culm)
+                if max_el >= min_elevation and set_ > start:
+                    samples = [rise + (set_ - rise) * k / 4 for k in range(5)]
+                    visible = any(self._is_visible(s, lat, lon, obs) for s in samples if el(s) >= min_elevation)
+                    out.append(Pass(
+                        rise=rise, culmination=culm, set=set_, max_elevation=round(max_el, 1),
+                        rise_azimuth=round(self.look(rise, lat, lon, obs)[0], 1),
+                        set_azimuth=round(self.look(set_, lat, lon, obs)[0], 1),
+                        visible=visible,
+                    ))
+                rise = None
+            prev_t, prev_el = t, cur
+        return out
+
+
+def _bisect(f: Callable[[dt.datetime], float], a: dt.datetime, b: dt.datetime, tol: float = 0.5) -> dt.datetime:
+    """Момент смены знака f на [a, b] с точностью tol секунд."""
+    fa = f(a)
+    while (b - a).total_seconds() > tol:
+        m = a + (b - a) / 2
+        fm = f(m)
+        if (fa <= 0) == (fm <= 0):
+            a, fa = m, fm
+        else:
+            b = m
+    return (a + (b - a) / 2).replace(microsecond=0)
+
+
+def _golden_max(f: Callable[[dt.datetime], float], a: dt.datetime, b: dt.datetime, tol: float = 1.0) -> dt.datetime:
+    g = (math.sqrt(5) - 1) / 2
+    c, d = b - (b - a) * g, a + (b - a) * g
+    fc, fd = f(c), f(d)
+    while (b - a).total_seconds() > tol:
+        if fc > fd:
+            b, d, fd = d, c, fc
+            c = b - (b - a) * g
+            fc = f(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + (b - a) * g
+            fd = f(d)
+    return (a + (b - a) / 2).replace(microsecond=0)
+
+
+def parse_tle(text: str) -> Optional[Tuple[str, str, str]]:
+    lines = [ln.strip() for ln in (text or "").splitlines() if ln.strip()]
+    for i, ln in enumerate(lines):
+        if ln.startswith("1 ") and i + 1 < len(lines) and lines[i + 1].startswith("2 "):
+            name = lines[i - 1] if i > 0 and not lines[i - 1].startswith(("1 ", "2 ")) else "ISS"
+            return name, ln, lines[i + 1]
+    return None
+
+
+class TLECache:
+    """
+    TLE на диске с обновлением не чаще max_age. Если сеть недоступна —
+    работаем по устаревшему файлу и пробуем снова через retry_after.
+    """
+
+    def __init__(self, path: Path, fetch: Callable[[str], str], url: str = CELESTRAK_ISS,
+                 max_age_hours: float = 6.0, retry_after_minutes: float = 30.0):
+        self.path = Path(path)
+        self.fetch = fetch
+        self.url = url
+        self.max_age = max_age_hours * 3600
+        self.retry_after = retry_after_minutes * 60
+        self._engine: Optional[OrbitEngine] = None
+        self._loaded_mtime = 0.0
+        self._next_check = 0.0
+        self._last_try = 0.0
+        self._lock = asyncio.Lock()
+
+    def _mtime(self) -> float:
+        try:
+            return self.path.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    def _load_file(self) -> Optional[OrbitEngine]:
+        try:
+            tle = parse_tle(self.path.read_text(encoding="utf-8"))
+        except OSError:
+            return None
+        return OrbitEngine(tle[1], tle[2], tle[0]) if tle else None
+
+    def _refresh(self) -> None:
+        text = self.fetch(self.url)
+        if not parse_tle(text):
+            raise ValueError("bad TLE payload")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    async def engine(self) -> Optional[OrbitEngine]:
+        if self._engine is not None and time.time() < self._next_check:
+            return self._engine
+        async with self._lock:
+            now = time.time()
+            if self._engine is not None and now < self._next_check:
+                return self._engine
+            if now - self._mtime() >= self.max_age and now - self._last_try >= self.retry_after:
+                self._last_try = now
+                try:
+                    await asyncio.to_thread(self._refresh)
+                    logger.info(f"TLE refreshed from {self.url}")
+                except Exception as e:
+                    logger.warning(f"TLE refresh failed: {e!r}")
+            mtime = self._mtime()
+            if mtime and (self._engine is None or mtime != self._loaded_mtime):
+                engine = await asyncio.to_thread(self._load_file)
+                if engine is not None:
+                    self._engine, self._loaded_mtime = engine, mtime
+                    logger.info(f"TLE loaded, epoch={engine.epoch:%Y-%m-%d %H:%M} UTC")
+            age = now - mtime
+            self._next_check = now + (self.max_age - age if age < self.max_age else self.retry_after)
+            return self._engine
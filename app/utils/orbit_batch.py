@@ -0,0 +1,223 @@
+# app/utils/orbit_batch.py
+"""
+Пакетный расчёт пролётов для множества наблюдателей сразу (NumPy).
+
+Спутник пропагируется один раз на общую сетку времени, углы места для всех
+наблюдателей считаются матричными произведениями, моменты восхода/захода
+уточняются векторной бисекцией сразу для всех пересечений горизонта.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.orbit import EARTH_R, WGS84_A, WGS84_E2, AU_KM, OrbitEngine, Pass, _jd
+
+
+def _gmst(jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+    tut1 = (jd - 2451545.0 + fr) / 36525.0
+    sec = (67310.54841 + (876600.0 * 3600 + 8640184.812866) * tut1
+           + 0.093104 * tut1 ** 2 - 6.2e-6 * tut1 ** 3)
+    return np.radians((sec % 86400.0) / 240.0)
+
+
+def _sun_eci(jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+    n = jd - 2451545.0 + fr
+    L = np.radians((280.460 + 0.9856474 * n) % 360)
+    g = np.radians((357.528 + 0.9856003 * n) % 360)
+    lam = L + np.radians(1.915) * np.sin(g) + np.radians(0.020) * np.sin(2 * g)
+    eps = np.radians(23.439 - 0.0000004 * n)
+    r = (1.00014 - 0.01671 * np.cos(g) - 0.00014 * np.cos(2 * g)) * AU_KM
+    return np.stack([r * np.cos(lam), r * np.cos(eps) * np.sin(lam), r * np.sin(eps) * np.sin(lam)], axis=-1)
+
+
+def _to_ecef(r: np.ndarray, theta: np.ndarray) -> np.ndarray:
+    c, s = np.cos(theta), np.sin(theta)
+    return np.stack([c * r[..., 0] + s * r[..., 1], -s * r[..., 0] + c * r[..., 1], r[..., 2]], axis=-1)
+
+
+class Observers:
+    """Наблюдатели в ECEF и их локальные базисы (юг, восток, зенит)."""
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float]):
+        self.lat = np.asarray(lats, dtype=float)
+        self.lon = np.asarray(lons, dtype=float)
+        phi, lam = np.radians(self.lat), np.radians(self.lon)
+        sp, cp, sl, cl = np.sin(phi), np.cos(phi), np.sin(lam), np.cos(lam)
+        n = WGS84_A / np.sqrt(1 - WGS84_E2 * sp ** 2)
+        self.ecef = np.stack([n * cp * cl, n * cp * sl, n * (1 - WGS84_E2) * sp], axis=-1)
+        self.zen = np.stack([cp * cl, cp * sl, sp], axis=-1)
+        self.south = np.stack([sp * cl, sp * sl, -cp], axis=-1)
+        self.east = np.stack([-sl, cl, np.zeros_like(sl)], axis=-1)
+        self.zen_off = np.einsum("ij,ij->i", self.ecef, self.zen)
+        self.norm2 = np.einsum("ij,ij->i", self.ecef, self.ecef)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+
+class BatchPropagator:
+    def __init__(self, engine: OrbitEngine, start: dt.datetime):
+        self.engine = engine
+        self.start = start
+        self.jd0, self.fr0 = _jd(start)
+
+    def ecef(self, secs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Положения спутника (ECEF и TEME, км) и юлианские даты для секунд от start."""
+        secs = np.asarray(secs, dtype=float)
+        jd = np.full(secs.shape, self.jd0)
+        fr = self.fr0 + secs / 86400.0
+        err, r, _ = self.engine.sat.sgp4_array(jd.ravel(), fr.ravel())
+        if err.any():
+            # как OrbitEngine.teme: NaN-положения дальше молча превратились бы в «нет пролётов»
+            bad = np.flatnonzero(err)
+            raise ValueError(f"sgp4 error {int(err[bad[0]])} at {secs.ravel()[bad[0]]:.0f}s ({len(bad)} points)")
+        r = r.reshape(secs.shape + (3,))
+        return _to_ecef(r, _gmst(jd, fr)), r, np.stack([jd, fr], axis=-1)
+
+
+def look_angles_grid(sat_ecef: np.ndarray, obs: Observers) -> Tuple[np.ndarray, np.ndarray]:
+    """Азимут и угол места (градусы) формы (T, N): все моменты × все наблюдатели."""
+    d_zen = sat_ecef @ obs.zen.T - obs.zen_off
+    d_south = sat_ecef @ obs.south.T - np.einsum("ij,ij->i", obs.ecef, obs.south)
+    d_east = sat_ecef @ obs.east.T - np.einsum("ij,ij->i", obs.ecef, obs.east)
+    rng = np.sqrt(d_zen ** 2 + d_south ** 2 + d_east ** 2)
+    el = np.degrees(np.arcsin(d_zen / rng))
+    az = (np.degrees(np.arctan2(d_east, -d_south)) + 360.0) % 360.0
+    return az, el
+
+
+def _pointwise(sat_ecef: np.ndarray, obs: Observers, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Азимут и угол места для пар (момент k, наблюдатель idx[k])."""
+    d = sat_ecef - obs.ecef[idx]
+    zen = np.einsum("ij,ij->i", d, obs.zen[idx])
+    south = np.einsum("ij,ij->i", d, obs.south[idx])
+    east = np.einsum("ij,ij->i", d, obs.east[idx])
+    rng = np.sqrt(zen ** 2 + south ** 2 + east ** 2)
+    return (np.degrees(np.arctan2(east, -south)) + 360.0) % 360.0, np.degrees(np.arcsin(zen / rng))
+
+
+def _sin_el(sat_ecef: np.ndarray, obs: Observers) -> np.ndarray:
+    """sin(угла места) формы (T, N) без азимута — для поиска пересечений."""
+    zc = sat_ecef @ obs.zen.T - obs.zen_off
+    sat2 = np.einsum("ij,ij->i", sat_ecef, sat_ecef)
+    rng2 = sat2[:, None] + obs.norm2[None, :] - 2.0 * (sat_ecef @ obs.ecef.T)
+    return zc / np.sqrt(rng2)
+
+
+def _refine(prop: BatchPropagator, obs: Observers, idx: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+            rising: bool, iters: int) -> np.ndarray:
+    """Векторная бисекция момента пересечения горизонта."""
+    for _ in range(iters):
+        mid = (lo + hi) / 2
+        sat, _, _ = prop.ecef(mid)
+        above = np.einsum("ij,ij->i", sat - obs.ecef[idx], obs.zen[idx]) > 0
+        if rising:
+            hi, lo = np.where(above, mid, hi), np.where(above, lo, mid)
+        else:
+            lo, hi = np.where(above, mid, lo), np.where(above, hi, mid)
+    return (lo + hi) / 2
+
+
+def batch_passes(
+    engine: OrbitEngine,
+    lats: Sequence[float],
+    lons: Sequence[float],
+    start: Optional[dt.datetime] = None,
+    *,
+    n: int = 3,
+    hours: float = 24.0,
+    min_elevation: float = 10.0,
+    step: float = 30.0,
+    chunk: int = 2000,
+) -> List[List[Pass]]:
+    """
+    Пролёты для каждого наблюдателя (тот же смысл, что OrbitEngine.passes).
+    Видимость проверяется в четвертях пролёта, как и в скалярной версии.
+    """
+    start = start or dt.datetime.now(dt.timezone.utc)
+    prop = BatchPropagator(engine, start)
+    lead = 15 * 60.0
+    secs = np.arange(-lead, hours * 3600.0 + step, step)
+    sat_grid, _, _ = prop.ecef(secs)
+    iters = max(1, int(np.ceil(np.log2(step / 0.5))))
+    span = int(np.ceil(20 * 60 / step))  # дольше 20 минут пролёт МКС не длится
+
+    obs_all = Observers(lats, lons)
+    result: List[List[Pass]] = [[] for _ in range(len(obs_all))]
+    for c0 in range(0, len(obs_all), chunk):
+        c1 = min(c0 + chunk, len(obs_all))
+        obs = Observers(obs_all.lat[c0:c1], obs_all.lon[c0:c1])
+        sin_el = _sin_el(sat_grid, obs)
+        above = sin_el > 0
+
+        r_t, r_o = np.nonzero(~above[:-1] & above[1:])
+        s_t, s_o = np.nonzero(above[:-1] & ~above[1:])
+        # каждому восходу — ближайший следующий заход того же наблюдателя
+        s_order = np.lexsort((s_t, s_o))
+        s_t, s_o = s_t[s_order], s_o[s_order]
+        key_s = s_o.astype(np.int64) * len(secs) + s_t
+        pos = np.searchsorted(key_s, r_o.astype(np.int64) * len(secs) + r_t)
+        ok = pos < len(key_s)
+        ok[ok] &= s_o[pos[ok]] == r_o[ok]
+        r_t, r_o, s_t = r_t[ok], r_o[ok], s_t[pos[ok]]
+        if not len(r_t):
+            continue
+
+        rise = _refine(prop, obs, r_o, secs[r_t], secs[r_t + 1], True, iters)
+        set_ = _refine(prop, obs, r_o, secs[s_t], secs[s_t + 1], False, iters)
+
+        # кульминация: максимум на сетке + парабола по трём соседним точкам
+        win = np.minimum(r_t[:, None] + 1 + np.arange(span)[None, :], s_t[:, None])
+        vals = sin_el[win, r_o[:, None]]
+        k = win[np.arange(len(win)), vals.argmax(axis=1)]
+        y0 = sin_el[np.maximum(k - 1, 0), r_o]
+        y1 = sin_el[k, r_o]
+        y2 = sin_el[np.minimum(k + 1, len(secs) - 1), r_o]
+        den = y0 - 2 * y1 + y2
+        off = np.where(np.abs(den) > 1e-12, 0.5 * (y0 - y2) / np.where(den == 0, 1, den), 0.0)
+        culm = secs[k] + np.clip(off, -1, 1) * step
+
+        sat_c, _, _ = prop.ecef(culm)
+        _, max_el = _pointwise(sat_c, obs, r_o)
+        keep = (max_el >= min_elevation) & (set_ > 0)
+        if not keep.any():
+            continue
+        r_o, rise, set_, culm, max_el = r_o[keep], rise[keep], set_[keep], culm[keep], max_el[keep]
+
+        sat_r, _, _ = prop.ecef(rise)
+        sat_s, _, _ = prop.ecef(set_)
+        rise_az, _ = _pointwise(sat_r, obs, r_o)
+        set_az, _ = _pointwise(sat_s, obs, r_o)
+
+        visible = np.zeros(len(r_o), dtype=bool)
+        for q in (0.25, 0.5, 0.75):
+            tq = rise + (set_ - rise) * q
+            sat_q, teme_q, jdfr = prop.ecef(tq)
+            _, el_q = _pointwise(sat_q, obs, r_o)
+            sun = _sun_eci(jdfr[:, 0], jdfr[:, 1])
+            sun_n = sun / np.linalg.norm(sun, axis=1, keepdims=True)
+            proj = np.einsum("ij,ij->i", teme_q, sun_n)
+            perp2 = np.einsum("ij,ij->i", teme_q, teme_q) - proj ** 2
+            lit = (proj > 0) | (perp2 > EARTH_R ** 2)
+            _, sun_el = _pointwise(_to_ecef(sun, _gmst(jdfr[:, 0], jdfr[:, 1])), obs, r_o)
+            visible |= lit & (sun_el < -6.0) & (el_q >= min_elevation)
+
+        base = start.astimezone(dt.timezone.utc)
+        order = np.lexsort((rise, r_o))
+        for i in order:
+            bucket = result[c0 + int(r_o[i])]
+            if len(bucket) >= n:
+                continue
+            bucket.append(Pass(
+                rise=(base + dt.timedelta(seconds=float(rise[i]))).replace(microsecond=0),
+                culmination=(base + dt.timedelta(seconds=float(culm[i]))).replace(microsecond=0),
+                set=(base + dt.timedelta(seconds=float(set_[i]))).replace(microsecond=0),
+                max_elevation=round(float(max_el[i]), 1),
+                rise_azimuth=round(float(rise_az[i]), 1),
+                set_azimuth=round(float(set_az[i]), 1),
+                visible=bool(visible[i]),
+            ))
+    return result
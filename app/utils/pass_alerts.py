@@ -0,0 +1,171 @@
+# app/utils/pass_alerts.py
+"""
+Оповещения о пролётах МКС по подпискам.
+
+На каждого подписчика в куче лежит ровно одно событие — «за lead минут до
+ближайшего пролёта». Цикл спит до вершины кучи (или до пересчёта TLE) и
+просыпается раньше только по событию, без опроса. Пролёты считаются
+пакетно (batch_passes) сразу для всех подписчиков.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger as _logger
+
+from app.db.AlertsDB import AlertsDB, AlertSub
+from app.utils.orbit import Pass, TLECache
+from app.utils.orbit_batch import batch_passes
+
+logger = _logger.bind(feature="space")
+
+
+class _Sub:
+    __slots__ = ("sub", "passes", "gen")
+
+    def __init__(self, sub: AlertSub):
+        self.sub = sub
+        self.passes: Deque[Pass] = deque()
+        self.gen = 0
+
+
+class PassAlerts:
+    def __init__(self, db: AlertsDB, tle: TLECache,
+                 send: Callable[[int, str], Awaitable[None]],
+                 render: Callable[[AlertSub, Pass], str],
+                 *, refresh_hours: float = 6.0, hours: float = 24.0, per_sub: int = 6,
+                 min_elevation: float = 10.0, sends_per_second: float = 20.0):
+        self.db = db
+        self.tle = tle
+        self.send = send
+        self.render = render
+        self.refresh = refresh_hours * 3600
+        self.hours = hours
+        self.per_sub = per_sub
+        self.min_elevation = min_elevation
+        self.send_gap = 1.0 / max(1.0, sends_per_second)
+        self._subs: Dict[int, _Sub] = {}
+        self._heap: List[Tuple[float, int, int, int]] = []  # (fire_at, seq, chat_id, gen)
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._next_refresh = 0.0
+        self.sent = 0
+        self.failed = 0
+
+    def _schedule(self, s: _Sub) -> None:
+        now = time.time()
+        lead = s.sub.lead_minutes * 60
+        while s.passes and s.passes[0].rise.timestamp() <= now:
+            s.passes.popleft()
+        if not s.passes:
+            return
+        fire_at = max(now, s.passes[0].rise.timestamp() - lead)
+        entry = (fire_at, next(self._seq), s.sub.chat_id, s.gen)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wake.set()
+
+    async def _recompute(self, chat_ids: Optional[Iterable[int]] = None) -> None:
+        engine = await self.tle.engine()
+        if engine is None:
+            logger.warning("pass alerts: no TLE, recompute postponed")
+            return
+        full = chat_ids is None
+        subs = list(self._subs.values()) if full else [self._subs[c] for c in chat_ids if c in self._subs]
+        if not subs:
+            return
+        started = time.monotonic()
+        try:
+            result = await asyncio.to_thread(
+                batch_passes, engine, [s.sub.lat for s in subs], [s.sub.lon for s in subs],
+                n=self.per_sub, hours=self.hours, min_elevation=self.min_elevation,
+            )
+        except ValueError as e:
+            # ошибка SGP4 (обычно протухший TLE) — оставляем прежнее расписание
+            logger.error(f"pass alerts: recompute failed: {e}")
+            return
+        if full:
+            # после полного пересчёта старые события не нужны — куча снова по одному на подписчика
+            self._heap.clear()
+        for s, passes in zip(subs, result):
+            if s.sub.chat_id not in self._subs:
+                continue
+            s.passes = deque(p for p in passes if p.visible or not s.sub.visible_only)
+            s.gen += 1
+            self._schedule(s)
+        logger.info(f"pass alerts: recomputed {len(subs)} subs in {time.monotonic() - started:.2f}s")
+
+    async def start(self) -> None:
+        for sub in await self.db.all():
+            self._subs[sub.chat_id] = _Sub(sub)
+        await self._recompute()
+        self._next_refresh = time.time() + self.refresh
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def subscribe(self, sub: AlertSub) -> Optional[Pass]:
+        """Сохранить подписку и сразу запланировать ближайший пролёт; вернуть его."""
+        await self.db.subscribe(sub)
+        s = self._subs.get(sub.chat_id)
+        if s is None:
+            s = self._subs[sub.chat_id] = _Sub(sub)
+        else:
+            s.sub = sub
+        await self._recompute([sub.chat_id])
+        return s.passes[0] if s.passes else None
+
+    async def unsubscribe(self, chat_id: int) -> bool:
+        # событие в куче останется, но при срабатывании не найдёт подписчика
+        self._subs.pop(chat_id, None)
+        return await self.db.unsubscribe(chat_id)
+
+    async def _fire(self, s: _Sub) -> None:
+        p = s.passes.popleft()
+        if p.set.timestamp() > time.time():
+            try:
+                await self.send(s.sub.chat_id, self.render(s.sub, p))
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"pass alert send fail chat={s.sub.chat_id}: {e!r}")
+            await asyncio.sleep(self.send_gap)
+        self._schedule(s)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            now = time.time()
+            due = min(self._next_refresh, self._heap[0][0] if self._heap else self._next_refresh)
+            if due > now:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if now >= self._next_refresh:
+                self._next_refresh = now + self.refresh
+                try:
+                    await self._recompute()
+                except Exception as e:
+                    logger.error(f"pass alerts recompute failed: {e!r}")
+                continue
+            _, _, chat_id, gen = heapq.heappop(self._heap)
+            s = self._subs.get(chat_id)
+            if s is None or s.gen != gen or not s.passes:
+                continue
+            await self._fire(s)
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": len(self._subs), "scheduled": len(self._heap),
+                "sent": self.sent, "failed": self.failed}
@@ -0,0 +1,239 @@
+# app/utils/settings.py
+"""
+Настройки бота: окружение + .env, разобранные один раз в типизированный Settings.
+
+Обработчики берут текущий объект через get_settings() — это чтение глобальной
+ссылки, без файлового I/O. SettingsWatcher раз в несколько секунд смотрит
+mtime .env и при изменении собирает новый Settings целиком и подменяет ссылку
+(старый объект неизменяем, так что читатели никогда не видят «половину»
+обновления). Ошибка разбора при перечитывании оставляет прежние настройки.
+
+Значения из .env перекрывают окружение (как раньше load_dotenv(override=True)).
+Поля с restart=True читаются только при запуске — их смена попадает в лог,
+но действует после перезапуска.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from dotenv import dotenv_values
+from loguru import logger as _logger
+
+logger = _logger.bind(feature="core")
+
+_TRUE = {"1", "true", "yes", "on"}
+
+
+def _opt(raw: str) -> Optional[str]:
+    return raw or None
+
+
+def _opt_path(raw: str) -> Optional[Path]:
+    return Path(raw) if raw else None
+
+
+def _bool(raw: str) -> bool:
+    return raw.strip().lower() in _TRUE
+
+
+def _words(raw: str) -> Tuple[str, ...]:
+    return tuple(w.strip() for w in raw.split(",") if w.strip())
+
+
+def _ids(raw: str) -> FrozenSet[int]:
+    return frozenset(int(x) for x in _words(raw))
+
+
+def _env(name: str, default: Any, cast: Callable[[str], Any] = str, *, restart: bool = False):
+    return field(default=default, metadata={"env": name, "cast": cast, "restart": restart})
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Telegram и ядро
+    bot_token: str = _env("BOT_API1", "", restart=True)
+    telegram_api_url: Optional[str] = _env("TELEGRAM_API_URL", None, _opt, restart=True)
+    bot_db: Optional[Path] = _env("BOT_DB", None, _opt_path, restart=True)
+    log_level: str = _env("LOG_LEVEL", "DEBUG", restart=True)
+    log_to_files: bool = _env("LOG_TO_FILES", True, _bool, restart=True)
+    trace_sample: float = _env("TRACE_SAMPLE", 1.0, float, restart=True)
+    metrics_host: str = _env("METRICS_HOST", "127.0.0.1", restart=True)
+    metrics_port: int = _env("METRICS_PORT", 9108, int, restart=True)
+    settings_poll_seconds: float = _env("SETTINGS_POLL_SECONDS", 2.0, float, restart=True)
+    admin_ids: FrozenSet[int] = _env("ADMIN_IDS", frozenset(), _ids)
+    tracemalloc_frames: int = _env("TRACEMALLOC_FRAMES", 1, int, restart=True)
+    profile_hz: float = _env("PROFILE_HZ", 100.0, float, restart=True)
+    dedup_window: float = _env("DEDUP_WINDOW", 2.0, float, restart=True)
+    proxy_address: Optional[str] = _env("proxy_address", None, _opt, restart=True)
+    proxy_username: Optional[str] = _env("proxy_username", None, _opt, restart=True)
+    proxy_password: Optional[str] = _env("proxy_password", None, _opt, restart=True)
+
+    # погода
+    weather_api_key: str = _env("weather_API", "")
+    weather_cache_seconds: int = _env("WEATHER_CACHE_SECONDS", 600, int)
+
+    # новости
+    news_base_url: str = _env("base_url", "")
+    news_half_url: str = _env("half_url", "")
+    bad_words: Tuple[str, ...] = _env("bad_words", (), _words)
+
+    # ИИ
+    ii_base_url: Optional[str] = _env("II_BASE_URL", None, _opt)
+    ii_api_key: Optional[str] = _env("II_API_KEY", None, _opt)
+    ii_workers: int = _env("II_WORKERS", 4, int, restart=True)
+    ii_worker_max_tasks: int = _env("II_WORKER_MAX_TASKS", 50, int, restart=True)
+    ii_worker_max_rss_mb: int = _env("II_WORKER_MAX_RSS_MB", 512, int, restart=True)
+    ii_queue_size: int = _env("II_QUEUE_SIZE", 32, int, restart=True)
+    ii_warm_workers: int = _env("II_WARM_WORKERS", 1, int, restart=True)
+    ii_per_user: int = _env("II_PER_USER", 1, int, restart=True)
+    ii_max_queue: int = _env("II_MAX_QUEUE", 50, int, restart=True)
+    ii_daily_tokens: int = _env("II_DAILY_TOKENS", 0, int, restart=True)
+    ii_memory: bool = _env("II_MEMORY", False, _bool, restart=True)
+    ii_memory_tokens: int = _env("II_MEMORY_TOKENS", 1500, int, restart=True)
+    ii_memory_ttl_min: int = _env("II_MEMORY_TTL_MIN", 60, int, restart=True)
+    g4f_usage_dir: Optional[Path] = _env("G4F_USAGE_DIR", None, _opt_path, restart=True)
+
+    # пул CPU-задач (разбор HTML, чистка текста); 0 воркеров — в потоке
+    cpu_workers: int = _env("CPU_WORKERS", 2, int, restart=True)
+    cpu_worker_max_tasks: int = _env("CPU_WORKER_MAX_TASKS", 500, int, restart=True)
+    cpu_worker_max_rss_mb: int = _env("CPU_WORKER_MAX_RSS_MB", 256, int, restart=True)
+    cpu_queue_size: int = _env("CPU_QUEUE_SIZE", 32, int, restart=True)
+    cpu_task_timeout: float = _env("CPU_TASK_TIMEOUT", 15.0, float)
+
+    # космос
+    space_report_deadline: float = _env("SPACE_REPORT_DEADLINE", 8.0, float)
+    tle_cache: Optional[Path] = _env("TLE_CACHE", None, _opt_path, restart=True)
+    tle_max_age_hours: float = _env("TLE_MAX_AGE_HOURS", 6.0, float, restart=True)
+    iss_poll_seconds: float = _env("ISS_POLL_SECONDS", 5.0, float, restart=True)
+    iss_live_seconds: float = _env("ISS_LIVE_SECONDS", 10.0, float, restart=True)
+    iss_alert_lead_min: int = _env("ISS_ALERT_LEAD_MIN", 10, int)
+    iss_map: bool = _env("ISS_MAP", False, _bool)
+    iss_basemap: Optional[Path] = _env("ISS_BASEMAP", None, _opt_path, restart=True)
+    geonames_cities: Optional[Path] = _env("GEONAMES_CITIES", None, _opt_path, restart=True)
+    geonames_countries: Optional[Path] = _env("GEONAMES_COUNTRIES", None, _opt_path, restart=True)
+
+    # утренняя рассылка
+    digest_concurrency: int = _env("DIGEST_CONCURRENCY", 4, int, restart=True)
+    digest_sends_per_second: float = _env("DIGEST_SENDS_PER_SECOND", 25.0, float, restart=True)
+
+    @classmethod
+    def from_mapping(cls, values: Mapping[str, Optional[str]]) -> "Settings":
+        """Пустые и отсутствующие значения — значения по умолчанию; кривое число — ValueError с именем."""
+        kw: Dict[str, Any] = {}
+        for f in fields(cls):
+            raw = values.get(f.metadata["env"])
+            if raw is None or raw == "":
+                continue
+            try:
+                kw[f.name] = f.metadata["cast"](raw)
+            except ValueError as e:
+                raise ValueError(f"{f.metadata['env']}={raw!r}: {e}") from None
+        return cls(**kw)
+
+    def diff(self, other: "Settings") -> List[str]:
+        """Имена переменных, значения которых отличаются (сами значения в лог не идут — там ключи)."""
+        return [f.metadata["env"] for f in fields(self) if getattr(self, f.name) != getattr(other, f.name)]
+
+
+_CURRENT: Optional[Settings] = None
+_PATH: Optional[Path] = None
+_LOCK = threading.Lock()
+_listeners: List[Callable[[Settings, Settings], None]] = []
+
+
+def read(path: Optional[Path] = None) -> Settings:
+    """Собрать Settings из окружения и .env (если файл есть), ничего не подменяя."""
+    values: Dict[str, Optional[str]] = dict(os.environ)
+    if path is not None and Path(path).exists():
+        values.update({k: v for k, v in dotenv_values(path).items() if v is not None})
+    return Settings.from_mapping(values)
+
+
+def load(path: Optional[Path] = None) -> Settings:
+    """Первичная загрузка при запуске; path запоминается для reload()."""
+    global _CURRENT, _PATH
+    new = read(path)
+    with _LOCK:
+        _PATH = Path(path) if path is not None else None
+        _CURRENT = new
+    return new
+
+
+def get_settings() -> Settings:
+    """Текущие настройки. Без load() (скрипты, бенчмарки, воркеры) — только из окружения."""
+    global _CURRENT
+    s = _CURRENT
+    if s is None:
+        with _LOCK:
+            if _CURRENT is None:
+                _CURRENT = read(None)
+            s = _CURRENT
+    return s
+
+
+def subscribe(fn: Callable[[Settings, Settings], None]) -> None:
+    """fn(old, new) вызывается после каждой подмены настроек."""
+    _listeners.append(fn)
+
+
+def reload() -> bool:
+    """Перечитать .env; True, если что-то поменялось. При ошибке разбора остаются прежние."""
+    global _CURRENT
+    try:
+        new = read(_PATH)
+    except Exception as e:
+        logger.error(f"settings reload failed, keeping previous: {e}")
+        return False
+    with _LOCK:
+        old, _CURRENT = _CURRENT, new
+    if old is None:
+        return True
+    changed = old.diff(new)
+    if not changed:
+        return False
+    restart = {f.metadata["env"] for f in fields(Settings) if f.metadata["restart"]}
+    logger.info(f"settings reloaded: {', '.join(changed)}")
+    if restart & set(changed):
+        logger.warning(f"settings need restart to apply: {', '.join(sorted(restart & set(changed)))}")
+    for fn in list(_listeners):
+        try:
+            fn(old, new)
+        except Exception as e:
+            logger.bind(feature="errors").exception(f"settings listener failed: {e}")
+    return True
+
+
+class SettingsWatcher:
+    """Следит за mtime файла настроек и вызывает reload() при изменении."""
+
+    def __init__(self, path: Path, interval: float = 2.0):
+        self.path = Path(path)
+        self.interval = interval
+        self._stamp = self._mtime()
+
+    def _mtime(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def check(self) -> bool:
+        stamp = self._mtime()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        return reload()
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"settings watcher: {e!r}")
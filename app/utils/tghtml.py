@@ -0,0 +1,134 @@
+# app/utils/tghtml.py
+from __future__ import annotations
+
+import html
+import re
+from typing import Iterator, List, Tuple
+
+TG_LIMIT = 4096
+
+_FENCE_HEAD = re.compile(r"```([a-zA-Z0-9_+\-]*)\s*\n")
+
+_TAGS = {
+    "text": ("", ""),
+    "pre": ("<pre><code>", "</code></pre>"),
+    "code": ("<code>", "</code>"),
+}
+
+
+def _fence_at(text: str, pos: int) -> Tuple[int, int] | None:
+    """Границы кода блока, если в pos начинается ```lang\n…```."""
+    if not text.startswith("```", pos):
+        return None
+    m = _FENCE_HEAD.match(text, pos)
+    if not m:
+        return None
+    end = text.find("```", m.end())
+    return (m.end(), end) if end >= 0 else None
+
+
+def _tokens(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    Один проход по тексту: ("text", ...), ("pre", ...) для ```блоков``` и
+    ("code", ...) для `инлайна`. Правила те же, что у прежних регулярок.
+    """
+    n = len(text)
+    start = i = 0
+    while i < n:
+        j = text.find("`", i)
+        if j < 0:
+            break
+        block = _fence_at(text, j)
+        if block:
+            if start < j:
+                yield "text", text[start:j]
+            yield "pre", text[block[0]:block[1]]
+            start = i = block[1] + 3
+            continue
+        k = text.find("`", j + 1)
+        # блоки важнее инлайна: `…``` не съедает начало блока
+        if k > j + 1 and not _fence_at(text, k):
+            nl = text.find("\n", j + 1, k)
+            if nl < 0:
+                if start < j:
+                    yield "text", text[start:j]
+                yield "code", text[j + 1:k]
+                start = i = k + 1
+                continue
+        i = j + 1
+    if start < n:
+        yield "text", text[start:]
+
+
+def format_for_html(text: str) -> str:
+    """Markdown-код ответа модели -> экранированный Telegram HTML."""
+    out: List[str] = []
+    for kind, raw in _tokens(text or ""):
+        open_, close = _TAGS[kind]
+        out.append(open_ + html.escape(raw) + close)
+    return "".join(out)
+
+
+def _cut(body: str, room: int) -> int:
+    """Где резать экранированный текст: по строке/пробелу, но не внутри &сущности;."""
+    if room >= len(body):
+        return len(body)
+    cut = room
+    half = room // 2
+    nl = body.rfind("\n", half, room)
+    if nl >= 0:
+        cut = nl + 1
+    else:
+        sp = body.rfind(" ", half, room)
+        if sp >= 0:
+            cut = sp + 1
+    amp = body.rfind("&", max(0, cut - 8), cut)
+    if amp >= 0 and body.find(";", amp, cut) < 0:
+        cut = amp
+    return cut
+
+
+def iter_html_chunks(text: str, limit: int = TG_LIMIT) -> Iterator[str]:
+    """
+    Форматирует и сразу режет на сообщения не длиннее limit. Теги всегда
+    закрываются в том же куске: длинный блок кода рвётся на несколько
+    <pre><code>…</code></pre>. Блок, который влезает в одно сообщение целиком,
+    переносится в следующее, а не разрывается.
+    """
+    buf: List[str] = []
+    size = 0
+    for kind, raw in _tokens(text or ""):
+        open_, close = _TAGS[kind]
+        body = html.escape(raw)
+        overhead = len(open_) + len(close)
+        while body:
+            room = limit - size - overhead
+            if len(body) <= room:
+                buf.append(open_ + body + close)
+                size += overhead + len(body)
+                break
+            if buf and ((kind != "text" and len(body) <= limit - overhead) or room < 16):
+                yield "".join(buf)
+                buf, size = [], 0
+                continue
+            cut = _cut(body, room)
+            if cut <= 0:
+                if buf:
+                    yield "".join(buf)
+                    buf, size = [], 0
+                    continue
+                cut = room
+            buf.append(open_ + body[:cut] + close)
+            body = body[cut:]
+            chunk = "".join(buf)
+            if chunk.strip():
+                yield chunk
+            buf, size = [], 0
+    if buf:
+        chunk = "".join(buf)
+        if chunk.strip():
+            yield chunk
+
+
+def split_html(text: str, limit: int = TG_LIMIT) -> List[str]:
+    return list(iter_html_chunks(text, limit))
@@ -0,0 +1,191 @@
+# app/utils/tracing.py
+"""
+Спаны и id корреляции.
+
+Каждый апдейт Telegram получает cid (TracingMiddleware), он лежит в contextvar
+и виден во всех логах и вложенных спанах — в том числе в потоках
+asyncio.to_thread, которые копируют контекст. @trace понимает и корутины,
+и обычные функции. Если уровень DEBUG выключен или апдейт не попал в выборку,
+ни repr аргументов, ни строки лога не формируются.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import itertools
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+_cid: ContextVar[Optional[str]] = ContextVar("trace_cid", default=None)
+_sampled: ContextVar[bool] = ContextVar("trace_sampled", default=True)
+_span: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+_LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+_debug = True
+_sample_rate = 1.0
+_ids = itertools.count(1)
+
+# слушатели завершения спана: fn(span, ms, error) — для метрик
+listeners: List[Callable[["Span", float, Optional[BaseException]], None]] = []
+
+
+def configure(level: str = "DEBUG", sample: float = 1.0) -> None:
+    """level — минимальный уровень среди всех sink'ов; sample — доля апдейтов с DEBUG-спанами."""
+    global _debug, _sample_rate
+    _debug = _LEVELS.get(level.upper(), 10) <= _LEVELS["DEBUG"]
+    _sample_rate = max(0.0, min(1.0, sample))
+
+
+def current_cid() -> Optional[str]:
+    return _cid.get()
+
+
+def patch_record(record: Dict[str, Any]) -> None:
+    """patcher для loguru: cid текущего апдейта в extra."""
+    record["extra"].setdefault("cid", _cid.get() or "-")
+
+
+def new_correlation(cid: Optional[str] = None) -> str:
+    cid = cid or f"c{next(_ids)}"
+    _cid.set(cid)
+    _sampled.set(_sample_rate >= 1.0 or random.random() < _sample_rate)
+    return cid
+
+
+def _short(x: Any, maxlen: int = 240) -> str:
+    s = repr(x)
+    return s if len(s) <= maxlen else s[:maxlen] + "…"
+
+
+class Span:
+    __slots__ = ("name", "feature", "parent", "start", "path")
+
+    def __init__(self, name: str, feature: str):
+        self.name = name
+        self.feature = feature
+        self.parent = _span.get()
+        self.path = f"{self.parent.path}>{name}" if self.parent else name
+        self.start = 0.0
+
+    def _enter(self):
+        self.start = time.perf_counter()
+        return _span.set(self)
+
+    def _exit(self, token, error: Optional[BaseException]) -> float:
+        ms = (time.perf_counter() - self.start) * 1000
+        _span.reset(token)
+        for fn in listeners:
+            try:
+                fn(self, ms, error)
+            except Exception:
+                pass
+        if error is not None and not isinstance(error, (asyncio.CancelledError, GeneratorExit, KeyboardInterrupt)):
+            # трейсбек пишет только самый внутренний спан, внешние — одну строку
+            if getattr(error, "__traced__", False):
+                logger.bind(feature="errors").error(f"{self.path}: FAIL in {ms:.1f} ms")
+            else:
+                logger.bind(feature="errors").opt(exception=error).error(
+                    f"{self.path}: FAIL in {ms:.1f} ms err={error!r}")
+                try:
+                    error.__traced__ = True
+                except Exception:
+                    pass
+        elif _debug and _sampled.get():
+            logger.bind(feature=self.feature).debug(f"{self.path}: OK in {ms:.1f} ms")
+        return ms
+
+
+class span:
+    """with span("http host"): / async with span(...): — вложенный спан без декоратора."""
+
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, name: str, *, feature: str = "core"):
+        self._span = Span(name, feature)
+
+    def __enter__(self) -> Span:
+        self._token = self._span._enter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._span._exit(self._token, exc)
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+
+def trace(name: Optional[str] = None, *, feature: str = "core", log_args: bool = True):
+    def deco(fn: Callable):
+        tag = name or fn.__name__
+
+        def _enter_log(args, kwargs) -> None:
+            if _debug and _sampled.get() and log_args:
+                logger.bind(feature=feature).debug(f"{tag}: ENTER args={_short(args)} kwargs={_short(kwargs)}")
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrap(*args, **kwargs):
+                sp = Span(tag, feature)
+                token = sp._enter()
+                _enter_log(args, kwargs)
+                try:
+                    res = await fn(*args, **kwargs)
+                except BaseException as e:
+                    sp._exit(token, e)
+                    raise
+                sp._exit(token, None)
+                return res
+            return awrap
+
+        @functools.wraps(fn)
+        def wrap(*args, **kwargs):
+            sp = Span(tag, feature)
+            token = sp._enter()
+            _enter_log(args, kwargs)
+            try:
+                res = fn(*args, **kwargs)
+            except BaseException as e:
+                sp._exit(token, e)
+                raise
+            sp._exit(token, None)
+            return res
+        return wrap
+    return deco
+
+
+async def _trace_update(handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+    new_correlation(f"u{getattr(event, 'update_id', None) or next(_ids)}")
+    sp = Span("update", "tg")
+    token = sp._enter()
+    try:
+        res = await handler(event, data)
+    except BaseException as e:
+        sp._exit(token, e)
+        raise
+    sp._exit(token, None)
+    return res
+
+
+def __getattr__(name: str) -> Any:
+    # aiogram (~5 с импорта) нужен только боту; воркерам процессов, которые
+    # тянут tracing через breaker, хватает спанов без middleware
+    if name != "TracingMiddleware":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from aiogram import BaseMiddleware
+
+    class TracingMiddleware(BaseMiddleware):
+        """Внешний middleware на update: cid = id апдейта, корневой спан на всю обработку."""
+
+        async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+            return await _trace_update(handler, event, data)
+
+    globals()[name] = TracingMiddleware
+    return TracingMiddleware
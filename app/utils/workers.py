@@ -0,0 +1,254 @@
+# app/utils/workers.py
+from __future__ import annotations
+
+import asyncio
+import multiprocessing as mp
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger as _logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = _logger.bind(feature="core")
+
+
+class PoolBusy(RuntimeError):
+    """Очередь допуска переполнена — задачу не берём."""
+
+
+class TaskTimeout(TimeoutError):
+    """Задача не уложилась в таймаут, воркер убит."""
+
+
+class WorkerCrashed(RuntimeError):
+    """Воркер умер посреди задачи."""
+
+
+def _rss_kb() -> int:
+    if resource is None:
+        return 0
+    return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _worker_main(conn) -> None:
+    """Цикл воркера: получить (fn, args, kwargs), вернуть (статус, результат, rss)."""
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        fn, args, kwargs = task
+        try:
+            conn.send(("ok", fn(*args, **kwargs), _rss_kb()))
+        except Exception as e:
+            try:
+                conn.send(("err", e, _rss_kb()))
+            except Exception:
+                conn.send(("err", RuntimeError(repr(e)), _rss_kb()))
+
+
+class _Worker:
+    __slots__ = ("proc", "conn", "tasks", "rss_kb")
+
+    def __init__(self, proc, conn):
+        self.proc = proc
+        self.conn = conn
+        self.tasks = 0
+        self.rss_kb = 0
+
+
+class ProcessWorkerPool:
+    """
+    Пул процессов с жёстким таймаутом на задачу.
+
+    Зависший воркер убивается и заменяется новым, воркеры перезапускаются
+    после max_tasks задач или при росте памяти выше max_rss_mb. Если задач в
+    работе и в ожидании больше size + queue_size — сразу PoolBusy.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        *,
+        max_tasks: int = 100,
+        max_rss_mb: int = 512,
+        queue_size: int = 16,
+        name: str = "pool",
+        start_method: Optional[str] = None,
+    ):
+        self.size = max(1, int(size))
+        self.max_tasks = max(1, int(max_tasks))
+        self.max_rss_kb = int(max_rss_mb) * 1024
+        self.queue_size = max(0, int(queue_size))
+        self.name = name
+        self._ctx = mp.get_context(start_method or "spawn")
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[_Worker] = []
+        self._bg: set = set()
+        self._pending = 0
+        self._closed = False
+        self._counters: Dict[str, int] = {
+            "done": 0, "failed": 0, "timeouts": 0, "rejected": 0, "crashed": 0, "recycled": 0,
+        }
+
+    def _spawn(self) -> _Worker:
+        parent, child = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker_main, args=(child,), name=f"{self.name}-worker", daemon=True)
+        proc.start()
+        child.close()
+        w = _Worker(proc, parent)
+        logger.debug(f"[{self.name}] worker started pid={proc.pid}")
+        return w
+
+    @staticmethod
+    def _stop(w: _Worker, kill: bool) -> None:
+        try:
+            if kill:
+                w.proc.kill()
+            else:
+                w.conn.send(None)
+            w.proc.join(timeout=2)
+            if w.proc.is_alive():
+                w.proc.kill()
+                w.proc.join(timeout=1)
+        except Exception:
+            pass
+        finally:
+            w.conn.close()
+
+    def _retire(self, w: _Worker, *, kill: bool) -> None:
+        """Убрать воркер из пула и в фоне поднять замену на его место."""
+        idx = self._workers.index(w)
+        self._workers[idx] = None
+        task = asyncio.get_running_loop().create_task(self._replace(w, kill))
+        self._bg.add(task)
+        task.add_done_callback(self._bg.discard)
+
+    async def _replace(self, w: _Worker, kill: bool) -> None:
+        await asyncio.to_thread(self._stop, w, kill)
+        fresh = None
+        try:
+            if self._closed:
+                return
+            fresh = await asyncio.to_thread(self._spawn)
+            if self._closed:
+                await asyncio.to_thread(self._stop, fresh, False)
+                return
+            self._workers.append(fresh)
+            self._release(fresh)
+        except Exception as e:
+            logger.error(f"[{self.name}] respawn failed: {e!r}")
+        finally:
+            self._free_slot()
+            if fresh is None and not self._closed:
+                self._wake_waiter()
+
+    def _free_slot(self) -> None:
+        """Снять резерв слота; после close() список уже пуст."""
+        if None in self._workers:
+            self._workers.remove(None)
+
+    def _wake_waiter(self) -> None:
+        """Слот освободился без воркера — разбудить одного ждущего, пусть поднимет воркер сам."""
+        if self._idle is not None:
+            self._idle.put_nowait(None)
+
+    async def _acquire(self) -> _Worker:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        while True:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            if self._idle.empty() and len(self._workers) < self.size:
+                # резервируем слот до старта, чтобы параллельные вызовы не наспавнили лишнего
+                self._workers.append(None)
+                try:
+                    w = await asyncio.to_thread(self._spawn)
+                except BaseException:
+                    self._free_slot()
+                    self._wake_waiter()
+                    raise
+                self._free_slot()
+                self._workers.append(w)
+                return w
+            w = await self._idle.get()
+            if w is not None:
+                return w
+
+    def _release(self, w: _Worker) -> None:
+        self._idle.put_nowait(w)
+
+    async def submit(self, fn: Callable, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """Выполнить fn(*args, **kwargs) в воркере. fn должна быть функцией уровня модуля."""
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        if self._pending >= self.size + self.queue_size:
+            self._counters["rejected"] += 1
+            raise PoolBusy(f"{self.name}: {self._pending} tasks pending")
+
+        self._pending += 1
+        try:
+            w = await self._acquire()
+            try:
+                w.conn.send((fn, args, kwargs))
+                ready = await asyncio.to_thread(w.conn.poll, timeout)
+                if ready:
+                    status, payload, rss_kb = w.conn.recv()
+            except (EOFError, OSError, BrokenPipeError) as e:
+                self._counters["crashed"] += 1
+                logger.warning(f"[{self.name}] worker pid={w.proc.pid} crashed: {e!r}")
+                self._retire(w, kill=True)
+                raise WorkerCrashed(str(e)) from e
+            except asyncio.CancelledError:
+                # состояние воркера неизвестно — дешевле убить
+                self._retire(w, kill=True)
+                raise
+            if not ready:
+                self._counters["timeouts"] += 1
+                logger.warning(f"[{self.name}] timeout {timeout}s pid={w.proc.pid}, killing")
+                self._retire(w, kill=True)
+                raise TaskTimeout(f"{getattr(fn, '__name__', fn)} > {timeout}s")
+
+            w.tasks += 1
+            w.rss_kb = rss_kb
+            if w.tasks >= self.max_tasks or (self.max_rss_kb and rss_kb > self.max_rss_kb):
+                self._counters["recycled"] += 1
+                logger.info(f"[{self.name}] recycle pid={w.proc.pid} tasks={w.tasks} rss={rss_kb // 1024}MB")
+                self._retire(w, kill=False)
+            else:
+                self._release(w)
+
+            if status == "ok":
+                self._counters["done"] += 1
+                return payload
+            self._counters["failed"] += 1
+            raise payload
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "size": self.size,
+            "workers": len([w for w in self._workers if w is not None]),
+            "idle": self._idle.qsize() if self._idle else 0,
+            "pending": self._pending,
+            "queue_limit": self.size + self.queue_size,
+            **self._counters,
+        }
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._bg):
+            task.cancel()
+        workers = [w for w in self._workers if w is not None]
+        self._workers.clear()
+        for w in workers:
+            await asyncio.to_thread(self._stop, w, False)
+        logger.info(f"[{self.name}] closed, {len(workers)} workers stopped")
+
@@ -0,0 +1,33 @@
+# benchmarks/_common.py
+"""Общая обвязка бенчмарков: путь к проекту и простой таймер."""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# импорт модулей app логгер не настраивает — в замерах хватит предупреждений в stderr
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
+
+
+def bench(fn: Callable[[], object], *, min_time: float = 0.5, repeat: int = 3) -> float:
+    """Лучшее среднее время одного вызова fn, секунд."""
+    best = float("inf")
+    for _ in range(repeat):
+        n, t0 = 0, time.perf_counter()
+        while True:
+            fn()
+            n += 1
+            dt = time.perf_counter() - t0
+            if dt >= min_time:
+                break
+        best = min(best, dt / n)
+    return best
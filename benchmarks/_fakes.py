@@ -0,0 +1,295 @@
+# benchmarks/_fakes.py
+"""
+Локальные подставные сервисы для нагрузочного стенда (benchmarks.load_harness).
+
+FakeTelegram — Bot API: getUpdates (long polling из очереди апдейтов стенда),
+sendMessage / sendPhoto / sendMediaGroup / editMessageText и прочее; каждый
+ответ бота попадает в очередь чата, откуда его читает виртуальный пользователь.
+Upstreams — OpenWeather, сайт новостей, open-notify / wheretheiss, геокодер
+open-meteo, CelesTrak и OpenAI-совместимый /v1/chat/completions вместо g4f.
+
+У каждого маршрута своё поведение Behaviour: задержка, разброс и доля отказов.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# TLE из документации sgp4 (как в bench_passes)
+TLE = ("ISS (ZARYA)\n"
+       "1 25544U 98067A   19343.69339541  .00001764  00000-0  38792-4 0  9991\n"
+       "2 25544  51.6439 211.2001 0007417  17.6667  85.6398 15.50103472202482\n")
+
+
+@dataclass
+class Behaviour:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+    async def apply(self, name: str, stats: Counter) -> bool:
+        """Выдержать задержку; True — этот запрос надо провалить."""
+        stats[f"{name}.requests"] += 1
+        delay = self.latency_ms + (random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            stats[f"{name}.injected_errors"] += 1
+            return True
+        return False
+
+
+def parse_behaviours(latency: List[str], jitter: List[str], fail: List[str]) -> Dict[str, Behaviour]:
+    """["weather=200", "*=20"] -> {"weather": Behaviour(latency_ms=200), "*": ...}."""
+    out: Dict[str, Behaviour] = {}
+    for items, attr in ((latency, "latency_ms"), (jitter, "jitter_ms"), (fail, "error_rate")):
+        for item in items:
+            name, _, value = item.partition("=")
+            setattr(out.setdefault(name.strip(), Behaviour()), attr, float(value))
+    return out
+
+
+class _Service:
+    def __init__(self, behaviours: Dict[str, Behaviour]):
+        self.behaviours = behaviours
+        self.stats: Counter = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    def behaviour(self, name: str) -> Behaviour:
+        return self.behaviours.get(name) or self.behaviours.get("*") or Behaviour()
+
+    def app(self) -> web.Application:
+        raise NotImplementedError
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+
+class FakeTelegram(_Service):
+    """Bot API: апдейты кладёт стенд (push_*), ответы бота — в replies[chat_id]."""
+
+    # методы с поведением "telegram"; прочие (getMe, deleteWebhook...) отвечают сразу
+    SEND_METHODS = {"sendMessage", "sendPhoto", "sendMediaGroup", "sendVideo", "sendDocument",
+                    "editMessageText", "answerCallbackQuery"}
+
+    def __init__(self, behaviours: Dict[str, Behaviour]):
+        super().__init__(behaviours)
+        self._updates: Deque[dict] = deque()
+        self._update_id = 0
+        self._message_id = 0
+        self._new_update = asyncio.Event()
+        self.replies: Dict[int, asyncio.Queue] = {}
+        self.polling = asyncio.Event()  # бот впервые спросил getUpdates
+
+    def _next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    def _user(self, chat_id: int) -> dict:
+        return {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}", "username": f"user{chat_id}"}
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        return {"message_id": self._next_message_id(), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, **fields}
+
+    def _push(self, kind: str, payload: dict) -> None:
+        self._update_id += 1
+        self._updates.append({"update_id": self._update_id, kind: payload})
+        self._new_update.set()
+
+    def push_text(self, chat_id: int, text: str) -> None:
+        self._push("message", self._message(chat_id, text=text, **{"from": self._user(chat_id)}))
+
+    def push_location(self, chat_id: int, lat: float, lon: float) -> None:
+        self._push("message", self._message(chat_id, location={"latitude": lat, "longitude": lon},
+                                            **{"from": self._user(chat_id)}))
+
+    def push_callback(self, chat_id: int, data: str) -> None:
+        self._push("callback_query", {
+            "id": str(self._next_message_id()), "from": self._user(chat_id), "chat_instance": str(chat_id),
+            "data": data, "message": self._message(chat_id, text="…", **{"from": self._user(chat_id)}),
+        })
+
+    def inbox(self, chat_id: int) -> asyncio.Queue:
+        q = self.replies.get(chat_id)
+        if q is None:
+            q = self.replies[chat_id] = asyncio.Queue()
+        return q
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, params: dict) -> web.Response:
+        self.polling.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._ok(list(self._updates)[:limit])
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = {k: v for k, v in (await request.post()).items() if isinstance(v, str)}
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return self._ok({"id": 1, "is_bot": True, "first_name": "InfoBot", "username": "infobot_test"})
+        if method not in self.SEND_METHODS:
+            return self._ok(True)
+
+        if await self.behaviour("telegram").apply("telegram", self.stats):
+            return web.json_response({"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                                      "parameters": {"retry_after": 1}}, status=429)
+        self.stats[f"telegram.{method}"] += 1
+        if method == "answerCallbackQuery":
+            return self._ok(True)
+        chat_id = int(params.get("chat_id") or 0)
+        text = params.get("text") or params.get("caption") or ""
+        self.inbox(chat_id).put_nowait((time.perf_counter(), method, text))
+        if method == "sendMediaGroup":
+            media = json.loads(params.get("media") or "[]")
+            return self._ok([self._message(chat_id, photo=[]) for _ in media])
+        if method == "editMessageText":
+            return self._ok(self._message(chat_id, text=text))
+        if method in ("sendPhoto",):
+            return self._ok(self._message(chat_id, photo=[{"file_id": "p", "file_unique_id": "p", "width": 1,
+                                                           "height": 1}], caption=text or None))
+        return self._ok(self._message(chat_id, text=text or "-"))
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+
+class Upstreams(_Service):
+    """Внешние API на одном порту; пути повторяют настоящие (см. _load_bot.point_to)."""
+
+    def __init__(self, behaviours: Dict[str, Behaviour]):
+        super().__init__(behaviours)
+        self.front = (FIXTURES / "news_front.html").read_text(encoding="utf-8")
+        # видео из статьи скачивал бы yt_dlp с настоящих площадок — в стенде только текст и фото
+        article = (FIXTURES / "news_article.html").read_text(encoding="utf-8")
+        article = re.sub(r"<iframe.*?</iframe>|<video.*?</video>", "", article, flags=re.S)
+        self.article = re.sub(r'<(div|blockquote) class="(video-block|twitter-tweet|embed-responsive)".*?</\1>', "",
+                              article, flags=re.S)
+        self.weather = json.loads((FIXTURES / "owm_weather.json").read_text(encoding="utf-8"))
+        self.answers = list(json.loads((FIXTURES / "ii_answers.json").read_text(encoding="utf-8")).values())
+
+    async def _fail(self, name: str) -> Optional[web.Response]:
+        if await self.behaviour(name).apply(name, self.stats):
+            return web.json_response({"message": "injected failure"}, status=503)
+        return None
+
+    async def weather_api(self, request: web.Request) -> web.Response:
+        if (r := await self._fail("weather")):
+            return r
+        q = request.query.get("q") or request.query.get("id") or "city"
+        data = dict(random.choice(self.weather), name=q)
+        return web.json_response(data)
+
+    async def news_front(self, request: web.Request) -> web.Response:
+        return await self._fail("news") or web.Response(text=self.front, content_type="text/html")
+
+    async def news_article(self, request: web.Request) -> web.Response:
+        return await self._fail("news") or web.Response(text=self.article, content_type="text/html")
+
+    @staticmethod
+    def _iss_position() -> Tuple[float, float]:
+        t = time.time()
+        return 51.6 * math.sin(t / 5556 * 2 * math.pi), (t / 5556 * 360 - 180) % 360 - 180
+
+    async def open_notify(self, request: web.Request) -> web.Response:
+        if (r := await self._fail("iss")):
+            return r
+        lat, lon = self._iss_position()
+        return web.json_response({"message": "success", "timestamp": int(time.time()),
+                                  "iss_position": {"latitude": f"{lat:.4f}", "longitude": f"{lon:.4f}"}})
+
+    async def wheretheiss(self, request: web.Request) -> web.Response:
+        if (r := await self._fail("iss")):
+            return r
+        lat, lon = self._iss_position()
+        return web.json_response({"latitude": lat, "longitude": lon, "altitude": 418.2, "velocity": 27580.0,
+                                  "visibility": "daylight", "timestamp": int(time.time())})
+
+    async def geocode(self, request: web.Request) -> web.Response:
+        if (r := await self._fail("geocode")):
+            return r
+        name = request.query.get("name", "")
+        rnd = random.Random(name)
+        return web.json_response({"results": [{
+            "name": name, "latitude": rnd.uniform(40, 60), "longitude": rnd.uniform(20, 60),
+            "country": "Россия", "admin1": "Область", "timezone": "Europe/Moscow"}]})
+
+    async def reverse(self, request: web.Request) -> web.Response:
+        if (r := await self._fail("geocode")):
+            return r
+        return web.json_response({"results": [{"name": "Где-то", "country": "Россия", "timezone": "Europe/Moscow"}]})
+
+    async def tle(self, request: web.Request) -> web.Response:
+        return await self._fail("tle") or web.Response(text=TLE)
+
+    async def ii_models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+
+    async def ii_complete(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if (r := await self._fail("ii")):
+            return r
+        content = random.choice(self.answers)
+        return web.json_response({
+            "id": "chatcmpl-load", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": len(content) // 4,
+                      "total_tokens": 50 + len(content) // 4},
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        r = app.router
+        r.add_get("/owm/data/2.5/weather", self.weather_api)
+        r.add_get("/news/", self.news_front)
+        r.add_get("/news/{path:.+}", self.news_article)
+        r.add_get("/open-notify/iss-now.json", self.open_notify)
+        r.add_get("/wheretheiss/v1/satellites/25544", self.wheretheiss)
+        r.add_get("/geo/v1/search", self.geocode)
+        r.add_get("/geo/v1/reverse", self.reverse)
+        r.add_get("/celestrak/tle", self.tle)
+        r.add_get("/ii/v1/models", self.ii_models)
+        r.add_post("/ii/v1/chat/completions", self.ii_complete)
+        return app
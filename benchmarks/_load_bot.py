@@ -0,0 +1,44 @@
+# benchmarks/_load_bot.py
+"""
+Процесс бота под нагрузкой: настоящий BotCore, у которого внешние адреса
+перенаправлены на подставные сервисы стенда (LOADTEST_UPSTREAM). Telegram,
+g4f и сайт новостей настраиваются переменными окружения, которые выставляет
+benchmarks.load_harness; здесь — только адреса, зашитые в код константами.
+
+    python -m benchmarks._load_bot
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import os
+
+import benchmarks._common  # noqa: F401
+
+
+def point_to(upstream: str) -> None:
+    from app.handlers.SpaceHandler import SpaceHandler
+
+    importlib.import_module("app.handlers.WeatherHandler").OWM_URL = f"{upstream}/owm/data/2.5/weather"
+    SpaceHandler.GEO = f"{upstream}/geo/v1/search"
+    SpaceHandler.REV = f"{upstream}/geo/v1/reverse"
+    SpaceHandler.TLE.url = f"{upstream}/celestrak/tle"
+    SpaceHandler.FEED.sources = [
+        ("wheretheiss", SpaceHandler._http_source(f"{upstream}/wheretheiss/v1/satellites/25544",
+                                                  SpaceHandler._parse_wheretheiss_position)),
+        ("open-notify", SpaceHandler._http_source(f"{upstream}/open-notify/iss-now.json",
+                                                  SpaceHandler._parse_open_notify_position)),
+        ("tle", SpaceHandler._tle_source),
+    ]
+
+
+def main() -> None:
+    from app.main import BotCore, setup
+
+    setup()
+    point_to(os.environ["LOADTEST_UPSTREAM"])
+    asyncio.run(BotCore().run())
+
+
+if __name__ == "__main__":
+    main()
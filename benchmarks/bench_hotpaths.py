@@ -0,0 +1,132 @@
+# benchmarks/bench_hotpaths.py
+"""
+Горячие пути парсинга и форматирования на сохранённых данных (benchmarks/fixtures),
+без сети. Для каждого случая — вызовов в секунду и пик памяти одного вызова
+(tracemalloc); результат сравнивается с benchmarks/baseline.json.
+
+    python -m benchmarks.bench_hotpaths            # сравнить с базой, код 1 при регрессии
+    python -m benchmarks.bench_hotpaths --save     # записать текущие цифры как базу
+    python -m benchmarks.bench_hotpaths -k news    # только случаи с подстрокой в имени
+
+Регрессия — ops/s ниже базы больше чем на --tolerance (по умолчанию 25%)
+или пик памяти выше базы больше чем на столько же. База зависит от машины:
+перед сравнением веток пересохраните её на своей.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks._common import bench
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# без settings.load() настройки (стоп-слова Cleaner, half_url) берутся из окружения
+os.environ.setdefault("bad_words", "редиска0,редиска1,редиска2")
+os.environ.setdefault("half_url", "https://news.example.ru")
+
+from app.handlers.NewsHandler import ArticleVideoExtractor, NewsHandler  # noqa: E402
+from app.handlers.SpaceHandler import SpaceHandler  # noqa: E402
+from app.handlers.WeatherHandler import WeatherHandler  # noqa: E402
+from app.utils.helpers import Cleaner  # noqa: E402
+from app.utils.tghtml import format_for_html  # noqa: E402
+
+
+def _read(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def cases() -> List[Tuple[str, Callable[[], object]]]:
+    front = _read("news_front.html")
+    article = _read("news_article.html")
+    answers = json.loads(_read("ii_answers.json"))
+    owm = json.loads(_read("owm_weather.json"))
+    page = _read("clean_text.txt")
+    news, cleaner = NewsHandler(), Cleaner()
+
+    # проверка фикстур: пустой результат означал бы, что меряем ветку «не найдено»
+    assert len(news.parse_news(front)) == 60
+    deep = news.parse_article(article)
+    assert deep and deep["title"] and deep["media"]
+    assert "редиска" not in cleaner.clean_words(page)
+
+    observers = [(55.75, 37.62, 51.2, 20.1), (-33.9, 151.2, -40.0, 160.3), (64.1, -21.9, 10.0, -170.0)]
+    return [
+        ("news.parse_news", lambda: news.parse_news(front)),
+        ("news.parse_article", lambda: news.parse_article(article)),
+        ("news.extract_videos", lambda: ArticleVideoExtractor(article).extract_videos()),
+        ("cleaner.clean_words", lambda: cleaner.clean_words(page)),
+        ("tghtml.format_short", lambda: format_for_html(answers["short"])),
+        ("tghtml.format_medium", lambda: format_for_html(answers["medium"])),
+        ("tghtml.format_long", lambda: format_for_html(answers["long"])),
+        ("weather.format", lambda: [WeatherHandler.format_weather(d, d["name"]) for d in owm]),
+        ("space.distance_to_iss", lambda: [SpaceHandler.calculate_distance_to_iss(*o) for o in observers]),
+    ]
+
+
+def peak_kb(fn: Callable[[], object]) -> float:
+    fn()  # прогрев: ленивые импорты и кэши регулярок не считаем
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run(selected: List[Tuple[str, Callable[[], object]]], min_time: float) -> Dict[str, Dict[str, float]]:
+    out = {}
+    for name, fn in selected:
+        t = bench(fn, min_time=min_time, repeat=5)
+        out[name] = {"ops": round(1 / t, 1), "peak_kb": round(peak_kb(fn), 1)}
+    return out
+
+
+def compare(current: Dict[str, Dict[str, float]], base: Dict[str, Dict[str, float]], tolerance: float) -> int:
+    print(f"{'case':<24} {'ops/s':>11} {'base':>11} {'Δ':>7} {'peak KB':>9} {'base':>9}  ")
+    regressions = 0
+    for name, cur in current.items():
+        b = base.get(name)
+        if not b:
+            print(f"{name:<24} {cur['ops']:>11,.1f} {'—':>11} {'':>7} {cur['peak_kb']:>9,.1f} {'—':>9}  new")
+            continue
+        delta = cur["ops"] / b["ops"] - 1
+        slow = delta < -tolerance
+        fat = cur["peak_kb"] > b["peak_kb"] * (1 + tolerance) + 4
+        flag = " ".join(x for x, on in (("SLOWER", slow), ("MORE MEMORY", fat)) if on)
+        regressions += bool(flag)
+        print(f"{name:<24} {cur['ops']:>11,.1f} {b['ops']:>11,.1f} {delta:>+7.0%} "
+              f"{cur['peak_kb']:>9,.1f} {b['peak_kb']:>9,.1f}  {flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--save", action="store_true", help="записать результат как базу")
+    ap.add_argument("-k", default="", help="фильтр по подстроке имени")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--min-time", type=float, default=0.2, help="секунд на каждый из 5 замеров")
+    args = ap.parse_args(argv)
+
+    selected = [c for c in cases() if args.k in c[0]]
+    current = run(selected, args.min_time)
+    base = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+
+    if args.save:
+        base.update(current)
+        BASELINE.write_text(json.dumps(base, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved: {BASELINE}")
+    regressions = compare(current, {} if args.save else base, args.tolerance)
+    if regressions:
+        print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# benchmarks/bench_passes.py
+"""
+Пролёты МКС для множества наблюдателей: скалярный OrbitEngine.passes в цикле
+против векторного orbit_batch.batch_passes. Печатает наблюдателей в секунду
+и расхождение результатов.
+
+    python -m benchmarks.bench_passes
+"""
+from __future__ import annotations
+
+import time
+
+import numpy as np
+
+import benchmarks._common  # noqa: F401
+from app.utils.orbit import OrbitEngine
+from app.utils.orbit_batch import batch_passes
+
+# TLE из документации sgp4, чтобы прогон не зависел от сети
+LINE1 = "1 25544U 98067A   19343.69339541  .00001764  00000-0  38792-4 0  9991"
+LINE2 = "2 25544  51.6439 211.2001 0007417  17.6667  85.6398 15.50103472202482"
+HOURS = 24.0
+
+
+def main() -> None:
+    engine = OrbitEngine(LINE1, LINE2)
+    start = engine.epoch
+    rnd = np.random.default_rng(0)
+
+    n_scalar = 50
+    lats, lons = rnd.uniform(-65, 65, n_scalar), rnd.uniform(-180, 180, n_scalar)
+    t0 = time.perf_counter()
+    scalar = [engine.passes(a, b, start, n=3, hours=HOURS) for a, b in zip(lats, lons)]
+    scalar_rate = n_scalar / (time.perf_counter() - t0)
+    batch = batch_passes(engine, lats, lons, start, n=3, hours=HOURS)
+
+    dt_max = el_max = 0.0
+    mismatched = 0
+    for s, b in zip(scalar, batch):
+        if len(s) != len(b):
+            mismatched += 1
+            continue
+        for p, q in zip(s, b):
+            dt_max = max(dt_max, abs((p.rise - q.rise).total_seconds()), abs((p.set - q.set).total_seconds()))
+            el_max = max(el_max, abs(p.max_elevation - q.max_elevation))
+    print(f"scalar: {scalar_rate:,.0f} observers/s")
+    print(f"agreement on {n_scalar}: max |dt|={dt_max:.1f}s max |del|={el_max:.2f}deg mismatched={mismatched}")
+
+    for n in (1_000, 10_000, 50_000):
+        lats, lons = rnd.uniform(-65, 65, n), rnd.uniform(-180, 180, n)
+        t0 = time.perf_counter()
+        res = batch_passes(engine, lats, lons, start, n=3, hours=HOURS)
+        dt = time.perf_counter() - t0
+        total = sum(len(r) for r in res)
+        print(f"batch {n:>6}: {n / dt:>9,.0f} observers/s  ({dt:.2f}s, {total} passes)")
+
+
+if __name__ == "__main__":
+    main()
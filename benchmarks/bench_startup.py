@@ -0,0 +1,112 @@
+# benchmarks/bench_startup.py
+"""
+Холодный старт бота: время импорта app.main и время до первого обслуженного апдейта.
+
+1. import — `import app.main` в чистом интерпретаторе (лучшее из --repeat).
+   Заодно проверяется, что тяжёлые зависимости (g4f, yt_dlp, bs4) при импорте
+   не подгружаются — иначе код 1.
+2. first update — настоящий бот на стенде benchmarks.load_harness: от запуска
+   процесса до первого getUpdates, затем первые ответы на погоду, новости и ИИ.
+   Первые новости и первый ответ ИИ показывают, успел ли фоновый прогрев
+   (BotCore._warm_up) подгрузить парсер и воркер g4f.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --settle 0   # ИИ сразу после старта, без паузы
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks._common import ROOT
+from benchmarks._fakes import FakeTelegram, Upstreams
+from benchmarks.load_harness import Stats, User, scenario, start_bot, stop_bot
+
+HEAVY = ("g4f", "yt_dlp", "bs4")
+
+_IMPORT_PROBE = (
+    "import sys, time, json; t = time.perf_counter(); import app.main; "
+    "print(json.dumps({'seconds': time.perf_counter() - t, "
+    f"'heavy': [m for m in {HEAVY!r} if m in sys.modules]}}))"
+)
+
+
+def measure_import(repeat: int) -> Dict[str, object]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    runs: List[dict] = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"best_s": round(min(r["seconds"] for r in runs), 3),
+            "worst_s": round(max(r["seconds"] for r in runs), 3),
+            "heavy": sorted({m for r in runs for m in r["heavy"]})}
+
+
+async def measure_first_update(settle: float) -> Dict[str, object]:
+    tg, up = FakeTelegram({}), Upstreams({})
+    tg_url, up_url = await tg.start(), await up.start()
+    out: Dict[str, object] = {}
+    with tempfile.TemporaryDirectory(prefix="infobot-startup-") as workdir:
+        started = time.perf_counter()
+        proc = await start_bot(tg_url, up_url, workdir, ii_workers=1)
+        try:
+            ready = asyncio.ensure_future(tg.polling.wait())
+            exited = asyncio.ensure_future(proc.wait())
+            await asyncio.wait({ready, exited}, timeout=120, return_when=asyncio.FIRST_COMPLETED)
+            if not ready.done():
+                ready.cancel()
+                raise RuntimeError(f"bot did not start polling (exit code {proc.returncode})")
+            exited.cancel()
+            out["first_getUpdates_s"] = round(time.perf_counter() - started, 2)
+
+            stats = Stats()
+            user = User(1, tg, stats, random.Random(1), step_timeout=120.0)
+            await user.run_scenario(scenario("weather", random.Random(1)))
+            out["first_reply_s"] = round(time.perf_counter() - started, 2)
+            await asyncio.sleep(settle)
+            await user.run_scenario(scenario("news", random.Random(1))[:1])
+            await user.run_scenario(scenario("ii", random.Random(1)))
+            for step, row in stats.report(1.0).items():
+                out[f"{step}_ms"] = row["p50_ms"] if row["ok"] else "timeout"
+        finally:
+            await stop_bot(proc)
+            await tg.stop()
+            await up.stop()
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--repeat", type=int, default=3, help="сколько раз мерить импорт")
+    ap.add_argument("--settle", type=float, default=2.0,
+                    help="пауза после первого ответа перед новостями и ИИ, сек")
+    ap.add_argument("--skip-bot", action="store_true", help="только импорт")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    res: Dict[str, object] = {"import": measure_import(args.repeat)}
+    if not args.skip_bot:
+        res["first_update"] = asyncio.run(measure_first_update(args.settle))
+
+    if args.json:
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+    else:
+        imp = res["import"]
+        print(f"import app.main: best {imp['best_s']:.3f}s, worst {imp['worst_s']:.3f}s")
+        print(f"heavy modules at import: {', '.join(imp['heavy']) or 'none'}")
+        for k, v in res.get("first_update", {}).items():
+            print(f"{k:<24} {v}")
+    return 1 if res["import"]["heavy"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
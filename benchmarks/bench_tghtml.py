@@ -0,0 +1,62 @@
+# benchmarks/bench_tghtml.py
+"""
+Форматирование ответов ИИ в Telegram HTML: прежний двухпроходный вариант
+с плейсхолдерами против однопроходного app.utils.tghtml.
+
+    python -m benchmarks.bench_tghtml
+"""
+from __future__ import annotations
+
+import html
+import random
+import re
+
+from benchmarks._common import bench
+from app.utils.tghtml import format_for_html, split_html
+
+_BLOCK_RE = re.compile(r"```([a-zA-Z0-9_+\-]*)\s*\n(.*?)```", re.DOTALL)
+_INLINE_RE = re.compile(r"`([^`\n]+)`")
+
+
+def legacy_format(text: str) -> str:
+    """Старый _format_for_html из IIHandler (синхронная версия)."""
+    placeholders = []
+
+    def _put(fragment: str) -> str:
+        placeholders.append(fragment)
+        return f"@@BLOCK{len(placeholders) - 1}@@"
+
+    s = _BLOCK_RE.sub(lambda m: _put(f"<pre><code>{html.escape(m.group(2) or '')}</code></pre>"), text)
+    s = _INLINE_RE.sub(lambda m: _put(f"<code>{html.escape(m.group(1) or '')}</code>"), s)
+    s = html.escape(s)
+    for i, frag in enumerate(placeholders):
+        s = s.replace(f"@@BLOCK{i}@@", frag)
+    return s
+
+
+def make_answer(blocks: int, seed: int = 42) -> str:
+    rnd = random.Random(seed)
+    parts = []
+    for i in range(blocks):
+        parts.append(f"Шаг {i}: вызовите `func_{i}(x)` и проверьте, что a < b && c > d.\n")
+        code = "".join(f"    value_{j} = compute({j}) if x < {j} else None\n" for j in range(rnd.randint(3, 30)))
+        parts.append(f"```python\ndef step_{i}(x):\n{code}```\n")
+    return "".join(parts)
+
+
+def main() -> None:
+    print(f"{'blocks':>7} {'size KB':>8} {'legacy ms':>10} {'single ms':>10} {'split ms':>9} {'chunks':>7}")
+    for blocks in (10, 100, 500, 1000):
+        text = make_answer(blocks)
+        assert legacy_format(text) == format_for_html(text)
+        t_old = bench(lambda: legacy_format(text), min_time=0.3)
+        t_new = bench(lambda: format_for_html(text), min_time=0.3)
+        t_split = bench(lambda: split_html(text), min_time=0.3)
+        chunks = split_html(text)
+        assert all(len(c) <= 4096 for c in chunks)
+        print(f"{blocks:>7} {len(text) / 1024:>8.1f} {t_old * 1000:>10.2f} {t_new * 1000:>10.2f} "
+              f"{t_split * 1000:>9.2f} {len(chunks):>7}")
+
+
+if __name__ == "__main__":
+    main()
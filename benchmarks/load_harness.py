@@ -0,0 +1,266 @@
+# benchmarks/load_harness.py
+"""
+Сквозная нагрузка на бота без Telegram и внешних API.
+
+Стенд поднимает подставной Bot API и внешние сервисы (benchmarks._fakes),
+запускает настоящий BotCore отдельным процессом (benchmarks._load_bot) и
+гоняет через него виртуальных пользователей: каждый по кругу проходит
+сценарии (погода, космос по городу и по локации, новости со статьёй, ИИ)
+с паузами «на подумать». Задержка шага — от отправки апдейта до ответа бота,
+который этот шаг ожидает. В конце — пропускная способность и p50/p95/p99
+по каждому шагу.
+
+    python -m benchmarks.load_harness --users 2000 --duration 60
+    python -m benchmarks.load_harness --users 500 --latency weather=300 --fail weather=0.1 --latency telegram=30
+    python -m benchmarks.load_harness --scenarios ii --users 50 --latency ii=2000 --jitter ii=1500
+
+Имена для --latency/--jitter/--fail: telegram, weather, news, iss, geocode, tle, ii и * (все остальные).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks._common import ROOT
+from benchmarks._fakes import FakeTelegram, Upstreams, parse_behaviours
+
+CITIES = ("Москва", "Казань", "Новосибирск", "Сочи", "Минск", "Екатеринбург", "Самара", "Пермь")
+QUESTIONS = ("Как отсортировать словарь по значению в Python?", "Объясни, что такое asyncio.gather",
+             "Напиши SQL для топ-10 покупателей", "Чем отличается процесс от потока?")
+
+# шаг: (действие, что отправить, регэксп ожидаемого ответа, имя шага для отчёта или None)
+Step = Tuple[str, object, str, Optional[str]]
+SPACE_DONE = r"Ближайшие пролёты|недоступен|Не нашёл|не ответил|Неверные"
+
+
+def scenario(name: str, rnd: random.Random) -> List[Step]:
+    city = rnd.choice(CITIES)
+    if name == "weather":
+        return [("text", "Погода", r"Введите город", "weather.menu"),
+                ("text", city, r"Погода в|Ошибка|не найден|недоступен", "weather.query")]
+    if name == "space_city":
+        return [("text", "Космос", r"Пришлите город", "space.menu"),
+                ("text", city, SPACE_DONE, "space.city")]
+    if name == "space_geo":
+        return [("location", (rnd.uniform(-60, 60), rnd.uniform(-180, 180)), SPACE_DONE, "space.location")]
+    if name == "news":
+        return [("text", "Новости", r"Хотите ещё новостей|больше нет|Не удалось", "news.list"),
+                ("text", "Далее", r"Хотите ещё новостей|больше нет", "news.next"),
+                ("callback", f"n{rnd.randint(11, 20)}", r"^(?!Открываю)(?!Статья недоступна)", "news.article"),
+                ("text", "Назад", r"Возвращаемся|Сначала выберите", None)]
+    if name == "ii":
+        return [("text", "ИИ помощник", r"Начните диалог", "ii.menu"),
+                ("text", rnd.choice(QUESTIONS), r"Продолжайте|перегружен|лимит|не ответили", "ii.answer"),
+                ("text", "Назад", r"Возвращаемся", None)]
+    raise ValueError(name)
+
+
+class Stats:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts: Dict[str, int] = defaultdict(int)
+        self.scenarios = 0
+
+    @staticmethod
+    def pct(values: List[float], q: float) -> float:
+        if not values:
+            return float("nan")
+        s = sorted(values)
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+    def report(self, elapsed: float) -> dict:
+        rows = {}
+        for step in sorted(set(self.latency) | set(self.timeouts)):
+            lat = self.latency[step]
+            rows[step] = {
+                "ok": len(lat), "timeouts": self.timeouts[step], "per_sec": round(len(lat) / elapsed, 2),
+                **{f"p{int(q * 100)}_ms": round(self.pct(lat, q) * 1000, 1) for q in (0.5, 0.95, 0.99)},
+                "max_ms": round(max(lat) * 1000, 1) if lat else None,
+            }
+        return rows
+
+
+class User:
+    def __init__(self, chat_id: int, tg: FakeTelegram, stats: Stats, rnd: random.Random, step_timeout: float):
+        self.chat_id = chat_id
+        self.tg = tg
+        self.stats = stats
+        self.rnd = rnd
+        self.step_timeout = step_timeout
+        self.inbox = tg.inbox(chat_id)
+
+    async def _expect(self, pattern: str, sent_at: float) -> Optional[float]:
+        rx = re.compile(pattern)
+        deadline = sent_at + self.step_timeout
+        while True:
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                return None
+            try:
+                at, _method, text = await asyncio.wait_for(self.inbox.get(), left)
+            except asyncio.TimeoutError:
+                return None
+            if at >= sent_at and rx.search(text or ""):
+                return at - sent_at
+
+    async def run_scenario(self, steps: List[Step]) -> None:
+        while not self.inbox.empty():  # хвосты прошлого сценария (фото статьи и т.п.)
+            self.inbox.get_nowait()
+        for kind, payload, pattern, label in steps:
+            sent_at = time.perf_counter()
+            if kind == "text":
+                self.tg.push_text(self.chat_id, payload)
+            elif kind == "location":
+                self.tg.push_location(self.chat_id, *payload)
+            else:
+                self.tg.push_callback(self.chat_id, payload)
+            took = await self._expect(pattern, sent_at)
+            if label:
+                if took is None:
+                    self.stats.timeouts[label] += 1
+                else:
+                    self.stats.latency[label].append(took)
+            if took is None:
+                return  # состояние диалога неизвестно — начинаем следующий сценарий с меню
+        self.stats.scenarios += 1
+
+    async def loop(self, names: List[str], weights: List[float], until: float, think: float) -> None:
+        while time.perf_counter() < until:
+            await self.run_scenario(scenario(self.rnd.choices(names, weights)[0], self.rnd))
+            await asyncio.sleep(self.rnd.expovariate(1 / think) if think > 0 else 0)
+
+
+async def start_bot(tg_url: str, up_url: str, workdir: str, ii_workers: int) -> asyncio.subprocess.Process:
+    env = dict(os.environ)
+    env.update({
+        "BOT_API1": "123456:loadtest",
+        "TELEGRAM_API_URL": tg_url,
+        "LOADTEST_UPSTREAM": up_url,
+        "II_BASE_URL": f"{up_url}/ii/v1",
+        "II_WORKERS": str(ii_workers),
+        "base_url": f"{up_url}/news/",
+        "half_url": up_url,
+        "weather_API": "loadtest",
+        "bad_words": "редиска",
+        "BOT_DB": os.path.join(workdir, "bot.db"),
+        "TLE_CACHE": os.path.join(workdir, "iss.tle"),
+        # g4f пишет учёт токенов в ./har_and_cookies — поэтому бот работает из workdir
+        "G4F_USAGE_DIR": os.path.join(workdir, "har_and_cookies", ".usage"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+        "GEONAMES_CITIES": os.path.join(workdir, "no-gazetteer.txt"),
+        "LOG_TO_FILES": "0",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "ERROR"),
+        "METRICS_PORT": "0",
+        "ISS_MAP": "0",
+    })
+    return await asyncio.create_subprocess_exec(sys.executable, "-m", "benchmarks._load_bot", cwd=workdir, env=env)
+
+
+async def stop_bot(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        proc.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(proc.wait(), 15)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+
+
+async def main_async(args) -> dict:
+    behaviours = parse_behaviours(args.latency, args.jitter, args.fail)
+    tg, up = FakeTelegram(behaviours), Upstreams(behaviours)
+    tg_url, up_url = await tg.start(), await up.start()
+    names = args.scenarios.split(",")
+    weights = [float(args.weights.get(n, 1.0)) for n in names]
+
+    with tempfile.TemporaryDirectory(prefix="infobot-load-") as workdir:
+        proc = await start_bot(tg_url, up_url, workdir, args.ii_workers)
+        try:
+            # бот готов, когда начал long polling
+            ready = asyncio.ensure_future(tg.polling.wait())
+            exited = asyncio.ensure_future(proc.wait())
+            await asyncio.wait({ready, exited}, timeout=60, return_when=asyncio.FIRST_COMPLETED)
+            if not ready.done():
+                ready.cancel()
+                raise RuntimeError(f"bot did not start polling (exit code {proc.returncode})")
+            exited.cancel()
+            if "ii" in names and args.warmup:
+                # первый запрос в каждый воркер g4f платит за его запуск — в замер не идёт
+                warm = Stats()
+                await asyncio.gather(*(User(90_000 + k, tg, warm, random.Random(k), 120.0)
+                                       .run_scenario(scenario("ii", random.Random(k)))
+                                       for k in range(args.ii_workers)))
+                print(f"warm-up: {warm.scenarios}/{args.ii_workers} AI workers answered")
+            stats = Stats()
+            started = time.perf_counter()
+            until = started + args.duration
+            rnd = random.Random(args.seed)
+            users = []
+            for i in range(args.users):
+                u = User(100_000 + i, tg, stats, random.Random(rnd.random()), args.step_timeout)
+                delay = args.ramp * i / max(1, args.users)
+                users.append(asyncio.ensure_future(_delayed(delay, u.loop(names, weights, until, args.think))))
+            await asyncio.gather(*users)
+            elapsed = time.perf_counter() - started
+        finally:
+            await stop_bot(proc)
+            await tg.stop()
+            await up.stop()
+
+    return {"users": args.users, "elapsed_s": round(elapsed, 1), "scenarios": stats.scenarios,
+            "steps": stats.report(elapsed), "upstreams": dict(up.stats), "telegram": dict(tg.stats)}
+
+
+async def _delayed(delay: float, coro):
+    await asyncio.sleep(delay)
+    return await coro
+
+
+def print_report(res: dict) -> None:
+    print(f"\n{res['users']} users, {res['elapsed_s']} s, {res['scenarios']} scenarios completed")
+    print(f"{'step':<16} {'ok':>7} {'timeout':>8} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for step, r in res["steps"].items():
+        print(f"{step:<16} {r['ok']:>7} {r['timeouts']:>8} {r['per_sec']:>8.2f} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms'] if r['max_ms'] is not None else '—':>9}")
+    print("upstreams:", ", ".join(f"{k}={v}" for k, v in sorted(res["upstreams"].items())))
+    print("telegram: ", ", ".join(f"{k}={v}" for k, v in sorted(res["telegram"].items())))
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="End-to-end load test of BotCore against local fakes")
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--duration", type=float, default=30.0, help="секунд нагрузки (после неё ждём начатые сценарии)")
+    ap.add_argument("--ramp", type=float, default=5.0, help="секунд на подключение всех пользователей")
+    ap.add_argument("--think", type=float, default=3.0, help="средняя пауза между сценариями, с")
+    ap.add_argument("--step-timeout", type=float, default=30.0)
+    ap.add_argument("--scenarios", default="weather,space_city,space_geo,news,ii")
+    ap.add_argument("--weight", action="append", default=[], metavar="NAME=W", help="вес сценария (по умолчанию 1)")
+    ap.add_argument("--latency", action="append", default=[], metavar="NAME=MS")
+    ap.add_argument("--jitter", action="append", default=[], metavar="NAME=MS")
+    ap.add_argument("--fail", action="append", default=[], metavar="NAME=RATE")
+    ap.add_argument("--ii-workers", type=int, default=min(4, os.cpu_count() or 1))
+    ap.add_argument("--no-warmup", dest="warmup", action="store_false", help="не прогревать воркеры ИИ")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="сохранить результат в файл")
+    args = ap.parse_args(argv)
+    args.weights = dict(w.split("=", 1) for w in args.weight)
+
+    res = asyncio.run(main_async(args))
+    print_report(res)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()